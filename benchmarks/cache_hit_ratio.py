@@ -0,0 +1,104 @@
+"""
+Cache Eviction Policy Hit-Ratio Benchmark
+
+Replays synthetic Zipf-distributed query traces against each eviction
+policy (and the previous clear-on-full behavior) and reports hit ratios.
+The `scan` trace interleaves one-off names with the Zipf workload to show
+how each policy copes with cache pollution.
+
+usage: python benchmarks/cache_hit_ratio.py [--names N] [--queries N]
+"""
+import argparse
+import random
+import time
+from itertools import accumulate
+from typing import Dict, Iterator, List
+
+from pydns.server.backend.eviction import Eviction
+
+#** Functions **#
+
+def zipf_trace(names: int, queries: int, alpha: float, seed: int) -> List[int]:
+    """
+    generate zipf distributed trace of name indexes
+
+    :param names:   number of unique names
+    :param queries: number of queries in trace
+    :param alpha:   zipf skew parameter
+    :param seed:    random seed
+    :return:        list of queried name indexes
+    """
+    rng     = random.Random(seed)
+    weights = list(accumulate(1 / (rank ** alpha) for rank in range(1, names + 1)))
+    trace   = rng.choices(range(names), cum_weights=weights, k=queries)
+    # shuffle popularity so ranks do not correlate w/ hash order
+    mapping = list(range(names))
+    rng.shuffle(mapping)
+    return [mapping[n] for n in trace]
+
+def scan_trace(trace: List[int], names: int, ratio: float) -> Iterator[int]:
+    """
+    interleave one-off scan names into an existing trace
+
+    :param trace: base query trace
+    :param names: number of unique names in base trace
+    :param ratio: fraction of queries to replace w/ one-off names
+    :return:      polluted query trace
+    """
+    rng = random.Random(0)
+    one = names
+    for name in trace:
+        if rng.random() < ratio:
+            one += 1
+            yield one
+        else:
+            yield name
+
+def replay_clear(trace: List[int], maxsize: int) -> float:
+    """replay trace against dictionary cleared once full (legacy behavior)"""
+    hits, cache = 0, {}
+    for name in trace:
+        if name in cache:
+            hits += 1
+            continue
+        if len(cache) >= maxsize:
+            cache.clear()
+        cache[name] = True
+    return hits / len(trace)
+
+def replay(trace: List[int], maxsize: int, policy: Eviction) -> float:
+    """replay trace against bounded store using eviction policy"""
+    hits, store = 0, policy.new_store(maxsize)
+    for name in trace:
+        if store.get(name) is not None:
+            hits += 1
+            continue
+        store.set(name, True)
+    return hits / len(trace)
+
+#** Init **#
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--names', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=1_000_000)
+    parser.add_argument('--alpha', type=float, default=0.9)
+    parser.add_argument('--scan', type=float, default=0.3)
+    args = parser.parse_args()
+
+    base   = zipf_trace(args.names, args.queries, args.alpha, seed=1)
+    traces: Dict[str, List[int]] = {
+        'zipf': base,
+        'scan': list(scan_trace(base, args.names, args.scan)),
+    }
+    print(f'{"trace":<6} {"size":>7} {"clear":>8} ', end='')
+    print(' '.join(f'{p.value:>8}' for p in Eviction), ' seconds')
+    for name, trace in traces.items():
+        for size in (args.names // 100, args.names // 10, args.names // 4):
+            start   = time.perf_counter()
+            ratios  = [replay_clear(trace, size)]
+            ratios += [replay(trace, size, policy) for policy in Eviction]
+            elapsed = time.perf_counter() - start
+            print(f'{name:<6} {size:>7} ', end='')
+            print(' '.join(f'{r:>8.2%}' for r in ratios), f'{elapsed:>8.2f}')
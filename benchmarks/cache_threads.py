@@ -0,0 +1,95 @@
+"""
+Multi-Threaded Cache Throughput Benchmark
+
+Measures `Cache.get_answers` throughput as the number of threads grows for
+different shard counts. The workload is a Zipf distributed mix of cache
+hits w/ a small fraction of misses that write new entries. On regular
+CPython the GIL bounds total throughput so the interesting figure is how
+little it degrades w/ more threads; on free-threaded builds (python3.13t+)
+throughput should scale w/ the thread count. `--shared` measures a
+`SharedCache` instead, where every hit decodes its record from the mapped
+table (shard counts are ignored).
+
+usage: python benchmarks/cache_threads.py [--threads 1,2,4,8] [--shards 1,16]
+    [--shared]
+"""
+import argparse
+import sys
+import threading
+import time
+from ipaddress import IPv4Address
+from itertools import accumulate
+from random import Random
+from typing import ClassVar, List
+
+from pydns import A, Answer, RType
+from pydns.server.backend import Answers, Backend, Cache, SharedCache
+
+#** Classes **#
+
+class StaticBackend(Backend):
+    """
+    Backend Answering Every Query w/ a Fixed Address
+    """
+    source: ClassVar[str] = 'Static'
+
+    def is_authority(self, domain: bytes) -> bool:
+        return False
+
+    def get_answers(self, domain: bytes, rtype: RType) -> Answers:
+        return Answers([Answer(domain, 3600, A(IPv4Address('10.0.0.1')))],
+            self.source)
+
+#** Functions **#
+
+def make_trace(names: int, queries: int, seed: int) -> List[bytes]:
+    """generate zipf distributed trace of domain names"""
+    rng     = Random(seed)
+    weights = list(accumulate(1 / rank for rank in range(1, names + 1)))
+    picks   = rng.choices(range(names), cum_weights=weights, k=queries)
+    return [f'host{n}.example.com'.encode() for n in picks]
+
+def run(cache: Cache, traces: List[List[bytes]]) -> float:
+    """run one thread per trace and return queries per second"""
+    barrier = threading.Barrier(len(traces) + 1)
+    def worker(trace: List[bytes]):
+        get = cache.get_answers
+        barrier.wait()
+        for name in trace:
+            get(name, RType.A)
+    threads = [threading.Thread(target=worker, args=(t, )) for t in traces]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return sum(len(t) for t in traces) / (time.perf_counter() - start)
+
+#** Init **#
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', default='1,2,4,8')
+    parser.add_argument('--shards', default='1,16')
+    parser.add_argument('--names', type=int, default=50_000)
+    parser.add_argument('--queries', type=int, default=200_000)
+    parser.add_argument('--eviction', default='lru')
+    parser.add_argument('--shared', action='store_true')
+    args = parser.parse_args()
+
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print(f'python {sys.version.split()[0]} gil={"on" if gil else "off"}')
+    print(f'{"shards":>6} {"threads":>7} {"qps":>12} {"per-thread":>12}')
+    for shards in map(int, args.shards.split(',')):
+        for count in map(int, args.threads.split(',')):
+            cache  = SharedCache(StaticBackend(), buckets=args.names // 8) \
+                if args.shared else Cache(StaticBackend(),
+                maxsize=args.names // 2, eviction=args.eviction, shards=shards)
+            traces = [make_trace(args.names, args.queries // count, seed)
+                for seed in range(count)]
+            run(cache, [make_trace(args.names, args.names, 0)]) # warmup
+            qps = run(cache, traces)
+            cache.close()
+            print(f'{shards:>6} {count:>7} {qps:>12,.0f} {qps / count:>12,.0f}')
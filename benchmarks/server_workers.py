@@ -0,0 +1,122 @@
+"""
+Multi-Process Server Throughput Benchmark
+
+Measures udp queries per second answered by a `Runner` on loopback as the
+number of pre-forked worker processes grows. Load is generated by separate
+client processes each keeping a window of queries in flight over several
+sockets (distinct source ports so SO_REUSEPORT spreads them across
+workers). Every worker answers from a local cache so the figure reflects
+request handling overhead rather than upstream latency. Scaling is bounded
+by the number of available cores (shared w/ the load generators).
+
+usage: python benchmarks/server_workers.py [--workers 1,2,4] [--mode sync]
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from ipaddress import IPv4Address
+from typing import ClassVar, Tuple
+
+from pydns import A, Answer, Question, RType
+from pydns.client import new_query
+from pydns.server import Mode, Runner
+from pydns.server.backend import Answers, Backend, Cache
+
+#** Classes **#
+
+class StaticBackend(Backend):
+    """
+    Backend Answering Every Query w/ a Fixed Address
+    """
+    source: ClassVar[str] = 'Static'
+
+    def is_authority(self, domain: bytes) -> bool:
+        return False
+
+    def get_answers(self, domain: bytes, rtype: RType) -> Answers:
+        return Answers([Answer(domain, 3600, A(IPv4Address('10.0.0.1')))],
+            self.source)
+
+#** Functions **#
+
+def factory() -> Backend:
+    """build worker backend chain"""
+    return Cache(StaticBackend())
+
+def free_port() -> int:
+    """reserve free loopback port number"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def load(address: Tuple[str, int],
+    sockets: int, window: int, duration: float, counter) -> None:
+    """send queries keeping a window in flight per socket until duration"""
+    queries = [new_query(Question(f'host{n}.example.com'.encode(), RType.A))
+        .pack() for n in range(256)]
+    socks = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for _ in range(sockets)]
+    for sock in socks:
+        sock.connect(address)
+        sock.settimeout(0.2)
+    received, n = 0, 0
+    deadline    = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        for sock in socks:
+            for _ in range(window):
+                sock.send(queries[n % len(queries)])
+                n += 1
+        for sock in socks:
+            for _ in range(window):
+                try:
+                    sock.recv(8192)
+                    received += 1
+                except socket.timeout:
+                    break
+    with counter.get_lock():
+        counter.value += received
+
+def run(workers: int, mode: Mode, args: argparse.Namespace) -> float:
+    """run runner w/ the given number of workers and return queries per second"""
+    address = ('127.0.0.1', free_port())
+    runner  = Runner(factory, address, workers=workers, mode=mode, tcp=False)
+    thread  = threading.Thread(target=runner.run, daemon=True)
+    thread.start()
+    time.sleep(1) # wait for workers to bind
+    ctx     = multiprocessing.get_context('fork')
+    counter = ctx.Value('Q', 0)
+    clients = [ctx.Process(target=load, args=(address, args.sockets,
+        args.window, args.duration, counter)) for _ in range(args.clients)]
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+    runner.stop()
+    thread.join()
+    return counter.value / elapsed
+
+#** Init **#
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--mode', default='sync',
+        choices=[m.name.lower() for m in Mode])
+    parser.add_argument('--clients', type=int, default=2)
+    parser.add_argument('--sockets', type=int, default=8)
+    parser.add_argument('--window', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+
+    mode = Mode[args.mode.upper()]
+    print(f'cpus={os.cpu_count()} mode={mode.name.lower()}')
+    print(f'{"workers":>7} {"qps":>12} {"per-worker":>12}')
+    for count in map(int, args.workers.split(',')):
+        qps = run(count, mode, args)
+        print(f'{count:>7} {qps:>12,.0f} {qps / count:>12,.0f}')
@@ -31,12 +31,14 @@ __all__ = [
     'EDNSOption',
 
     'DnsError',
+    'FormatError',
     'ServerFailure',
     'NonExistantDomain',
     'NotImplemented',
 
     'Flags',
     'Message',
+    'LazyMessage',
 
     'Question',
     'Zone'
@@ -10,6 +10,7 @@ from pystructs import U16, U32, Context, Domain, Struct
 
 from .enum import RType, RClass
 from .content import ANY, CONTENT_MAP, Content, Unknown
+from .wire import RRTAIL, UINT16, Buffer, pack_domain, write, write_struct
 
 #** Variables **#
 __all__ = ['BaseAnswer', 'Answer', 'PreRequisite', 'Update']
@@ -76,6 +77,18 @@ class BaseAnswer(Protocol):
         """
         raise NotImplementedError
 
+    def pack_into(self,
+        buf: Buffer, offset: int = 0, ctx: Optional[Context] = None) -> int:
+        """
+        pack answer object directly into buffer at the specified offset
+
+        :param buf:    buffer to write answer into
+        :param offset: offset within buffer to write answer
+        :param ctx:    serialization context object
+        :return:       offset directly after written answer
+        """
+        return write(buf, offset, self.pack(ctx))
+
     @classmethod
     @abstractmethod
     def unpack(cls, raw: bytes, ctx: Optional[Context] = None) -> Self:
@@ -111,6 +124,19 @@ class Answer(BaseAnswer):
         size = len(body).to_bytes(2, 'big')
         return head + size + body
 
+    def pack_into(self,
+        buf: Buffer, offset: int = 0, ctx: Optional[Context] = None) -> int:
+        ctx     = ctx or Context()
+        content = self.content
+        offset  = pack_domain(buf, offset, self.name, ctx)
+        offset  = write_struct(buf, offset,
+            RRTAIL, content.rtype, self.rclass, self.ttl, 0)
+        ctx.index += RRTAIL.size
+        # backpatch rdlength placeholder once content size is known
+        end = content.pack_into(buf, offset, ctx)
+        UINT16.pack_into(buf, offset - UINT16.size, end - offset)
+        return end
+
     @classmethod
     def unpack(cls, raw: bytes, ctx: Optional[Context] = None) -> Self:
         ctx     = ctx or Context()
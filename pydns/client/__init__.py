@@ -1,9 +1,13 @@
 """
 DNS Client Implementation
 """
+import asyncio
 from abc import abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
 from random import randint
-from typing import Protocol
+from typing import AsyncIterator, Dict, Iterable, Iterator
+from typing import NamedTuple, Optional, Protocol, Set
 
 from ..enum import QR, OpCode
 from ..flags import Flags
@@ -11,7 +15,29 @@ from ..question import Question
 from ..message import Message
 
 #** Variables **#
-__all__ = ['BaseClient', 'UdpClient', 'TcpClient', 'HttpsClient']
+__all__ = [
+    'new_message_id',
+    'new_query',
+    'MessageIds',
+    'QueryResult',
+    'Selector',
+    'Upstream',
+    'HedgePolicy',
+    'RetryPolicy',
+    'HedgeStats',
+
+    'BaseClient',
+    'AsyncBaseClient',
+    'UdpClient',
+    'TcpClient',
+    'TlsClient',
+    'HttpsClient',
+    'AsyncUdpClient',
+    'AsyncTcpClient',
+]
+
+#: maximum valid dns message-id
+MAX_MESSAGE_ID = 0xFFFF
 
 #** Functions **#
 
@@ -21,10 +47,67 @@ def new_message_id() -> int:
 
     :return: new valid message-id integer
     """
-    return randint(1, 2 ** 16)
+    return randint(1, MAX_MESSAGE_ID)
+
+def new_query(query: Question, mid: Optional[int] = None) -> Message:
+    """
+    build standard request message for the specified question
+
+    :param query: simple dns query
+    :param mid:   message-id to assign (random when unspecified)
+    :return:      request message
+    """
+    mid   = new_message_id() if mid is None else mid
+    flags = Flags(qr=QR.Question, op=OpCode.Query)
+    return Message(id=mid, flags=flags, questions=[query])
 
 #** Classes **#
 
+class QueryResult(NamedTuple):
+    """
+    Outcome of a Single Question within a Batch of Queries
+    """
+    question: Question
+    response: Optional[Message]   = None
+    error:    Optional[Exception] = None
+
+class MessageIds:
+    """
+    Collision-Free Message-ID Allocator for Outstanding Requests
+
+    IDs remain randomized (to resist response spoofing) but are never
+    handed out twice while a previous request with the same ID is pending.
+    """
+    __slots__ = ('inuse', )
+
+    def __init__(self):
+        self.inuse: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.inuse)
+
+    def allocate(self) -> int:
+        """
+        reserve a new message-id unused by any outstanding request
+
+        :return: reserved message-id
+        """
+        if len(self.inuse) >= MAX_MESSAGE_ID:
+            raise RuntimeError('all message-ids are in use')
+        while True:
+            mid = new_message_id()
+            if mid not in self.inuse:
+                self.inuse.add(mid)
+                return mid
+
+    def release(self, mid: int):
+        """
+        release a previously reserved message-id for reuse
+
+        :param mid: message-id to release
+        """
+        self.inuse.discard(mid)
+
 class BaseClient(Protocol):
 
     @abstractmethod
@@ -44,11 +127,96 @@ class BaseClient(Protocol):
         :param query: simple dns query
         :return:      response message to query
         """
-        mid     = new_message_id()
-        flags   = Flags(qr=QR.Question, op=OpCode.Query)
-        message = Message(id=mid, flags=flags, questions=[query])
-        return self.request(message)
+        return self.request(new_query(query))
+
+    def query_many(self,
+        questions: Iterable[Question], concurrency: int = 32,
+    ) -> Iterator[QueryResult]:
+        """
+        resolve many questions concurrently yielding results as they finish
+
+        Failures are reported within each result rather than raised.
+
+        :param questions:   questions to resolve
+        :param concurrency: maximum number of outstanding queries
+        :return:            iterator of results in completion order
+        """
+        executor = ThreadPoolExecutor(concurrency)
+        pending: Dict[Future, Question] = {}
+        try:
+            questions = iter(questions)
+            while True:
+                for question in islice(questions, concurrency - len(pending)):
+                    pending[executor.submit(self.query, question)] = question
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    question = pending.pop(future)
+                    error    = future.exception()
+                    response = future.result() if error is None else None
+                    yield QueryResult(question, response, error)
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+class AsyncBaseClient(Protocol):
+
+    @abstractmethod
+    async def request(self, msg: Message) -> Message:
+        """
+        send request and process recieved response asynchronously
+
+        :param msg: dns request message
+        :return:    dns response message
+        """
+        raise NotImplementedError
+
+    async def query(self, query: Question) -> Message:
+        """
+        build request message from query and return response
+
+        :param query: simple dns query
+        :return:      response message to query
+        """
+        return await self.request(new_query(query))
+
+    async def query_many(self,
+        questions: Iterable[Question], concurrency: int = 32,
+    ) -> AsyncIterator[QueryResult]:
+        """
+        resolve many questions concurrently yielding results as they finish
+
+        Failures are reported within each result rather than raised.
+
+        :param questions:   questions to resolve
+        :param concurrency: maximum number of outstanding queries
+        :return:            async iterator of results in completion order
+        """
+        pending: Dict[asyncio.Future, Question] = {}
+        try:
+            questions = iter(questions)
+            while True:
+                for question in islice(questions, concurrency - len(pending)):
+                    task = asyncio.ensure_future(self.query(question))
+                    pending[task] = question
+                if not pending:
+                    break
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    question = pending.pop(task)
+                    error    = task.exception()
+                    response = task.result() if error is None else None
+                    yield QueryResult(question, response, error)
+        finally:
+            for task in pending:
+                task.cancel()
 
 #** Imports **#
+from .aio import AsyncUdpClient, AsyncTcpClient
+from .hedge import HedgePolicy, RetryPolicy, HedgeStats
 from .https import HttpsClient
-from .standard import UdpClient, TcpClient
+from .selector import Selector, Upstream
+from .standard import UdpClient, TcpClient, TlsClient
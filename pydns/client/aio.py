@@ -0,0 +1,339 @@
+"""
+Asyncio Based DNS Client Implementations
+"""
+import asyncio
+import socket
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from pyserve import RawAddr
+from pyderive import dataclass, field
+
+from . import AsyncBaseClient, Message, MessageIds
+from .framing import FrameBuffer, frame
+from .hedge import HedgePolicy, Hedger, RetryPolicy
+from .selector import Selector
+from ..wire import UINT16
+
+#** Variables **#
+__all__ = ['AsyncUdpClient', 'AsyncTcpClient']
+
+#** Classes **#
+
+class Pending(NamedTuple):
+    """
+    Outstanding Request Awaiting Response
+    """
+    addr:    Optional[RawAddr]
+    request: Message
+    future:  asyncio.Future
+
+class Multiplexer:
+    """
+    Baseclass Transport Multiplexing Many Outstanding Requests
+
+    Responses are matched to requests by message-id, upstream address and
+    question. Anything unmatched (late, spoofed or malformed) is dropped.
+    """
+
+    def __init__(self):
+        self.transport: Optional[asyncio.BaseTransport] = None
+        self.ids:       MessageIds                      = MessageIds()
+        self.pending:   Dict[int, Pending]              = {}
+
+    @property
+    def closed(self) -> bool:
+        """return true if transport can no longer send requests"""
+        return self.transport is None or self.transport.is_closing()
+
+    def connection_made(self, transport: asyncio.BaseTransport):
+        self.transport = transport
+
+    def connection_lost(self, exc: Optional[Exception]):
+        self.fail(exc or ConnectionError('connection closed'))
+
+    def fail(self, exc: Exception, addr: Optional[RawAddr] = None):
+        """
+        fail outstanding requests with the specified exception
+
+        :param exc:  exception to raise within pending requests
+        :param addr: only fail requests sent to this upstream (if specified)
+        """
+        for pending in self.pending.values():
+            if pending.future.done():
+                continue
+            if addr is not None and (pending.addr is None
+                or tuple(pending.addr[:2]) != tuple(addr[:2])):
+                continue
+            pending.future.set_exception(exc)
+
+    def resolve(self, data: bytes, addr: Optional[Tuple[str, int]]):
+        """
+        match recieved response to its outstanding request (if any)
+
+        :param data: raw response message
+        :param addr: address response was recieved from (datagrams only)
+        """
+        if len(data) < UINT16.size:
+            return
+        (mid, ) = UINT16.unpack_from(data, 0)
+        pending = self.pending.get(mid)
+        if pending is None or pending.future.done():
+            return
+        if addr is not None and pending.addr is not None \
+            and (addr[0] != pending.addr[0] or addr[1] != pending.addr[1]):
+            return
+        source = addr[0] if addr is not None else self.peername()
+        try:
+            response = Message.unpack(data, source=source)
+        except Exception:
+            return
+        if response.questions != pending.request.questions:
+            return
+        response.id = pending.request.id
+        pending.future.set_result(response)
+
+    def peername(self) -> Optional[str]:
+        """
+        retrieve remote host of a connected transport
+
+        :return: remote host (if connected)
+        """
+        peer = self.transport.get_extra_info('peername') \
+            if self.transport is not None else None
+        return peer[0] if peer else None
+
+    def write(self, msg: Message, mid: int, addr: Optional[RawAddr]):
+        """
+        pack and write request to the underlying transport
+
+        :param msg:  dns request message
+        :param mid:  reserved message-id patched into packed request
+        :param addr: upstream address (datagrams only)
+        """
+        raise NotImplementedError
+
+    async def request(self, msg: Message,
+        timeout: Optional[float], addr: Optional[RawAddr] = None) -> Message:
+        """
+        send request under a reserved message-id and await its response
+
+        :param msg:     dns request message
+        :param timeout: max time to wait for response
+        :param addr:    upstream address to send request to (datagrams only)
+        :return:        dns response message
+        """
+        if self.closed:
+            raise ConnectionError('transport closed')
+        loop   = asyncio.get_running_loop()
+        mid    = self.ids.allocate()
+        future = loop.create_future()
+        self.pending[mid] = Pending(addr, msg, future)
+        try:
+            self.write(msg, mid, addr)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            del self.pending[mid]
+            self.ids.release(mid)
+
+class UdpEndpoint(Multiplexer, asyncio.DatagramProtocol):
+    """
+    Single UDP Socket Multiplexing Many Outstanding Requests
+
+    The socket is shared by requests to every upstream, so errors are only
+    raised within requests to the upstream a failed send was addressed to.
+    Errors that cannot be attributed to an upstream (such as icmp errors
+    reported on a later read) are ignored and left to request timeouts.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sending: Optional[RawAddr] = None
+
+    def error_received(self, exc: Exception):
+        if self.sending is not None:
+            self.fail(exc, self.sending)
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]):
+        self.resolve(data, addr)
+
+    def write(self, msg: Message, mid: int, addr: Optional[RawAddr]):
+        data = bytearray()
+        msg.pack_into(data)
+        UINT16.pack_into(data, 0, mid)
+        # transport reports immediate send failures before returning
+        self.sending = addr
+        try:
+            self.transport.sendto(data, addr) #type: ignore
+        finally:
+            self.sending = None
+
+class TcpConnection(Multiplexer, asyncio.Protocol):
+    """
+    Single TCP Connection Pipelining Many Outstanding Requests (RFC 7766)
+
+    Requests are written back-to-back without waiting on earlier responses
+    and responses may arrive in any order.
+    """
+
+    def __init__(self, addr: RawAddr):
+        super().__init__()
+        self.addr   = addr
+        self.frames = FrameBuffer()
+
+    def data_received(self, data: bytes):
+        for message in self.frames.feed(data):
+            self.resolve(message, None)
+
+    def eof_received(self) -> bool:
+        self.fail(ConnectionError('connection closed by server'))
+        return False
+
+    def write(self, msg: Message, mid: int, addr: Optional[RawAddr]):
+        data = frame(msg)
+        UINT16.pack_into(data, UINT16.size, mid)
+        self.transport.write(data) #type: ignore
+
+@dataclass(slots=True)
+class AsyncClient(AsyncBaseClient):
+    """
+    Baseclass Asyncio DNS Client over Shared Multiplexed Transports
+    """
+    addresses: List[RawAddr]
+    timeout:   Optional[float]       = 10
+    hedge:     Optional[HedgePolicy] = None
+    retry:     Optional[RetryPolicy] = None
+
+    lock: Optional[asyncio.Lock] = field(default=None, init=False)
+
+    def __post_init__(self):
+        self.selector = Selector(self.addresses)
+        self.hedger   = Hedger(self.selector, self.hedge, self.retry)
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *_):
+        self.close()
+
+    def pickaddr(self) -> RawAddr:
+        """
+        pick fastest healthy address from list of addresses
+
+        :return: selected dns address to make request
+        """
+        return self.selector.pick()
+
+    async def send(self, msg: Message, addr: RawAddr) -> Message:
+        """
+        send single request attempt to the specified upstream
+
+        :param msg:  dns request message
+        :param addr: upstream address to send request to
+        :return:     dns response message
+        """
+        raise NotImplementedError
+
+    async def request(self, msg: Message) -> Message:
+        return await self.hedger.arequest(self.send, msg)
+
+    async def open(self):
+        """
+        open any missing transports ahead of the first request
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        close all transports and fail outstanding requests
+        """
+        raise NotImplementedError
+
+@dataclass(slots=True)
+class AsyncUdpClient(AsyncClient):
+    """
+    Asyncio UDP DNS Client Multiplexing Requests over Shared Sockets
+    """
+    sockets:   int               = 1
+    endpoints: List[UdpEndpoint] = field(default_factory=list, init=False)
+
+    async def open(self):
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            self.endpoints = [e for e in self.endpoints if not e.closed]
+            while len(self.endpoints) < self.sockets:
+                _, endpoint = await loop.create_datagram_endpoint(
+                    UdpEndpoint, family=socket.AF_INET)
+                self.endpoints.append(endpoint)
+
+    def close(self):
+        for endpoint in self.endpoints:
+            if endpoint.transport is not None:
+                endpoint.transport.close()
+        self.endpoints.clear()
+
+    async def send(self, msg: Message, addr: RawAddr) -> Message:
+        if len(self.endpoints) < self.sockets \
+            or any(e.closed for e in self.endpoints):
+            await self.open()
+        endpoint = min(self.endpoints, key=lambda e: len(e.pending))
+        return await endpoint.request(msg, self.timeout, addr)
+
+@dataclass(slots=True)
+class AsyncTcpClient(AsyncClient):
+    """
+    Asyncio TCP DNS Client Pipelining Requests over Pooled Connections
+
+    Requests share the least-loaded open connection to their upstream.
+    Additional connections (up to the configured maximum per upstream) are
+    only opened once every connection has `pipeline` requests outstanding.
+    """
+    connections: int                 = 1
+    pipeline:    int                 = 64
+    pool:        List[TcpConnection] = field(default_factory=list, init=False)
+
+    async def connect(self, addr: RawAddr) -> TcpConnection:
+        """
+        open a new pipelined connection to the specified upstream
+
+        :param addr: upstream address to connect to
+        :return:     newly connected tcp connection
+        """
+        loop    = asyncio.get_running_loop()
+        connect = loop.create_connection(lambda: TcpConnection(addr), *addr)
+        _, conn = await asyncio.wait_for(connect, self.timeout)
+        return conn
+
+    async def open(self):
+        await self.connection(self.pickaddr())
+
+    async def connection(self, addr: RawAddr) -> TcpConnection:
+        """
+        retrieve least-loaded connection, opening another when saturated
+
+        :param addr: upstream address to retrieve connection for
+        :return:     connection to send next request over
+        """
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            self.pool = [c for c in self.pool if not c.closed]
+            conns = [c for c in self.pool if tuple(c.addr) == tuple(addr)]
+            conn  = min(conns, key=lambda c: len(c.pending), default=None)
+            if conn is None or (len(conn.pending) >= self.pipeline \
+                and len(conns) < self.connections):
+                conn = await self.connect(addr)
+                self.pool.append(conn)
+            return conn
+
+    def close(self):
+        for conn in self.pool:
+            if conn.transport is not None:
+                conn.transport.close()
+        self.pool.clear()
+
+    async def send(self, msg: Message, addr: RawAddr) -> Message:
+        conn = await self.connection(addr)
+        return await conn.request(msg, self.timeout)
@@ -0,0 +1,308 @@
+"""
+Single-Threaded Batch Query Engines for Socket Clients
+"""
+import select
+import socket
+import ssl
+import time
+from abc import abstractmethod
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Deque, Iterable, Iterator, List
+from typing import NamedTuple, Optional, Tuple
+
+from pyserve import RawAddr
+
+from . import Message, MessageIds, QueryResult, new_query
+from .framing import FrameBuffer, frame
+from ..question import Question
+from ..wire import UINT16
+
+if TYPE_CHECKING:
+    from .standard import Client, TcpClient
+
+#** Variables **#
+__all__ = ['UdpBatch', 'TcpBatch']
+
+#: recieved response message and the address it was recieved from
+Received = Tuple[bytes, Optional[Tuple[str, int]]]
+
+#** Classes **#
+
+class Flight(NamedTuple):
+    """
+    Outstanding Batch Query Awaiting Response
+    """
+    question: Question
+    addr:     RawAddr
+    attempt:  int
+    start:    float
+    deadline: float
+
+class Batch:
+    """
+    Baseclass Batch Engine keeping a Window of Queries In-Flight
+
+    Queries are sent until `concurrency` are outstanding and replies are
+    matched back to their question by message-id. Timed out queries are
+    re-sent according to the client retry policy before being reported as
+    failures. Results are yielded in completion order.
+    """
+
+    def __init__(self, client: 'Client', concurrency: int):
+        self.client      = client
+        self.concurrency = concurrency
+        self.ids         = MessageIds()
+        self.inflight: 'OrderedDict[int, Flight]' = OrderedDict()
+        self.retries:  Deque[Tuple[Question, int]] = deque()
+
+    @abstractmethod
+    def upstream(self) -> RawAddr:
+        """pick upstream address for the next query"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def transmit(self, msg: Message, addr: RawAddr):
+        """send packed query to the specified upstream"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def receive(self, timeout: float) -> List[Received]:
+        """wait up to timeout and return every response recieved"""
+        raise NotImplementedError
+
+    def close(self):
+        """release any resources held by the batch"""
+        pass
+
+    def launch(self, question: Question, attempt: int):
+        """
+        send query for question and track it as in-flight
+
+        :param question: question being resolved
+        :param attempt:  attempt number for the question
+        """
+        mid  = self.ids.allocate()
+        addr = None
+        try:
+            addr = self.upstream()
+            self.transmit(new_query(question, mid), addr)
+        except Exception:
+            self.ids.release(mid)
+            if addr is not None:
+                self.client.selector.failure(addr)
+            raise
+        start = time.monotonic()
+        self.inflight[mid] = Flight(
+            question, addr, attempt, start, start + self.client.timeout)
+
+    def match(self, data: bytes,
+        addr: Optional[Tuple[str, int]]) -> Optional[QueryResult]:
+        """
+        match recieved response to its in-flight query (if any)
+
+        :param data: raw response message
+        :param addr: address response was recieved from (datagrams only)
+        :return:     completed query result
+        """
+        if len(data) < UINT16.size:
+            return
+        (mid, ) = UINT16.unpack_from(data, 0)
+        flight  = self.inflight.get(mid)
+        if flight is None:
+            return
+        if addr is not None \
+            and (addr[0] != flight.addr[0] or addr[1] != flight.addr[1]):
+            return
+        try:
+            response = Message.unpack(data, source=flight.addr[0])
+        except Exception:
+            return
+        if response.questions != [flight.question]:
+            return
+        del self.inflight[mid]
+        self.ids.release(mid)
+        rtt = time.monotonic() - flight.start
+        self.client.selector.success(flight.addr, rtt)
+        return QueryResult(flight.question, response)
+
+    def failed(self, mid: int, error: Exception) -> Optional[QueryResult]:
+        """
+        handle failed in-flight query by scheduling a retry or reporting it
+
+        :param mid:   message-id of failed query
+        :param error: exception describing failure
+        :return:      failed query result (when out of retries)
+        """
+        flight = self.inflight.pop(mid)
+        self.ids.release(mid)
+        self.client.selector.failure(flight.addr)
+        retry    = self.client.retry
+        attempts = retry.attempts if retry is not None else 1
+        if flight.attempt < attempts:
+            self.retries.append((flight.question, flight.attempt + 1))
+            return
+        return QueryResult(flight.question, None, error)
+
+    def run(self, questions: Iterable[Question]) -> Iterator[QueryResult]:
+        """
+        resolve all questions yielding results in completion order
+
+        :param questions: questions to resolve
+        :return:          iterator of query results
+        """
+        inflight  = self.inflight
+        retries   = self.retries
+        questions = iter(questions)
+        exhausted = False
+        try:
+            while True:
+                # fill window w/ retries first then remaining questions
+                while len(inflight) < self.concurrency:
+                    if retries:
+                        question, attempt = retries.popleft()
+                    else:
+                        question = next(questions, None)
+                        if question is None:
+                            exhausted = True
+                            break
+                        attempt = 1
+                    try:
+                        self.launch(question, attempt)
+                    except Exception as e:
+                        yield QueryResult(question, None, e)
+                if not inflight:
+                    if exhausted and not retries:
+                        break
+                    continue
+                # wait for responses until the oldest query expires
+                deadline = next(iter(inflight.values())).deadline
+                timeout  = max(deadline - time.monotonic(), 0)
+                try:
+                    received = self.receive(timeout)
+                except OSError as e:
+                    for mid in list(inflight):
+                        result = self.failed(mid, e)
+                        if result is not None:
+                            yield result
+                    continue
+                for data, addr in received:
+                    result = self.match(data, addr)
+                    if result is not None:
+                        yield result
+                # expire queries past their deadline
+                now = time.monotonic()
+                while inflight:
+                    mid, flight = next(iter(inflight.items()))
+                    if flight.deadline > now:
+                        break
+                    result = self.failed(mid, socket.timeout('timed out'))
+                    if result is not None:
+                        yield result
+        finally:
+            self.close()
+
+class UdpBatch(Batch):
+    """
+    Batch Engine Multiplexing Queries over a Single UDP Socket
+    """
+
+    def __init__(self, client: 'Client', concurrency: int):
+        super().__init__(client, concurrency)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def upstream(self) -> RawAddr:
+        return self.client.selector.pick()
+
+    def transmit(self, msg: Message, addr: RawAddr):
+        data = bytearray()
+        msg.pack_into(data)
+        self.sock.sendto(data, addr)
+
+    def receive(self, timeout: float) -> List[Received]:
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        if not readable:
+            return []
+        received = []
+        while True:
+            try:
+                received.append(self.sock.recvfrom(self.client.block_size))
+            except (BlockingIOError, InterruptedError):
+                return received
+            except ConnectionRefusedError:
+                continue
+
+    def close(self):
+        self.sock.close()
+
+class TcpBatch(Batch):
+    """
+    Batch Engine Pipelining Queries over a Pooled TCP/TLS Connection
+
+    Connections lost mid-batch are replaced and their outstanding queries
+    are retried according to the client retry policy. Connections with
+    unanswered queries are discarded rather than returned to the pool.
+    """
+    client: 'TcpClient'
+
+    def __init__(self, client: 'TcpClient', concurrency: int):
+        super().__init__(client, concurrency)
+        self.addr:   Optional[RawAddr]       = None
+        self.sock:   Optional[socket.socket] = None
+        self.frames: FrameBuffer             = FrameBuffer()
+
+    def upstream(self) -> RawAddr:
+        if self.sock is None:
+            addr = self.client.selector.pick()
+            try:
+                pool      = self.client.upstream_pool(addr)
+                self.sock = self.client.reserve(pool)
+            except OSError:
+                self.client.selector.failure(addr)
+                raise
+            self.addr   = addr
+            self.frames = FrameBuffer()
+        return self.addr #type: ignore
+
+    def transmit(self, msg: Message, addr: RawAddr):
+        try:
+            self.sock.sendall(frame(msg)) #type: ignore
+        except OSError:
+            self.release(discard=True)
+            raise
+
+    def receive(self, timeout: float) -> List[Received]:
+        sock = self.sock
+        if sock is None:
+            raise ConnectionError('connection closed')
+        # decrypted tls data may already be buffered beyond select's view
+        if not isinstance(sock, ssl.SSLSocket) or not sock.pending():
+            readable, _, _ = select.select([sock], [], [], timeout)
+            if not readable:
+                return []
+        try:
+            data = sock.recv(self.client.block_size)
+            if not data:
+                raise ConnectionError('connection closed by server')
+        except OSError:
+            self.release(discard=True)
+            raise
+        return [(message, None) for message in self.frames.feed(data)]
+
+    def release(self, discard: bool):
+        """
+        return current connection to its pool or discard it
+
+        :param discard: discard connection rather than reusing it
+        """
+        if self.sock is None:
+            return
+        pool = self.client.upstream_pool(self.addr) #type: ignore
+        if discard:
+            pool.discard(self.sock)
+        else:
+            pool.put(self.sock)
+        self.sock = None
+
+    def close(self):
+        self.release(discard=bool(self.inflight or len(self.frames)))
@@ -0,0 +1,95 @@
+"""
+DNS over TCP Message Framing (RFC 1035 4.2.2 / RFC 7766)
+"""
+import socket
+from typing import List
+
+from . import Message
+from ..wire import UINT16
+
+#** Variables **#
+__all__ = ['FrameBuffer', 'frame', 'recv_exact', 'recv_frame']
+
+#: maximum size of a single length-prefixed message
+MAX_FRAME = 0xFFFF
+
+#** Functions **#
+
+def frame(msg: Message) -> bytearray:
+    """
+    pack message into a single length-prefixed stream frame
+
+    :param msg: dns message to frame
+    :return:    packed message prefixed w/ its length
+    """
+    data = bytearray(UINT16.size)
+    size = msg.pack_into(data, UINT16.size) - UINT16.size
+    if size > MAX_FRAME:
+        raise OverflowError(f'message too large for tcp frame: {size}')
+    UINT16.pack_into(data, 0, size)
+    return data
+
+def recv_exact(sock: socket.socket, size: int) -> bytearray:
+    """
+    recieve exactly the specified number of bytes from a blocking socket
+
+    :param sock: socket to recieve from
+    :param size: number of bytes to recieve
+    :return:     recieved bytes
+    """
+    data = bytearray(size)
+    with memoryview(data) as view:
+        index = 0
+        while index < size:
+            nbytes = sock.recv_into(view[index:], size - index)
+            if nbytes == 0:
+                raise ConnectionError('connection closed mid-frame')
+            index += nbytes
+    return data
+
+def recv_frame(sock: socket.socket) -> bytearray:
+    """
+    recieve a single complete length-prefixed message from a blocking socket
+
+    :param sock: socket to recieve from
+    :return:     message contents without length prefix
+    """
+    (size, ) = UINT16.unpack(recv_exact(sock, UINT16.size))
+    return recv_exact(sock, size)
+
+#** Classes **#
+
+class FrameBuffer:
+    """
+    Reassembles Length-Prefixed Messages from Partial Stream Reads
+    """
+    __slots__ = ('buffer', )
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.buffer)
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """
+        append stream data and collect every message completed by it
+
+        :param data: data read from the stream
+        :return:     list of completed messages (without length prefix)
+        """
+        buffer = self.buffer
+        buffer += data
+        frames = []
+        index  = 0
+        length = len(buffer)
+        while length - index >= UINT16.size:
+            (size, ) = UINT16.unpack_from(buffer, index)
+            start    = index + UINT16.size
+            if start + size > length:
+                break
+            frames.append(bytes(buffer[start:start + size]))
+            index = start + size
+        if index:
+            del buffer[:index]
+        return frames
@@ -0,0 +1,594 @@
+"""
+Hedged/Retried Request Orchestration for DNS Clients
+"""
+import asyncio
+import random
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from threading import Condition, Lock, local
+from typing import (
+    Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, Type)
+
+from pyderive import dataclass, field
+
+from . import Message
+from .selector import Selector
+
+#** Variables **#
+__all__ = ['HedgePolicy', 'RetryPolicy', 'HedgeStats', 'Hedger', 'cancellable']
+
+#: single attempt at sending a request to the specified upstream
+Send = Callable[[Message, object], Message]
+
+#: single asynchronous attempt at sending a request to an upstream
+AsyncSend = Callable[[Message, object], Awaitable[Message]]
+
+#: hedged attempt currently being sent by each thread
+LOCAL = local()
+
+#** Functions **#
+
+def wake(sock: socket.socket):
+    """
+    wake thread blocked receiving on socket (leaving the socket unusable)
+
+    :param sock: socket to wake
+    """
+    try:
+        if sock.type != socket.SOCK_DGRAM:
+            socket.socket.shutdown(sock, socket.SHUT_RDWR)
+            return
+        # unconnected datagram sockets ignore shutdown so send an empty one
+        host, port = sock.getsockname()[:2]
+        if not port:
+            return
+        if host in ('0.0.0.0', '::'):
+            host = '::1' if sock.family == socket.AF_INET6 else '127.0.0.1'
+        with socket.socket(sock.family, socket.SOCK_DGRAM) as waker:
+            waker.sendto(b'', (host, port))
+    except OSError:
+        pass
+
+@contextmanager
+def cancellable(sock: socket.socket) -> Iterator[socket.socket]:
+    """
+    bind socket to the hedged attempt of the current thread (if any)
+
+    The socket timeout is limited to the remaining request budget and a
+    losing attempt is woken once another attempt wins, raising
+    `ConnectionAbortedError` so the (now unusable) socket is discarded.
+
+    :param sock: socket about to block on the upstream response
+    :return:     the same socket
+    """
+    attempt = getattr(LOCAL, 'attempt', None)
+    if attempt is None:
+        yield sock
+        return
+    timeout = sock.gettimeout()
+    attempt.bind(sock)
+    try:
+        remaining = attempt.remaining()
+        if remaining is not None:
+            if remaining <= 0:
+                raise socket.timeout('request deadline exceeded')
+            sock.settimeout(remaining if timeout is None \
+                else min(remaining, timeout))
+        yield sock
+    finally:
+        sock.settimeout(timeout)
+        if attempt.unbind():
+            raise ConnectionAbortedError('hedged attempt cancelled')
+
+#** Classes **#
+
+@dataclass(slots=True)
+class HedgePolicy:
+    """
+    Hedged Request Configuration
+
+    Once no response has arrived within the hedge delay, the same request
+    is also sent to another upstream and the first valid response wins.
+    The delay is either fixed or derived from the observed rtt percentile
+    across all upstreams (clamped between `min_delay` and `max_delay`).
+    """
+    delay:      Optional[float] = None
+    percentile: float           = 0.95
+    min_delay:  float           = 0.01
+    max_delay:  float           = 1.0
+    max_hedges: int             = 1
+    workers:    int             = 32
+
+    def hedge_delay(self, selector: Selector) -> float:
+        """
+        calculate delay before firing the next hedged request
+
+        :param selector: upstream selector tracking observed rtts
+        :return:         hedge delay in seconds
+        """
+        if self.delay is not None:
+            return self.delay
+        rtt = selector.percentile(self.percentile)
+        if rtt is None:
+            return self.max_delay
+        return min(max(rtt, self.min_delay), self.max_delay)
+
+@dataclass(slots=True)
+class RetryPolicy:
+    """
+    Request Retry Configuration w/ Jittered Exponential Backoff
+    """
+    attempts:    int                         = 3
+    backoff:     float                       = 0.05
+    multiplier:  float                       = 2.0
+    max_backoff: float                       = 2.0
+    jitter:      float                       = 0.1
+    retry_on:    Tuple[Type[Exception], ...] = \
+        (OSError, asyncio.TimeoutError, ValueError)
+
+    def delay(self, attempt: int) -> float:
+        """
+        calculate backoff before the specified retry attempt
+
+        :param attempt: retry attempt number (starting at one)
+        :return:        backoff delay in seconds
+        """
+        delay = self.backoff * (self.multiplier ** (attempt - 1))
+        delay = min(delay, self.max_backoff)
+        return delay + delay * self.jitter * random.random()
+
+@dataclass(slots=True)
+class HedgeStats:
+    """
+    Hedging and Retry Counters
+    """
+    requests:   int = 0
+    hedges:     int = 0
+    hedge_wins: int = 0
+    retries:    int = 0
+    failures:   int = 0
+
+class Attempt:
+    """
+    Cancellable Synchronous Attempt tracking the Socket it is Waiting On
+    """
+    __slots__ = ('deadline', 'hedged', 'cancelled', 'sock', 'mutex')
+
+    def __init__(self, deadline: Optional[float], hedged: bool):
+        self.deadline:  Optional[float]         = deadline
+        self.hedged:    bool                    = hedged
+        self.cancelled: bool                    = False
+        self.sock:      Optional[socket.socket] = None
+        self.mutex:     Lock                    = Lock()
+
+    def remaining(self) -> Optional[float]:
+        """
+        seconds left until the request deadline (if any)
+        """
+        if self.deadline is not None:
+            return self.deadline - time.monotonic()
+
+    def bind(self, sock: socket.socket):
+        """
+        register socket the attempt is about to block on
+
+        :param sock: socket waiting on the upstream response
+        """
+        with self.mutex:
+            if self.cancelled:
+                raise ConnectionAbortedError('hedged attempt cancelled')
+            self.sock = sock
+
+    def unbind(self) -> bool:
+        """
+        unregister socket once the attempt stopped waiting on it
+
+        :return: true if the attempt was cancelled meanwhile
+        """
+        with self.mutex:
+            self.sock = None
+            return self.cancelled
+
+    def cancel(self):
+        """
+        cancel attempt and wake its socket (if currently blocked on one)
+        """
+        with self.mutex:
+            self.cancelled = True
+            if self.sock is not None:
+                wake(self.sock)
+
+class Race:
+    """
+    Shared State of the Concurrent Attempts made for a Single Request
+    """
+    __slots__ = (
+        'deadline',
+        'attempts',
+        'running',
+        'pending',
+        'response',
+        'error',
+        'cond',
+    )
+
+    def __init__(self, deadline: Optional[float], hedges: int):
+        self.deadline: Optional[float]     = deadline
+        self.attempts: List[Attempt]       = []
+        self.running:  int                 = 0
+        self.pending:  int                 = hedges
+        self.response: Optional[Message]   = None
+        self.error:    Optional[Exception] = None
+        self.cond:     Condition           = Condition()
+
+    def remaining(self) -> Optional[float]:
+        """
+        seconds left until the request deadline (if any)
+        """
+        if self.deadline is not None:
+            return max(self.deadline - time.monotonic(), 0)
+
+    def settled(self) -> bool:
+        """
+        check if request was answered or no attempt can answer it anymore
+        """
+        return self.response is not None or \
+            (not self.running and not self.pending)
+
+    def start(self, hedged: bool) -> Optional[Attempt]:
+        """
+        register new attempt unless the request was already answered
+
+        :param hedged: attempt is a hedge of the primary attempt
+        :return:       new attempt (none when already answered)
+        """
+        with self.cond:
+            if hedged:
+                if not self.pending:
+                    return
+                self.pending -= 1
+            if self.response is not None:
+                self.cond.notify_all()
+                return
+            attempt = Attempt(self.deadline, hedged)
+            self.attempts.append(attempt)
+            self.running += 1
+            return attempt
+
+    def pause(self, delay: float) -> bool:
+        """
+        wait for the hedge delay (or until every running attempt failed)
+
+        :param delay: hedge delay in seconds
+        :return:      true if another hedge should be fired
+        """
+        with self.cond:
+            remaining = self.remaining()
+            timeout   = delay if remaining is None else min(delay, remaining)
+            self.cond.wait_for(lambda: \
+                self.response is not None or not self.running, timeout)
+            if self.response is None and self.remaining() != 0:
+                return True
+            self.pending = 0
+            self.cond.notify_all()
+            return False
+
+    def finish(self,
+        attempt:  Attempt,
+        response: Optional[Message]   = None,
+        error:    Optional[Exception] = None,
+    ) -> bool:
+        """
+        record outcome of attempt and cancel the others once one wins
+
+        :param attempt:  finished attempt
+        :param response: successful response (if any)
+        :param error:    attempt failure (if any)
+        :return:         true if the attempt won the race
+        """
+        with self.cond:
+            self.running -= 1
+            won = response is not None and self.response is None
+            if won:
+                self.response = response
+            elif error is not None and not attempt.cancelled:
+                self.error = error
+            self.cond.notify_all()
+        if won:
+            for other in self.attempts:
+                if other is not attempt:
+                    other.cancel()
+        return won
+
+    def result(self) -> Message:
+        """
+        wait for the winning response until the request deadline
+
+        :return: first valid dns response message
+        """
+        with self.cond:
+            self.cond.wait_for(self.settled, self.remaining())
+            if self.response is not None:
+                return self.response
+            self.pending = 0
+            error = self.error if not self.running else \
+                socket.timeout('request deadline exceeded')
+        for attempt in self.attempts:
+            attempt.cancel()
+        raise error or socket.timeout('request deadline exceeded')
+
+@dataclass(slots=True)
+class Hedger:
+    """
+    Request Orchestrator applying Upstream Selection, Hedging and Retries
+
+    Each attempt is timed and recorded against the selector. Synchronous
+    requests send the primary attempt inline while hedges run within a
+    shared thread-pool, every attempt is bounded by the remaining `timeout`
+    budget and losing attempts are woken and their sockets discarded as
+    soon as a winner is found. Asynchronous losers are cancelled likewise.
+    """
+    selector: Selector
+    hedge:    Optional[HedgePolicy] = None
+    retry:    Optional[RetryPolicy] = None
+    timeout:  Optional[float]       = None
+
+    stats:    HedgeStats                   = field(init=False)
+    mutex:    Lock                         = field(init=False)
+    executor: Optional[ThreadPoolExecutor] = field(default=None, init=False)
+
+    def __post_init__(self):
+        self.stats = HedgeStats()
+        self.mutex = Lock()
+
+    def count(self, name: str, n: int = 1):
+        """increment the specified counter"""
+        with self.mutex:
+            setattr(self.stats, name, getattr(self.stats, name) + n)
+
+    def call(self, send: Send, msg: Message, addr) -> Message:
+        """
+        send single attempt to upstream and record its rtt/failure
+
+        :param send: request send function
+        :param msg:  dns request message
+        :param addr: upstream address to send request to
+        :return:     dns response message
+        """
+        start = time.monotonic()
+        try:
+            response = send(msg, addr)
+        except Exception:
+            attempt = getattr(LOCAL, 'attempt', None)
+            if attempt is None or not attempt.cancelled:
+                self.selector.failure(addr)
+            raise
+        self.selector.success(addr, time.monotonic() - start)
+        return response
+
+    async def acall(self, send: AsyncSend, msg: Message, addr) -> Message:
+        """
+        send single asynchronous attempt and record its rtt/failure
+
+        :param send: asynchronous request send function
+        :param msg:  dns request message
+        :param addr: upstream address to send request to
+        :return:     dns response message
+        """
+        start = time.monotonic()
+        try:
+            response = await send(msg, addr)
+        except Exception:
+            self.selector.failure(addr)
+            raise
+        self.selector.success(addr, time.monotonic() - start)
+        return response
+
+    def next_upstream(self, tried: List[object]) -> object:
+        """
+        pick the next upstream to attempt and count it if it is a hedge
+
+        :param tried: upstreams already attempted for this request
+        :return:      next upstream address
+        """
+        addr = self.selector.pick(exclude=tried)
+        if tried:
+            self.count('hedges')
+        tried.append(addr)
+        return addr
+
+    def winner(self, done: set, hedged: Dict) -> Optional[Message]:
+        """
+        retrieve first successful response from completed attempts
+
+        :param done:   completed attempt futures
+        :param hedged: map of attempt futures to whether they were hedges
+        :return:       successful response (if any)
+        """
+        for future in done:
+            if future.exception() is None:
+                if hedged[future]:
+                    self.count('hedge_wins')
+                return future.result()
+
+    def run(self,
+        race: Race, attempt: Attempt, send: Send, msg: Message, addr):
+        """
+        send single attempt of a hedged request and record its outcome
+
+        :param race:    shared state of request attempts
+        :param attempt: attempt being sent
+        :param send:    request send function
+        :param msg:     dns request message
+        :param addr:    upstream address to send request to
+        """
+        LOCAL.attempt = attempt
+        try:
+            response = self.call(send, msg, addr)
+        except Exception as e:
+            race.finish(attempt, error=e)
+        else:
+            if race.finish(attempt, response) and attempt.hedged:
+                self.count('hedge_wins')
+        finally:
+            LOCAL.attempt = None
+
+    def hedges(self, race: Race,
+        send: Send, msg: Message, tried: List[object], delay: float):
+        """
+        fire next hedge once the hedge delay passes w/o a winning response
+
+        :param race:  shared state of request attempts
+        :param send:  request send function
+        :param msg:   dns request message
+        :param tried: upstreams already attempted for this request
+        :param delay: hedge delay in seconds
+        """
+        if not race.pause(delay):
+            return
+        attempt = race.start(hedged=True)
+        if attempt is None:
+            return
+        addr = self.next_upstream(tried)
+        if race.pending:
+            self.executor.submit( #type: ignore
+                self.hedges, race, send, msg, tried, delay)
+        self.run(race, attempt, send, msg, addr)
+
+    def attempt(self, send: Send, msg: Message) -> Message:
+        """
+        send request to the best upstream, hedging to others when slow
+
+        A hedge is fired whenever the hedge delay passes without a response
+        or every outstanding attempt has already failed.
+
+        :param send: request send function
+        :param msg:  dns request message
+        :return:     first valid dns response message
+        """
+        hedge = self.hedge
+        if hedge is None:
+            return self.call(send, msg, self.selector.pick())
+        executor = self.executor
+        if executor is None:
+            # concurrent first requests must share a single thread-pool
+            with self.mutex:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(hedge.workers)
+                executor = self.executor
+        delay    = hedge.hedge_delay(self.selector)
+        deadline = None if self.timeout is None \
+            else time.monotonic() + self.timeout
+        tried: List[object] = []
+        race    = Race(deadline, hedge.max_hedges)
+        attempt = race.start(hedged=False)
+        addr    = self.next_upstream(tried)
+        if race.pending:
+            executor.submit(self.hedges, race, send, msg, tried, delay)
+        self.run(race, attempt, send, msg, addr) #type: ignore
+        return race.result()
+
+    async def aattempt(self, send: AsyncSend, msg: Message) -> Message:
+        """
+        send request to the best upstream, hedging to others when slow
+
+        A hedge is fired whenever the hedge delay passes without a response
+        or every outstanding attempt has already failed.
+
+        :param send: asynchronous request send function
+        :param msg:  dns request message
+        :return:     first valid dns response message
+        """
+        hedge = self.hedge
+        if hedge is None:
+            return await self.acall(send, msg, self.selector.pick())
+        delay   = hedge.hedge_delay(self.selector)
+        tried:   List[object]               = []
+        hedged:  Dict[asyncio.Future, bool] = {}
+        pending: set                        = set()
+        try:
+            while True:
+                addr = self.next_upstream(tried)
+                task = asyncio.ensure_future(self.acall(send, msg, addr))
+                hedged[task] = len(tried) > 1
+                pending.add(task)
+                can_hedge = len(tried) <= hedge.max_hedges
+                while pending:
+                    timeout = delay if can_hedge else None
+                    done, pending = await asyncio.wait(
+                        pending, timeout=timeout,
+                        return_when=asyncio.FIRST_COMPLETED)
+                    response = self.winner(done, hedged)
+                    if response is not None:
+                        return response
+                    if not done:
+                        break
+                if not pending and not can_hedge:
+                    raise list(hedged)[-1].exception() #type: ignore
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def request(self, send: Send, msg: Message) -> Message:
+        """
+        send request w/ configured hedging and retry policies
+
+        :param send: request send function
+        :param msg:  dns request message
+        :return:     dns response message
+        """
+        self.count('requests')
+        retry = self.retry
+        if retry is None:
+            try:
+                return self.attempt(send, msg)
+            except Exception:
+                self.count('failures')
+                raise
+        for attempt in range(retry.attempts):
+            if attempt:
+                self.count('retries')
+                time.sleep(retry.delay(attempt))
+            try:
+                return self.attempt(send, msg)
+            except retry.retry_on:
+                if attempt + 1 >= retry.attempts:
+                    self.count('failures')
+                    raise
+            except Exception:
+                self.count('failures')
+                raise
+        raise RuntimeError('retry policy allows no attempts')
+
+    async def arequest(self, send: AsyncSend, msg: Message) -> Message:
+        """
+        send asynchronous request w/ configured hedging and retry policies
+
+        :param send: asynchronous request send function
+        :param msg:  dns request message
+        :return:     dns response message
+        """
+        self.count('requests')
+        retry = self.retry
+        if retry is None:
+            try:
+                return await self.aattempt(send, msg)
+            except Exception:
+                self.count('failures')
+                raise
+        for attempt in range(retry.attempts):
+            if attempt:
+                self.count('retries')
+                await asyncio.sleep(retry.delay(attempt))
+            try:
+                return await self.aattempt(send, msg)
+            except retry.retry_on:
+                if attempt + 1 >= retry.attempts:
+                    self.count('failures')
+                    raise
+            except Exception:
+                self.count('failures')
+                raise
+        raise RuntimeError('retry policy allows no attempts')
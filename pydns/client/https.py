@@ -1,32 +1,199 @@
 """
 Web HTTPS Based DNS Client
 """
-from urllib.request import Request, urlopen
-from typing import Optional
+import ssl
+from base64 import urlsafe_b64encode
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
 
-from pyderive import dataclass
+from pypool import Pool
+from pyderive import dataclass, field
 
 from . import BaseClient, Message
+from .hedge import HedgePolicy, Hedger, RetryPolicy
+from .selector import Selector
+from .tls import SessionCache, wrap_socket
 
 #** Variables **#
 __all__ = ['HttpsClient']
 
+#: supported rfc 8484 request methods
+METHODS = ('GET', 'POST')
+
 #** Classes **#
 
+class Endpoint(NamedTuple):
+    """
+    Parsed DNS over HTTPS Upstream Url
+    """
+    host: str
+    port: int
+    path: str
+
+    @classmethod
+    def parse(cls, url: str) -> 'Endpoint':
+        """parse https url into connection host, port and request path"""
+        parts = urlsplit(url)
+        if parts.scheme != 'https' or not parts.hostname:
+            raise ValueError(f'invalid dns-over-https url: {url!r}')
+        path = parts.path or '/'
+        path = f'{path}?{parts.query}' if parts.query else path
+        return cls(parts.hostname, parts.port or 443, path)
+
+class Connection(HTTPSConnection):
+    """
+    Persistent HTTPS Connection Resuming Cached TLS Sessions
+    """
+
+    def __init__(self,
+        host:     str,
+        port:     int,
+        timeout:  Optional[float],
+        context:  ssl.SSLContext,
+        sessions: SessionCache,
+    ):
+        super().__init__(host, port, timeout=timeout, context=context)
+        self.sessions = sessions
+
+    def connect(self):
+        HTTPConnection.connect(self)
+        hostname  = self._tunnel_host or self.host #type: ignore
+        self.sock = wrap_socket(self._context, #type: ignore
+            self.sock, hostname, self.sessions, (self.host, self.port))
+
+class ConnectionPool(Pool[Connection]):
+    pass
+
 @dataclass(slots=True)
 class HttpsClient(BaseClient):
     """
     Simple DNS over HTTPS Client Implementation
+
+    Requests are sent over persistent keep-alive connections pooled per
+    upstream host, and reconnects resume cached TLS sessions. The RFC 8484
+    GET form (`method='GET'`) sends message-id zero so responses are
+    cacheable by intermediate HTTP caches. Additional `urls` are selected
+    alongside `url` based on their latency.
     """
-    url:     str           = 'https://cloudflare-dns.com/dns-query'
-    timeout: Optional[int] = None
+    url:        str                      = 'https://cloudflare-dns.com/dns-query'
+    timeout:    Optional[int]            = None
+    urls:       List[str]                = field(default_factory=list)
+    hedge:      Optional[HedgePolicy]    = None
+    retry:      Optional[RetryPolicy]    = None
+    method:     str                      = 'POST'
+    pool_size:  Optional[int]            = None
+    expiration: Optional[int]            = 15
+    context:    Optional[ssl.SSLContext] = None
 
     def __post_init__(self):
+        if self.method not in METHODS:
+            raise ValueError(f'invalid https method: {self.method!r}')
         self.headers = {
             'User-Agent':   'PyDNS/0.0.1',
             'Accept':       'application/dns-message',
             'Content-Type': 'application/dns-message'
         }
+        self.context   = self.context or ssl.create_default_context()
+        self.sessions  = SessionCache()
+        self.endpoints = {u: Endpoint.parse(u) for u in [self.url, *self.urls]}
+        self.pools: Dict[Tuple[str, int], ConnectionPool] = {}
+        self.selector  = Selector([self.url, *self.urls])
+        self.hedger    = Hedger(
+            self.selector, self.hedge, self.retry, self.timeout)
+
+    def connect(self, endpoint: Endpoint) -> Connection:
+        """
+        spawn new persistent connection to the specified upstream
+
+        :param endpoint: parsed upstream endpoint
+        :return:         new (lazily connected) https connection
+        """
+        return Connection(endpoint.host, endpoint.port,
+            self.timeout, self.context, self.sessions) #type: ignore
+
+    def cleanup(self, conn: Connection):
+        """
+        close an existing persistent connection
+
+        :param conn: https connection
+        """
+        conn.close()
+
+    def upstream_pool(self, endpoint: Endpoint) -> ConnectionPool:
+        """
+        retrieve (or spawn) connection pool for the specified upstream host
+
+        :param endpoint: parsed upstream endpoint
+        :return:         pool of persistent connections to upstream
+        """
+        key  = (endpoint.host, endpoint.port)
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                factory=lambda: self.connect(endpoint),
+                cleanup=self.cleanup,
+                max_size=self.pool_size,
+                expiration=self.expiration)
+            pool = self.pools.setdefault(key, pool)
+        return pool
+
+    def exchange(self,
+        conn: Connection, path: str, body: Optional[bytes]) -> bytes:
+        """
+        perform a single http exchange over a persistent connection
+
+        :param conn: https connection
+        :param path: request path
+        :param body: request body (post only)
+        :return:     response content
+        """
+        headers = self.headers
+        if body is None:
+            headers = {k:v for k,v in headers.items() if k != 'Content-Type'}
+        conn.request(self.method, path, body=body, headers=headers)
+        res     = conn.getresponse()
+        content = res.read()
+        if res.status != 200:
+            raise RuntimeError(f'Invalid Response: {res.status} {content}')
+        return content
+
+    def send(self, msg: Message, url: str) -> Message:
+        """
+        send single https request attempt to the specified url
+
+        :param msg: request message
+        :param url: upstream url to send request to
+        :return:    response message
+        """
+        endpoint = self.endpoints[url]
+        path, body = endpoint.path, None
+        if self.method == 'GET':
+            # rfc 8484 recommends message-id zero for cache friendliness
+            data = bytearray()
+            msg.pack_into(data)
+            data[:2] = b'\x00\x00'
+            param = urlsafe_b64encode(data).rstrip(b'=').decode()
+            path  = path + ('&' if '?' in path else '?') + f'dns={param}'
+        else:
+            body = msg.pack()
+        discard = (OSError, HTTPException)
+        with self.upstream_pool(endpoint).reserve(discard_on=discard) as conn:
+            reused = conn.sock is not None
+            try:
+                content = self.exchange(conn, path, body)
+            except (ConnectionError, HTTPException):
+                # idle keep-alive connection may be closed by the server
+                if not reused:
+                    raise
+                conn.close()
+                content = self.exchange(conn, path, body)
+            if conn.sock is not None:
+                key = (endpoint.host, endpoint.port)
+                self.sessions.put(key, conn.sock.session) #type: ignore
+        response = Message.unpack(content, source=url)
+        response.id = msg.id
+        return response
 
     def request(self, msg: Message) -> Message:
         """
@@ -35,11 +202,11 @@ class HttpsClient(BaseClient):
         :param msg: request message
         :return:    response message
         """
-        data    = msg.pack()
-        req     = Request(self.url, data=data, headers=self.headers)
-        res     = urlopen(req, timeout=self.timeout)
-        content = res.read()
-        if res.status != 200:
-            raise RuntimeError(f'Invalid Response: {res.status} {content}')
-        return Message.unpack(content, source=self.url)
+        return self.hedger.request(self.send, msg)
 
+    def drain(self):
+        """
+        drain all persistent connection pools
+        """
+        for pool in self.pools.values():
+            pool.drain()
@@ -0,0 +1,177 @@
+"""
+Latency-Aware Upstream Selection
+"""
+import random
+import time
+from copy import copy
+from threading import Lock
+from collections import deque
+from typing import (
+    Deque, Dict, Generic, Hashable, Iterable, List, Optional, TypeVar)
+
+from pyderive import dataclass, field
+
+#** Variables **#
+__all__ = ['Upstream', 'Selector']
+
+#: generic upstream address type (socket address or url)
+Addr = TypeVar('Addr', bound=Hashable)
+
+#** Classes **#
+
+@dataclass(slots=True)
+class Upstream(Generic[Addr]):
+    """
+    Per-Upstream Latency and Health Statistics
+    """
+    addr:         Addr
+    srtt:         Optional[float] = None
+    rttvar:       float           = 0.0
+    failure_rate: float           = 0.0
+    successes:    int             = 0
+    failures:     int             = 0
+    consecutive:  int             = 0
+    ejections:    int             = 0
+    ejected_till: float           = 0.0
+
+    def ejected(self, now: Optional[float] = None) -> bool:
+        """
+        check if upstream is currently ejected by the circuit-breaker
+
+        :param now: current monotonic time
+        :return:    true if upstream should not be selected
+        """
+        return self.ejected_till > (time.monotonic() if now is None else now)
+
+    def score(self) -> float:
+        """
+        calculate expected time until a successful response (lower is better)
+
+        :return: smoothed rtt scaled by failure rate
+        """
+        if self.srtt is None:
+            return 0.0
+        return self.srtt / max(1.0 - self.failure_rate, 0.01)
+
+@dataclass(slots=True)
+class Selector(Generic[Addr]):
+    """
+    Upstream Selector Preferring the Fastest Healthy Upstreams
+
+    Tracks a smoothed round-trip-time and failure-rate for each upstream
+    (RFC 6298 style moving averages). Unmeasured upstreams are tried first,
+    after which the lowest scoring upstream is chosen while a small fraction
+    of picks explore the remaining healthy upstreams. Upstreams failing
+    `threshold` times in a row are ejected for `eject_time` seconds
+    (doubling w/ each consecutive ejection up to `max_eject_time`) and are
+    retried once the ejection expires.
+    """
+    addresses:      List[Addr]
+    explore:        float = 0.05
+    alpha:          float = 0.125
+    beta:           float = 0.25
+    threshold:      int   = 3
+    eject_time:     float = 5.0
+    max_eject_time: float = 300.0
+    window:         int   = 256
+
+    mutex:     Lock                 = field(default_factory=Lock, init=False)
+    upstreams: Dict[Addr, Upstream] = field(default_factory=dict, init=False)
+    samples:   Deque[float]         = field(init=False)
+
+    def __post_init__(self):
+        self.samples = deque(maxlen=self.window)
+        for addr in self.addresses:
+            self.upstreams.setdefault(self.key(addr), Upstream(addr))
+
+    def key(self, addr: Addr) -> Addr:
+        """convert address into hashable statistics key"""
+        return tuple(addr) if isinstance(addr, list) else addr #type: ignore
+
+    def pick(self, exclude: Iterable[Addr] = ()) -> Addr:
+        """
+        select the next upstream to send a request to
+
+        :param exclude: upstreams to avoid (when alternatives exist)
+        :return:        selected upstream address
+        """
+        upstreams = list(self.upstreams.values())
+        if exclude:
+            skip      = {self.key(addr) for addr in exclude}
+            remaining = [u for u in upstreams if self.key(u.addr) not in skip]
+            upstreams = remaining or upstreams
+        if len(upstreams) == 1:
+            return upstreams[0].addr
+        now     = time.monotonic()
+        healthy = [u for u in upstreams if not u.ejected(now)]
+        if not healthy:
+            return min(upstreams, key=lambda u: u.ejected_till).addr
+        if len(healthy) > 1 and random.random() < self.explore:
+            return random.choice(healthy).addr
+        return min(healthy, key=Upstream.score).addr
+
+    def success(self, addr: Addr, rtt: float):
+        """
+        record successful request and its round-trip-time for upstream
+
+        :param addr: upstream address
+        :param rtt:  measured round-trip-time in seconds
+        """
+        with self.mutex:
+            upstream = self.upstreams.get(self.key(addr))
+            if upstream is None:
+                return
+            if upstream.srtt is None:
+                upstream.srtt   = rtt
+                upstream.rttvar = rtt / 2
+            else:
+                delta = abs(upstream.srtt - rtt)
+                upstream.rttvar += self.beta * (delta - upstream.rttvar)
+                upstream.srtt   += self.alpha * (rtt - upstream.srtt)
+            upstream.failure_rate -= self.alpha * upstream.failure_rate
+            upstream.successes   += 1
+            self.samples.append(rtt)
+            upstream.consecutive  = 0
+            upstream.ejections    = 0
+            upstream.ejected_till = 0.0
+
+    def failure(self, addr: Addr):
+        """
+        record failed request for upstream and eject it when failing often
+
+        :param addr: upstream address
+        """
+        with self.mutex:
+            upstream = self.upstreams.get(self.key(addr))
+            if upstream is None:
+                return
+            upstream.failure_rate += self.alpha * (1 - upstream.failure_rate)
+            upstream.failures     += 1
+            upstream.consecutive  += 1
+            if upstream.consecutive >= self.threshold:
+                backoff = self.eject_time * (2 ** upstream.ejections)
+                upstream.ejected_till = \
+                    time.monotonic() + min(backoff, self.max_eject_time)
+                upstream.ejections += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        calculate rtt percentile across recent samples from all upstreams
+
+        :param q: percentile to calculate (between 0 and 1)
+        :return:  rtt percentile in seconds (if any samples exist)
+        """
+        with self.mutex:
+            samples = sorted(self.samples)
+        if not samples:
+            return None
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+    def stats(self) -> List[Upstream]:
+        """
+        retrieve snapshot of per-upstream statistics
+
+        :return: copies of upstream statistics
+        """
+        with self.mutex:
+            return [copy(u) for u in self.upstreams.values()]
@@ -1,39 +1,144 @@
 """
-Standard UDP/TCP Client Implementations
+Standard UDP/TCP/TLS Client Implementations
 """
-import random
+import select
 import socket
+import ssl
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from contextlib import suppress
+from functools import partial
+from threading import Lock
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
 
 from pypool import Pool
 from pyserve import RawAddr
-from pyderive import dataclass
+from pyderive import dataclass, field
 
-from . import BaseClient, Message
+from . import BaseClient, Message, QueryResult
+from .batch import TcpBatch, UdpBatch
+from .framing import frame, recv_frame
+from .hedge import HedgePolicy, Hedger, RetryPolicy, cancellable
+from .selector import Selector
+from .tls import SessionCache, wrap_socket
+from ..question import Question
 
 #** Variables **#
-__all__ = ['UdpClient', 'TcpClient']
+__all__ = ['UdpClient', 'TcpClient', 'TlsClient']
+
+#** Functions **#
+
+def is_exported(buffer: bytearray) -> bool:
+    """
+    determine if buffer is still referenced by live memoryview slices
+
+    :param buffer: buffer to check for exports
+    :return:       true if buffer cannot be safely reused
+    """
+    try:
+        buffer.append(0)
+        buffer.pop()
+        return False
+    except BufferError:
+        return True
+
+def is_connected(sock: socket.socket) -> bool:
+    """
+    determine if an idle pooled connection is still usable
+
+    Idle connections should never have data waiting, so anything readable
+    means the upstream closed the connection (or sent stray data). Records
+    that only carry tls session tickets are consumed and ignored.
+
+    :param sock: idle connection to check
+    :return:     true if the connection can be reused
+    """
+    readable, _, _ = select.select([sock], [], [], 0)
+    if not readable:
+        return True
+    timeout = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        sock.recv(1)
+        return False
+    except (ssl.SSLWantReadError, BlockingIOError):
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.settimeout(timeout)
 
 #** Classes **#
 
 class SocketPool(Pool[socket.socket]):
     pass
 
+class BufferPool:
+    """
+    Reusable Receive-Buffer Pool avoiding Per-Request Buffer Allocation
+
+    Messages unpacked from a pooled buffer copy the received bytes once so
+    decoded records never reference it. Buffers are additionally only handed
+    out again once every memoryview slice into them has been released.
+    """
+    __slots__ = ('size', 'max_size', 'buffers', 'mutex')
+
+    def __init__(self, size: int, max_size: int = 32):
+        self.size:     int             = size
+        self.max_size: int             = max_size
+        self.buffers:  List[bytearray] = []
+        self.mutex:    Lock            = Lock()
+
+    def get(self) -> bytearray:
+        """
+        retrieve an unreferenced buffer from the pool or allocate a new one
+
+        :return: buffer safe to receive data into
+        """
+        with self.mutex:
+            for n, buffer in enumerate(self.buffers, 0):
+                if not is_exported(buffer):
+                    return self.buffers.pop(n)
+        return bytearray(self.size)
+
+    def put(self, buffer: bytearray):
+        """
+        return buffer to the pool for later reuse
+
+        :param buffer: buffer being returned to pool
+        """
+        with self.mutex:
+            if len(self.buffers) < self.max_size:
+                self.buffers.append(buffer)
+
 @dataclass(slots=True)
 class Client(BaseClient, ABC):
     """
     Baseclass Socket-Based DNS Client Implementation
     """
     addresses:  List[RawAddr]
-    block_size: int           = 65535
-    pool_size:  Optional[int] = None
-    expiration: Optional[int] = 15
-    timeout:    int           = 10
+    block_size: int                   = 65535
+    pool_size:  Optional[int]         = None
+    expiration: Optional[int]         = 15
+    timeout:    int                   = 10
+    hedge:      Optional[HedgePolicy] = None
+    retry:      Optional[RetryPolicy] = None
 
     def __post_init__(self):
-        self.pool = SocketPool(
-            factory=self.newsock,
+        self.pool     = self.new_pool(self.newsock)
+        self.buffers  = BufferPool(self.block_size)
+        self.selector = Selector(self.addresses)
+        self.hedger   = Hedger(
+            self.selector, self.hedge, self.retry, self.timeout)
+
+    def new_pool(self, factory: Callable[[], socket.socket]) -> SocketPool:
+        """
+        spawn new socket pool using the specified socket factory
+
+        :param factory: socket factory function
+        :return:        new socket pool
+        """
+        return SocketPool(
+            factory=factory,
             cleanup=self.cleanup,
             max_size=self.pool_size,
             expiration=self.expiration)
@@ -56,13 +161,27 @@ class Client(BaseClient, ABC):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    def send(self, msg: Message, addr: RawAddr) -> Message:
+        """
+        send single request attempt to the specified upstream
+
+        :param msg:  dns request message
+        :param addr: upstream address to send request to
+        :return:     dns response message
+        """
+        raise NotImplementedError
+
     def pickaddr(self) -> RawAddr:
         """
-        pick random address from list of addresses
+        pick fastest healthy address from list of addresses
 
-        :return: random dns address to make request
+        :return: selected dns address to make request
         """
-        return random.choice(self.addresses)
+        return self.selector.pick()
+
+    def request(self, msg: Message) -> Message:
+        return self.hedger.request(self.send, msg)
 
     def drain(self):
         """
@@ -83,43 +202,183 @@ class UdpClient(Client):
     def cleanup(self, sock: socket.socket):
         sock.close()
 
-    def request(self, msg: Message) -> Message:
-        with self.pool.reserve(discard_on=(socket.timeout, )) as sock:
-            # send request
-            addr = self.pickaddr()
-            data = msg.pack()
-            sock.sendto(data, addr)
-            # recieve response
-            data, _ = sock.recvfrom(self.block_size)
-            return Message.unpack(data, source=addr[0])
+    def query_many(self,
+        questions: Iterable[Question], concurrency: int = 32,
+    ) -> Iterator[QueryResult]:
+        """
+        resolve many questions over a single shared udp socket
+
+        :param questions:   questions to resolve
+        :param concurrency: maximum number of outstanding queries
+        :return:            iterator of results in completion order
+        """
+        return UdpBatch(self, concurrency).run(questions)
+
+    def send(self, msg: Message, addr: RawAddr) -> Message:
+        buffer = self.buffers.get()
+        try:
+            discard = (socket.timeout, ConnectionError)
+            with self.pool.reserve(discard_on=discard) as sock:
+                # send request
+                data = bytearray()
+                msg.pack_into(data)
+                sock.sendto(data, addr)
+                # recieve response into reusable buffer (w/o allocation)
+                with cancellable(sock):
+                    size, _ = sock.recvfrom_into(buffer, self.block_size)
+                # unpacking copies the received bytes once per message
+                with memoryview(buffer) as view:
+                    return Message.unpack(view[:size], source=addr[0])
+        finally:
+            self.buffers.put(buffer)
 
 class TcpClient(Client):
     """
     Simple TCP Socket DNS Client
+
+    Connections are pooled separately for each upstream address.
     """
 
-    def newsock(self) -> socket.socket:
-        addr = self.pickaddr()
+    def __post_init__(self):
+        super().__post_init__()
+        self.pools: Dict[tuple, SocketPool] = {}
+
+    def connect(self, addr: RawAddr) -> socket.socket:
+        """
+        spawn new socket connected to the specified upstream
+
+        :param addr: upstream address to connect to
+        :return:     new connected socket object
+        """
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(self.timeout)
-        sock.connect(addr)
+        try:
+            sock.connect(addr)
+        except OSError:
+            sock.close()
+            raise
         return sock
 
+    def newsock(self) -> socket.socket:
+        return self.connect(self.pickaddr())
+
     def cleanup(self, sock: socket.socket):
-        sock.shutdown(socket.SHUT_RDWR)
+        # connections reset by the upstream are no longer connected
+        with suppress(OSError):
+            sock.shutdown(socket.SHUT_RDWR)
         sock.close()
 
-    def request(self, msg: Message) -> Message:
-        with self.pool.reserve(discard_on=(socket.timeout, )) as sock:
-            # send request
-            data = msg.pack()
-            data = len(data).to_bytes(2, 'big') + data
-            sock.send(data)
-            # recieve size of response
-            sizeb = sock.recv(2)
-            size  = int.from_bytes(sizeb, 'big')
-            # read data from size
-            data = sock.recv(size)
-            addr = sock.getpeername()
-            return Message.unpack(data, source=addr[0])
+    def upstream_pool(self, addr: RawAddr) -> SocketPool:
+        """
+        retrieve (or spawn) connection pool for the specified upstream
+
+        :param addr: upstream address
+        :return:     socket pool of connections to upstream
+        """
+        key  = tuple(addr)
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.new_pool(partial(self.connect, addr))
+            pool = self.pools.setdefault(key, pool)
+        return pool
+
+    def reserve(self, pool: SocketPool) -> socket.socket:
+        """
+        retrieve usable connection from pool, replacing closed connections
+
+        :param pool: upstream connection pool
+        :return:     connected socket
+        """
+        while True:
+            sock = pool.get()
+            if is_connected(sock):
+                return sock
+            pool.discard(sock)
+
+    def warm(self, connections: int = 1):
+        """
+        pre-establish idle pooled connections to every upstream
+
+        :param connections: number of connections to open per upstream
+        """
+        for addr in self.addresses:
+            pool  = self.upstream_pool(addr)
+            socks = [pool.get() for _ in range(connections)]
+            for sock in socks:
+                pool.put(sock)
+
+    def query_many(self,
+        questions: Iterable[Question], concurrency: int = 32,
+    ) -> Iterator[QueryResult]:
+        """
+        resolve many questions pipelined over a pooled tcp connection
+
+        :param questions:   questions to resolve
+        :param concurrency: maximum number of outstanding queries
+        :return:            iterator of results in completion order
+        """
+        return TcpBatch(self, concurrency).run(questions)
+
+    def send(self, msg: Message, addr: RawAddr) -> Message:
+        pool = self.upstream_pool(addr)
+        sock = self.reserve(pool)
+        try:
+            # send request and reassemble length-prefixed response
+            with cancellable(sock):
+                sock.sendall(frame(msg))
+                data = recv_frame(sock)
+        except OSError:
+            pool.discard(sock)
+            raise
+        pool.put(sock)
+        return Message.unpack(data, source=addr[0])
+
+    def drain(self):
+        super().drain()
+        for pool in self.pools.values():
+            pool.drain()
+
+@dataclass(slots=True)
+class TlsClient(TcpClient):
+    """
+    DNS over TLS (RFC 7858) Socket Client
+
+    Connections are pooled per upstream like `TcpClient` and kept alive
+    while idle. Reconnects resume the cached tls session of the upstream
+    instead of performing a full handshake, and idle connections closed by
+    the upstream are replaced before being used. The `hostname` is used
+    for SNI and certificate validation (defaults to the upstream ip).
+    """
+    hostname: Optional[str]            = None
+    context:  Optional[ssl.SSLContext] = None
+    sessions: SessionCache             = field(init=False)
+
+    def __post_init__(self):
+        TcpClient.__post_init__(self)
+        self.context  = self.context or ssl.create_default_context()
+        self.sessions = SessionCache()
+
+    def connect(self, addr: RawAddr) -> socket.socket:
+        sock = TcpClient.connect(self, addr)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        try:
+            return wrap_socket(self.context, sock, #type: ignore
+                self.hostname or addr[0], self.sessions, tuple(addr))
+        except OSError:
+            sock.close()
+            raise
 
+    def send(self, msg: Message, addr: RawAddr) -> Message:
+        pool = self.upstream_pool(addr)
+        sock = self.reserve(pool)
+        try:
+            with cancellable(sock):
+                sock.sendall(frame(msg))
+                data = recv_frame(sock)
+        except OSError:
+            pool.discard(sock)
+            raise
+        # tls 1.3 session tickets only arrive after the handshake completes
+        self.sessions.put(tuple(addr), sock.session) #type: ignore
+        pool.put(sock)
+        return Message.unpack(data, source=addr[0])
@@ -0,0 +1,96 @@
+"""
+Shared TLS Utilities for Encrypted DNS Clients
+"""
+import ssl
+from threading import Lock
+from typing import Dict, Hashable, Optional
+
+#** Variables **#
+__all__ = ['SessionCache', 'wrap_socket']
+
+#** Functions **#
+
+def wrap_socket(
+    context:  ssl.SSLContext,
+    sock,
+    hostname: str,
+    sessions: 'SessionCache',
+    key:      Hashable,
+) -> ssl.SSLSocket:
+    """
+    wrap connected socket in tls, resuming a cached session when possible
+
+    :param context:  tls context (sessions only resume within one context)
+    :param sock:     connected socket to wrap
+    :param hostname: server hostname for sni and certificate validation
+    :param sessions: tls session cache
+    :param key:      session cache key for upstream
+    :return:         tls wrapped socket
+    """
+    session = sessions.get(key)
+    try:
+        tls = context.wrap_socket(
+            sock, server_hostname=hostname, session=session)
+    except ssl.SSLError:
+        sessions.discard(key)
+        raise
+    sessions.record(key, tls)
+    return tls
+
+#** Classes **#
+
+class SessionCache:
+    """
+    Thread-Safe TLS Session Cache keyed by Upstream
+
+    Reconnects present the cached session so the server can resume it
+    (abbreviated handshake) instead of performing a full handshake.
+    """
+    __slots__ = ('sessions', 'mutex', 'resumed', 'handshakes')
+
+    def __init__(self):
+        self.sessions:   Dict[Hashable, ssl.SSLSession] = {}
+        self.mutex:      Lock                           = Lock()
+        self.resumed:    int                            = 0
+        self.handshakes: int                            = 0
+
+    def get(self, key: Hashable) -> Optional[ssl.SSLSession]:
+        """
+        retrieve cached session for upstream (if any)
+
+        :param key: upstream session key
+        :return:    cached tls session
+        """
+        return self.sessions.get(key)
+
+    def put(self, key: Hashable, session: Optional[ssl.SSLSession]):
+        """
+        save latest resumable session for upstream
+
+        :param key:     upstream session key
+        :param session: tls session to cache
+        """
+        if session is not None:
+            with self.mutex:
+                self.sessions[key] = session
+
+    def discard(self, key: Hashable):
+        """
+        forget cached session for upstream
+
+        :param key: upstream session key
+        """
+        with self.mutex:
+            self.sessions.pop(key, None)
+
+    def record(self, key: Hashable, sock: ssl.SSLSocket):
+        """
+        record completed handshake and cache the connection's session
+
+        :param key:  upstream session key
+        :param sock: tls socket w/ completed handshake
+        """
+        with self.mutex:
+            self.handshakes += 1
+            self.resumed    += int(sock.session_reused)
+        self.put(key, sock.session)
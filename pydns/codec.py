@@ -0,0 +1,396 @@
+"""
+Compiled Fast-Path Codec for DNS Messages
+
+Unpacks the hot message types using precomputed `struct.Struct` formats
+and a hand-written domain label walker rather than dispatching field by
+field through the generic pystructs definitions. Packing is implemented by
+each object's `pack_into` method which writes directly into a single buffer.
+Output is byte-identical to the standard codec and domain compression state
+is shared through the same `Context` object, so unsupported content types
+transparently fall back to their standard implementations.
+
+Any bytes-like buffer (bytes/bytearray/memoryview) may be unpacked, but
+mutable or borrowed buffers are copied into bytes once per message so that
+decoded records never reference (or pin) the original buffer. Opaque rdata
+(TXT/OPT/Unknown) and lazy content are then slices of, or references to,
+that immutable copy.
+
+In lazy-content mode record rdata is not decoded at all during unpacking.
+Each answer instead holds a `LazyContent` view which decodes on first
+attribute access and re-packs its raw rdata verbatim when unmodified.
+"""
+import struct
+from ipaddress import IPv4Address, IPv6Address
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from pystructs import Context
+
+from .answer import Answer, PreRequisite, Update, get_ctype
+from .content import A, AAAA, CNAME, MX, NS, PTR, SOA, SRV, TXT, Content
+from .edns import EdnsAnswer
+from .enum import OpCode, RClass, RType
+from .flags import Flags
+from .question import Question, Zone
+from .wire import EDNS, HEADER, QTAIL, RRTAIL, SOATAIL, SRVHEAD, UINT16, UINT32
+from .wire import Buffer, freeze, unpack_domain, write
+
+#** Variables **#
+__all__ = [
+    'use_fastpath',
+    'is_fastpath',
+    'use_lazy_content',
+    'is_lazy_content',
+
+    'LazyContent',
+    'unpack_question',
+    'unpack_answer',
+    'unpack_additional',
+    'unpack_message',
+]
+
+#: global toggle to enable fast-path codec by default
+FASTPATH = False
+
+#: global toggle to enable lazy rdata decoding by default
+LAZY_CONTENT = False
+
+#: precomputed enum lookups to avoid enum-constructor overhead
+RTYPES   = {int(r): r for r in RType}
+RCLASSES = {int(c): c for c in RClass}
+
+Decoder = Callable[[bytes, Context], Content]
+
+SectionClasses = Tuple[Type[Question], Type[Answer], Type[Answer]]
+
+#** Functions **#
+
+def use_fastpath(enabled: bool = True):
+    """
+    globally enable/disable the fast-path codec for message packing
+
+    :param enabled: enable fast-path codec when true
+    """
+    global FASTPATH
+    FASTPATH = enabled
+
+def is_fastpath(fast: Optional[bool] = None) -> bool:
+    """
+    determine if fast-path codec should be used for the current call
+
+    :param fast: per-call override of global fast-path setting
+    :return:     true if fast-path codec should be used
+    """
+    return FASTPATH if fast is None else fast
+
+def use_lazy_content(enabled: bool = True):
+    """
+    globally enable/disable lazy rdata decoding for message unpacking
+
+    :param enabled: enable lazy content decoding when true
+    """
+    global LAZY_CONTENT
+    LAZY_CONTENT = enabled
+
+def is_lazy_content(lazy: Optional[bool] = None) -> bool:
+    """
+    determine if lazy content decoding should be used for the current call
+
+    :param lazy: per-call override of global lazy-content setting
+    :return:     true if record content should be decoded lazily
+    """
+    return LAZY_CONTENT if lazy is None else lazy
+
+def to_rtype(value: int) -> RType:
+    """retrieve rtype enum from integer w/ precomputed lookup"""
+    return RTYPES.get(value) or RType(value)
+
+def to_rclass(value: int) -> RClass:
+    """retrieve rclass enum from integer w/ precomputed lookup"""
+    return RCLASSES.get(value) or RClass(value)
+
+#** Content Decoders **#
+
+def _unpack_ipv4(raw: bytes, ctx: Context) -> Content:
+    idx = ctx.index
+    ctx.index += 4
+    return A(IPv4Address(bytes(raw[idx:idx + 4])))
+
+def _unpack_ipv6(raw: bytes, ctx: Context) -> Content:
+    idx = ctx.index
+    ctx.index += 16
+    return AAAA(IPv6Address(bytes(raw[idx:idx + 16])))
+
+def _unpack_cname(raw: bytes, ctx: Context) -> Content:
+    return CNAME(unpack_domain(raw, ctx))
+
+def _unpack_ns(raw: bytes, ctx: Context) -> Content:
+    return NS(unpack_domain(raw, ctx))
+
+def _unpack_ptr(raw: bytes, ctx: Context) -> Content:
+    return PTR(unpack_domain(raw, ctx))
+
+def _unpack_mx(raw: bytes, ctx: Context) -> Content:
+    (preference, ) = UINT16.unpack_from(raw, ctx.index)
+    ctx.index += UINT16.size
+    return MX(preference, unpack_domain(raw, ctx))
+
+def _unpack_srv(raw: bytes, ctx: Context) -> Content:
+    priority, weight, port = SRVHEAD.unpack_from(raw, ctx.index)
+    ctx.index += SRVHEAD.size
+    return SRV(priority, weight, port, unpack_domain(raw, ctx))
+
+def _unpack_soa(raw: bytes, ctx: Context) -> Content:
+    mname = unpack_domain(raw, ctx)
+    rname = unpack_domain(raw, ctx)
+    tail  = SOATAIL.unpack_from(raw, ctx.index)
+    ctx.index += SOATAIL.size
+    return SOA(mname, rname, *tail)
+
+def _unpack_txt(raw: bytes, ctx: Context) -> Content:
+    (size, ) = UINT32.unpack_from(raw, ctx.index)
+    start    = ctx.index + UINT32.size
+    text     = freeze(raw[start:start + size])
+    ctx.index = start + len(text)
+    return TXT(text)
+
+#: fast-path content decoders for hot record types
+DECODERS: Dict[RType, Decoder] = {
+    RType.A:     _unpack_ipv4,
+    RType.AAAA:  _unpack_ipv6,
+    RType.CNAME: _unpack_cname,
+    RType.NS:    _unpack_ns,
+    RType.PTR:   _unpack_ptr,
+    RType.MX:    _unpack_mx,
+    RType.SRV:   _unpack_srv,
+    RType.SOA:   _unpack_soa,
+    RType.TXT:   _unpack_txt,
+}
+
+#: record types whose rdata contains (possibly compressed) domain names
+NAMED_RTYPES = {
+    RType.CNAME, RType.NS, RType.PTR, RType.MX, RType.SRV, RType.SOA}
+
+#** Classes **#
+
+class LazyContent:
+    """
+    Record Content View Decoded on First Attribute Access
+
+    Keeps a reference to the original message buffer, the location of the
+    rdata and the shared decompression state of the message. Attribute reads
+    decode the rdata once and proxy to the decoded content, while attribute
+    assignment marks the view as modified by releasing the raw rdata.
+    Re-packing an unmodified view copies the raw rdata verbatim unless it
+    contains domain names, which are re-encoded to keep compression valid.
+    """
+    __slots__ = ('rtype', 'source', '_content')
+
+    def __init__(self,
+        rtype: RType, raw: bytes, start: int, size: int, ctx: Context):
+        # bypass proxied `__setattr__` to keep construction cheap
+        setslot = object.__setattr__
+        setslot(self, 'rtype', rtype)
+        setslot(self, 'source', (raw, start, size, ctx))
+        setslot(self, '_content', None)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.decode(), name)
+
+    def __setattr__(self, name: str, value: Any):
+        if name in LazyContent.__slots__:
+            return object.__setattr__(self, name, value)
+        # modified content no longer matches (or needs) the raw rdata
+        setattr(self.decode(), name, value)
+        object.__setattr__(self, 'source', None)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, LazyContent):
+            other = other.decode()
+        return self.decode() == other
+
+    __hash__ = None #type: ignore
+
+    def __repr__(self) -> str:
+        return repr(self.decode())
+
+    @property
+    def decoded(self) -> bool:
+        """return true if rdata has already been decoded"""
+        return self._content is not None
+
+    def reusable(self) -> bool:
+        """return true if raw rdata may be written verbatim when packing"""
+        return self.source is not None and self.rtype not in NAMED_RTYPES
+
+    def decode(self) -> Content:
+        """
+        decode rdata into its content object (cached after first call)
+
+        :return: decoded record content
+        """
+        content = self._content
+        if content is None:
+            raw, start, size, shared = self.source #type: ignore
+            ctx = Context(start, shared.index_to_domain, shared.domain_to_index)
+            decoder = DECODERS.get(self.rtype)
+            content = decoder(raw, ctx) if decoder is not None \
+                else get_ctype(self.rtype, size).unpack(raw, ctx)
+            object.__setattr__(self, '_content', content)
+        return content
+
+    def pack(self, ctx: Optional[Context] = None) -> bytes:
+        """
+        pack content into bytes reusing raw rdata when possible
+
+        :param ctx: serialization context object
+        :return:    packed rdata
+        """
+        if not self.reusable():
+            return self.decode().pack(ctx)
+        raw, start, size, _ = self.source #type: ignore
+        rdata = bytes(raw[start:start + size])
+        return ctx.track_bytes(rdata) if ctx is not None else rdata
+
+    def pack_into(self,
+        buf: Buffer, offset: int = 0, ctx: Optional[Context] = None) -> int:
+        """
+        pack content into buffer reusing raw rdata when possible
+
+        :param buf:    buffer to write rdata into
+        :param offset: offset within buffer to write rdata
+        :param ctx:    serialization context object
+        :return:       offset directly after written rdata
+        """
+        if not self.reusable():
+            return self.decode().pack_into(buf, offset, ctx)
+        raw, start, size, _ = self.source #type: ignore
+        if ctx is not None:
+            ctx.index += size
+        return write(buf, offset, raw[start:start + size])
+
+#** Message Codec **#
+
+def section_classes(flags: Flags) -> SectionClasses:
+    """
+    determine question/answer/authority classes based on message opcode
+
+    :param flags: message flags object
+    :return:      (question class, answer class, authority class)
+    """
+    return (Question, Answer, Answer) \
+        if flags.op != OpCode.Update else \
+        (Zone, PreRequisite, Update)
+
+def unpack_question(raw: bytes, ctx: Context,
+    qclass: Type[Question] = Question) -> Question:
+    """
+    unpack question from raw buffer using fast-path decoders
+
+    :param raw:    raw byte buffer
+    :param ctx:    deserialization context object
+    :param qclass: question class to generate
+    :return:       unpacked question object
+    """
+    name = unpack_domain(raw, ctx)
+    qtype, qklass = QTAIL.unpack_from(raw, ctx.index)
+    ctx.index += QTAIL.size
+    return qclass(name, to_rtype(qtype), to_rclass(qklass))
+
+def unpack_record(raw: bytes, ctx: Context, name: bytes,
+    anclass: Type[Answer] = Answer, lazy: bool = False) -> Answer:
+    """
+    unpack remaining answer record after domain using fast-path decoders
+
+    :param raw:     raw byte buffer
+    :param ctx:     deserialization context object
+    :param name:    already unpacked answer domain
+    :param anclass: answer class to generate
+    :param lazy:    defer rdata decoding until first access
+    :return:        unpacked answer object
+    """
+    code, klass, ttl, size = RRTAIL.unpack_from(raw, ctx.index)
+    ctx.index += RRTAIL.size
+    code    = to_rtype(code)
+    decoder = DECODERS.get(code)
+    if lazy and decoder is not None and isinstance(raw, bytes):
+        if ctx.index + size > len(raw):
+            raise struct.error(f'rdata exceeds buffer by {size} bytes')
+        content = LazyContent(code, raw, ctx.index, size, ctx)
+        ctx.index += size
+        return anclass(name, ttl, content, to_rclass(klass)) #type: ignore
+    content = decoder(raw, ctx) if decoder is not None \
+        else get_ctype(code, size).unpack(raw, ctx)
+    return anclass(name, ttl, content, to_rclass(klass))
+
+def unpack_answer(raw: bytes, ctx: Context,
+    anclass: Type[Answer] = Answer, lazy: bool = False) -> Answer:
+    """
+    unpack answer from raw buffer using fast-path decoders when available
+
+    :param raw:     raw byte buffer
+    :param ctx:     deserialization context object
+    :param anclass: answer class to generate
+    :param lazy:    defer rdata decoding until first access
+    :return:        unpacked answer object
+    """
+    name = unpack_domain(raw, ctx)
+    return unpack_record(raw, ctx, name, anclass, lazy)
+
+def unpack_additional(raw: bytes, ctx: Context, lazy: bool = False):
+    """
+    unpack additional record as either edns or standard answer
+
+    :param raw:  raw byte buffer
+    :param ctx:  deserialization context object
+    :param lazy: defer rdata decoding until first access
+    :return:     unpacked additional answer object
+    """
+    name     = unpack_domain(raw, ctx)
+    (code, ) = UINT16.unpack_from(raw, ctx.index)
+    if code != RType.OPT:
+        return unpack_record(raw, ctx, name, lazy=lazy)
+    _, udp_size, _, version, _, size = EDNS.unpack_from(raw, ctx.index)
+    ctx.index += EDNS.size
+    content    = freeze(raw[ctx.index:ctx.index + size])
+    ctx.index += len(content)
+    return EdnsAnswer(name, version, content, udp_size)
+
+def unpack_message(cls, raw: bytes, ctx: Optional[Context] = None,
+    source: Optional[str] = None, lazy: bool = False):
+    """
+    unpack serialized bytes into message object using fast-path codec
+
+    :param cls:    message class to generate
+    :param raw:    raw byte buffer
+    :param ctx:    deserialization context object
+    :param source: source attribution for message
+    :param lazy:   defer rdata decoding until first access
+    :return:       unpacked message object
+    """
+    ctx = ctx or Context()
+    raw = freeze(raw)
+    try:
+        mid, iflags, nq, nan, nau, nad = HEADER.unpack_from(raw, ctx.index)
+        ctx.index += HEADER.size
+        flags = Flags.fromint(iflags)
+        # parse body content w/ determined classes
+        qclass, anclass, auclass = section_classes(flags)
+        questions  = [unpack_question(raw, ctx, qclass) for _ in range(nq)]
+        answers    = [
+            unpack_answer(raw, ctx, anclass, lazy) for _ in range(nan)]
+        authority  = [
+            unpack_answer(raw, ctx, auclass, lazy) for _ in range(nau)]
+        additional = [unpack_additional(raw, ctx, lazy) for _ in range(nad)]
+    except struct.error as e:
+        raise ValueError(f'Message->too little data to unpack: {e}') from None
+    return cls(
+        id=mid,
+        flags=flags,
+        questions=questions,
+        answers=answers,
+        authority=authority,
+        additional=additional,
+        source=source,
+    )
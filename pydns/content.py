@@ -2,12 +2,17 @@
 DNS Answer RR Content Definitions
 """
 from functools import lru_cache
+from ipaddress import IPv4Address, IPv6Address
 from typing import ClassVar, Optional, Type
 from typing_extensions import Annotated, Self
 
-from pystructs import U16, U32, Context, Domain, HintedBytes, IPv4, IPv6, Struct
+from pystructs import U16, U32, Context, Domain, HintedBytes, Struct
+from pystructs import IPv4Field as BaseIPv4Field
+from pystructs import IPv6Field as BaseIPv6Field
 
 from . enum import RType
+from .wire import SOATAIL, SRVHEAD, UINT16, UINT32, Buffer
+from .wire import pack_domain, write, write_struct
 
 #** Variables **#
 __all__ = [
@@ -29,12 +34,44 @@ __all__ = [
 
 #** Classes **#
 
+class IPv4Field(BaseIPv4Field):
+    """
+    IPv4Address Serializer supporting bytearray/memoryview Buffers
+    """
+
+    def _unpack(self, raw: bytes, ctx: Context) -> IPv4Address:
+        return IPv4Address(bytes(ctx.slice(raw, 4)))
+
+class IPv6Field(BaseIPv6Field):
+    """
+    IPv6Address Serializer supporting bytearray/memoryview Buffers
+    """
+
+    def _unpack(self, raw: bytes, ctx: Context) -> IPv6Address:
+        return IPv6Address(bytes(ctx.slice(raw, 16)))
+
+IPv4 = Annotated[IPv4Address, IPv4Field()]
+IPv6 = Annotated[IPv6Address, IPv6Field()]
+
 class Content(Struct):
     """
     Abstract Baseclass for DNS RR Record Content
     """
     rtype: ClassVar[RType]
 
+    def pack_into(self,
+        buf: Buffer, offset: int = 0, ctx: Optional[Context] = None) -> int:
+        """
+        pack content directly into buffer at the specified offset
+
+        :param buf:    buffer to write content into
+        :param offset: offset within buffer to write content
+        :param ctx:    serialization context object
+        :return:       offset directly after written content
+        """
+        ctx = ctx or Context()
+        return write(buf, offset, self.pack(ctx))
+
 class NULL(Content):
     """
     NULL RR - Signifies that query does not exist
@@ -54,6 +91,10 @@ class CNAME(Content):
     rtype: ClassVar[RType] = RType.CNAME
     name:  Domain
 
+    def pack_into(self,
+        buf: Buffer, offset: int = 0, ctx: Optional[Context] = None) -> int:
+        return pack_domain(buf, offset, self.name, ctx or Context())
+
 class MX(Content):
     """
     MX RR - Mail Server
@@ -62,6 +103,13 @@ class MX(Content):
     preference: U16
     exchange:   Domain
 
+    def pack_into(self,
+        buf: Buffer, offset: int = 0, ctx: Optional[Context] = None) -> int:
+        ctx        = ctx or Context()
+        offset     = write_struct(buf, offset, UINT16, self.preference)
+        ctx.index += UINT16.size
+        return pack_domain(buf, offset, self.exchange, ctx)
+
 class NS(Content):
     """
     NS RR - Name Server (authoritative dns zone for domain)
@@ -69,6 +117,10 @@ class NS(Content):
     rtype:      ClassVar[RType] = RType.NS
     nameserver: Domain
 
+    def pack_into(self,
+        buf: Buffer, offset: int = 0, ctx: Optional[Context] = None) -> int:
+        return pack_domain(buf, offset, self.nameserver, ctx or Context())
+
 class PTR(Content):
     """
     PTR RR - Pointer (reverse ip to domain lookup)
@@ -76,6 +128,10 @@ class PTR(Content):
     rtype:   ClassVar[RType] = RType.PTR
     ptrname: Domain
 
+    def pack_into(self,
+        buf: Buffer, offset: int = 0, ctx: Optional[Context] = None) -> int:
+        return pack_domain(buf, offset, self.ptrname, ctx or Context())
+
 class SOA(Content):
     """
     SOA RR - Start of Authority (authoritative info for domain)
@@ -89,6 +145,16 @@ class SOA(Content):
     expire:    U32
     minimum:   U32
 
+    def pack_into(self,
+        buf: Buffer, offset: int = 0, ctx: Optional[Context] = None) -> int:
+        ctx    = ctx or Context()
+        offset = pack_domain(buf, offset, self.mname, ctx)
+        offset = pack_domain(buf, offset, self.rname, ctx)
+        offset = write_struct(buf, offset, SOATAIL, self.serialver,
+            self.refresh, self.retry, self.expire, self.minimum)
+        ctx.index += SOATAIL.size
+        return offset
+
 class TXT(Content):
     """
     TXT RR - Text Record (Arbitrary Text Blob over DNS)
@@ -96,6 +162,13 @@ class TXT(Content):
     rtype: ClassVar[RType] = RType.TXT
     text:  Annotated[bytes, HintedBytes(U32)]
 
+    def pack_into(self,
+        buf: Buffer, offset: int = 0, ctx: Optional[Context] = None) -> int:
+        ctx        = ctx or Context()
+        offset     = write_struct(buf, offset, UINT32, len(self.text))
+        ctx.index += UINT32.size + len(self.text)
+        return write(buf, offset, self.text)
+
 class A(Content):
     """
     A RR - Address Record (ipv4 address)
@@ -103,6 +176,14 @@ class A(Content):
     rtype: ClassVar[RType] = RType.A
     ip:    IPv4
 
+    def pack_into(self,
+        buf: Buffer, offset: int = 0, ctx: Optional[Context] = None) -> int:
+        ip = self.ip
+        ip = ip if isinstance(ip, IPv4Address) else IPv4Address(ip)
+        if ctx is not None:
+            ctx.index += 4
+        return write(buf, offset, ip.packed)
+
 class AAAA(Content):
     """
     AAAA RR - Ipv6 Address Record (ipv6 address)
@@ -110,6 +191,14 @@ class AAAA(Content):
     rtype: ClassVar[RType] = RType.AAAA
     ip:    IPv6
 
+    def pack_into(self,
+        buf: Buffer, offset: int = 0, ctx: Optional[Context] = None) -> int:
+        ip = self.ip
+        ip = ip if isinstance(ip, IPv6Address) else IPv6Address(ip)
+        if ctx is not None:
+            ctx.index += 16
+        return write(buf, offset, ip.packed)
+
 class SRV(Content):
     """
     SRV RR - Service Record (generalized service rather than NS/MX)
@@ -120,9 +209,20 @@ class SRV(Content):
     port:     U16
     target:   Domain
 
+    def pack_into(self,
+        buf: Buffer, offset: int = 0, ctx: Optional[Context] = None) -> int:
+        ctx    = ctx or Context()
+        offset = write_struct(
+            buf, offset, SRVHEAD, self.priority, self.weight, self.port)
+        ctx.index += SRVHEAD.size
+        return pack_domain(buf, offset, self.target, ctx)
+
 class Unknown:
     """
     Mock Struct/Content Object for Unknown/Unsupported DNS Content Types
+
+    NOTE: data is immutable bytes when unpacked as part of a message
+    (borrowed buffers are copied once per message and sliced from there)
     """
     __slots__ = ('data', )
 
@@ -139,6 +239,12 @@ class Unknown:
         ctx = ctx or Context()
         return ctx.track_bytes(self.data)
 
+    def pack_into(self,
+        buf: Buffer, offset: int = 0, ctx: Optional[Context] = None) -> int:
+        if ctx is not None:
+            ctx.index += len(self.data)
+        return write(buf, offset, self.data)
+
     @classmethod
     def unpack(cls, raw: bytes, ctx: Optional[Context] = None) -> Self:
         ctx = ctx or Context()
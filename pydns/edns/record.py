@@ -9,6 +9,7 @@ from pystructs import Context, Struct, Domain, U8, U16
 
 from ..enum import RType
 from ..answer import BaseAnswer
+from ..wire import EDNS, Buffer, pack_domain, write, write_struct
 
 #** Variables **#
 __all__ = ['ROOT', 'EdnsAnswer']
@@ -53,6 +54,15 @@ class EdnsAnswer(BaseAnswer):
             data_length=len(self.content)
         ).pack(ctx) + ctx.track_bytes(self.content)
 
+    def pack_into(self,
+        buf: Buffer, offset: int = 0, ctx: Optional[Context] = None) -> int:
+        ctx    = ctx or Context()
+        offset = pack_domain(buf, offset, self.name, ctx)
+        offset = write_struct(buf, offset, EDNS, self.rtype,
+            self.udp_size, 0, self.version, 0, len(self.content))
+        ctx.index += EDNS.size + len(self.content)
+        return write(buf, offset, self.content)
+
     @classmethod
     def unpack(cls, raw: bytes, ctx: Optional[Context] = None) -> Self:
         ctx     = ctx or Context()
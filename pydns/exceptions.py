@@ -8,6 +8,7 @@ from .enum import RCode
 #** Variables **#
 __all__ = [
     'DnsError',
+    'FormatError',
     'ServerFailure',
     'NonExistantDomain',
     'NotImplemented',
@@ -40,6 +41,9 @@ class DnsError(Exception):
             return str(self.message)
         return super().__str__()
 
+class FormatError(DnsError):
+    rcode = RCode.FormatError
+
 class ServerFailure(DnsError):
     rcode = RCode.ServerFailure
 
@@ -2,6 +2,8 @@
 DNS Flags Implementation
 """
 from enum import IntFlag
+from functools import lru_cache
+from typing import Tuple
 from typing_extensions import Self
 
 from pyderive import dataclass
@@ -22,6 +24,26 @@ def unmask(flags: int, start: int, end: int) -> int:
     mask = m1 ^ m2
     return flags & mask
 
+@lru_cache(maxsize=None)
+def decode_flags(i: int) -> Tuple:
+    """
+    decode integer flags into ordered arguments for a flags object
+
+    :param i: integer flags parsed from message header
+    :return:  ordered flags arguments
+    """
+    return (
+        QR(i >> 15),
+        OpCode(unmask(i, 11, 15)),
+        bool(i & Flag.Authorative),
+        bool(i & Flag.Truncated),
+        bool(i & Flag.RDesired),
+        bool(i & Flag.RAvailable),
+        bool(i & Flag.Authenticated),
+        bool(i & Flag.CheckingDisabled),
+        RCode(unmask(i, 0, 4)),
+    )
+
 #** Classes **#
 
 class Flag(IntFlag):
@@ -61,14 +83,4 @@ class Flags:
 
     @classmethod
     def fromint(cls, i: int) -> Self:
-        return cls(
-            qr=QR(i >> 15),
-            op=OpCode(unmask(i, 11, 15)),
-            authorative=bool(i & Flag.Authorative),
-            truncated=bool(i & Flag.Truncated),
-            recursion_desired=bool(i & Flag.RDesired),
-            recursion_available=bool(i & Flag.RAvailable),
-            answer_authenticated=bool(i & Flag.Authenticated),
-            checking_disabled=bool(i & Flag.CheckingDisabled),
-            rcode=RCode(unmask(i, 0, 4)),
-        )
+        return cls(*decode_flags(i))
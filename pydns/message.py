@@ -1,21 +1,34 @@
 """
 DNS Message Object Definition
 """
-from typing import List, Optional
+import struct
+from typing import List, Optional, Tuple
 from typing_extensions import Self
 
 from pyderive import dataclass, field
 from pystructs import U16, Context, Struct
 
 from .answer import Answer, BaseAnswer, PreRequisite, Update, peek_rtype
+from .codec import (
+    is_fastpath, is_lazy_content, section_classes, unpack_message,
+    unpack_question, unpack_answer, unpack_additional)
 from .edns import EdnsAnswer
 from .enum import OpCode, RCode, RType
-from .exceptions import raise_error
+from .exceptions import FormatError, raise_error
 from .flags import Flags
 from .question import Question, Zone
+from .wire import (
+    HEADER, Buffer, freeze, peek_record_type,
+    skip_question, skip_record, write_struct)
 
 #** Variables **#
-__all__ = ['Message']
+__all__ = ['Message', 'LazyMessage']
+
+#: minimum encoded size of a single question (root-domain + qtype/qclass)
+MIN_QUESTION = 5
+
+#: minimum encoded size of a single record (root-domain + header/rdlength)
+MIN_RECORD = 11
 
 #** Classes **#
 
@@ -49,13 +62,19 @@ class Message:
             domains = domains[0] if len(domains) == 1 else domains
             raise_error(self.flags.rcode, domains or None)
 
-    def pack(self, ctx: Optional[Context] = None) -> bytes:
+    def pack(self,
+        ctx: Optional[Context] = None, fast: Optional[bool] = None) -> bytes:
         """
         pack message object into serialized bytes
 
-        :param ctx: serialization context object
-        :return:    serialized bytes
+        :param ctx:  serialization context object
+        :param fast: use fast-path codec (defaults to global setting)
+        :return:     serialized bytes
         """
+        if is_fastpath(fast):
+            buf = bytearray()
+            self.pack_into(buf, 0, ctx)
+            return bytes(buf)
         ctx  = ctx or Context()
         raw  = bytearray()
         raw += PacketHeader(
@@ -72,17 +91,56 @@ class Message:
         raw += b''.join(a.pack(ctx) for a in self.additional)
         return bytes(raw)
 
+    def pack_into(self,
+        buf: Buffer, offset: int = 0, ctx: Optional[Context] = None) -> int:
+        """
+        pack message directly into a single buffer at the specified offset
+
+        :param buf:    buffer to write message into (bytearrays will grow)
+        :param offset: offset within buffer to write message
+        :param ctx:    serialization context object
+        :return:       offset directly after written message
+        """
+        ctx = ctx or Context()
+        try:
+            offset = write_struct(buf, offset, HEADER, self.id, int(self.flags),
+                len(self.questions), len(self.answers),
+                len(self.authority), len(self.additional))
+            ctx.index += HEADER.size
+            for q in self.questions:
+                offset = q.pack_into(buf, offset, ctx)
+            for a in self.answers:
+                offset = a.pack_into(buf, offset, ctx)
+            for a in self.authority:
+                offset = a.pack_into(buf, offset, ctx)
+            for a in self.additional:
+                offset = a.pack_into(buf, offset, ctx)
+        except struct.error as e:
+            raise OverflowError(f'Message->{e}') from None
+        return offset
+
     @classmethod
-    def unpack(cls, raw: bytes,
-        ctx: Optional[Context] = None, source: Optional[str] = None) -> Self:
+    def unpack(cls,
+        raw:    bytes,
+        ctx:    Optional[Context] = None,
+        source: Optional[str]     = None,
+        fast:   Optional[bool]    = None,
+        lazy:   Optional[bool]    = None,
+    ) -> Self:
         """
         unpack serialized bytes into deserialized message object
 
         :param raw:    raw byte buffer
         :param ctx:    deserialization context object
         :param source: source attribution for message
+        :param fast:   use fast-path codec (defaults to global setting)
+        :param lazy:   defer rdata decoding (implies fast-path codec)
         :return:       unpacked message object
         """
+        raw  = freeze(raw)
+        lazy = is_lazy_content(lazy)
+        if lazy or is_fastpath(fast):
+            return unpack_message(cls, raw, ctx, source, lazy)
         ctx   = ctx or Context()
         head  = PacketHeader.unpack(raw, ctx)
         flags = Flags.fromint(head.flags)
@@ -97,7 +155,7 @@ class Message:
         additional = []
         for _ in range(head.additional):
             rtype  = peek_rtype(raw, ctx)
-            newcls = EdnsAnswer if rtype == RType.OPT else cls
+            newcls = EdnsAnswer if rtype == RType.OPT else Answer
             answer = newcls.unpack(raw, ctx)
             additional.append(answer)
         return cls(
@@ -109,3 +167,180 @@ class Message:
             additional=additional,
             source=source,
         )
+
+class LazyMessage:
+    """
+    Lazily Decoded DNS Message View (sections decoded on first access)
+    """
+    __slots__ = (
+        'raw',
+        'id',
+        'flags',
+        'source',
+        'counts',
+        'offsets',
+        'edns_offset',
+        'lazy',
+        '_ctx',
+        '_sections',
+    )
+
+    def __init__(self,
+        raw:         bytes,
+        id:          int,
+        flags:       Flags,
+        counts:      Tuple[int, int, int, int],
+        offsets:     Tuple[int, int, int, int],
+        edns_offset: Optional[int] = None,
+        source:      Optional[str] = None,
+        lazy:        bool          = False,
+    ):
+        self.raw         = raw
+        self.id          = id
+        self.flags       = flags
+        self.source      = source
+        self.counts      = counts
+        self.offsets     = offsets
+        self.edns_offset = edns_offset
+        self.lazy        = lazy
+        self._ctx        = Context()
+        self._sections: List[Optional[list]] = [None, None, None, None]
+
+    def __repr__(self) -> str:
+        qd, an, au, ad = self.counts
+        return f'LazyMessage(id={self.id}, flags={self.flags!r}, ' + \
+            f'questions={qd}, answers={an}, authority={au}, additional={ad})'
+
+    def _section(self, n: int) -> list:
+        """
+        decode and cache the specified message section on first access
+        """
+        section = self._sections[n]
+        if section is not None:
+            return section
+        raw   = self.raw
+        ctx   = self._ctx
+        count = self.counts[n]
+        ctx.index = self.offsets[n]
+        qclass, anclass, auclass = section_classes(self.flags)
+        if n == 0:
+            section = [unpack_question(raw, ctx, qclass) for _ in range(count)]
+        elif n == 3:
+            section = [
+                unpack_additional(raw, ctx, self.lazy) for _ in range(count)]
+        else:
+            aclass  = anclass if n == 1 else auclass
+            section = [
+                unpack_answer(raw, ctx, aclass, self.lazy)
+                for _ in range(count)]
+        self._sections[n] = section
+        return section
+
+    @property
+    def questions(self) -> List[Question]:
+        return self._section(0)
+
+    @property
+    def answers(self) -> List[Answer]:
+        return self._section(1)
+
+    @property
+    def authority(self) -> List[Answer]:
+        return self._section(2)
+
+    @property
+    def additional(self) -> List[BaseAnswer]:
+        return self._section(3)
+
+    @property
+    def edns(self) -> Optional[EdnsAnswer]:
+        """
+        decode only the EDNS OPT record from additional section (if present)
+        """
+        if self.edns_offset is None:
+            return
+        if self._sections[3] is not None:
+            return next(a for a in self._sections[3] #type: ignore
+                if isinstance(a, EdnsAnswer))
+        ctx = Context(index=self.edns_offset)
+        return unpack_additional(self.raw, ctx) #type: ignore
+
+    def raise_on_error(self):
+        """
+        raise exception if message contains an error
+        """
+        if self.flags.rcode != RCode.NoError:
+            domains = list({q.name for q in self.questions})
+            domains = domains[0] if len(domains) == 1 else domains
+            raise_error(self.flags.rcode, domains or None)
+
+    def to_message(self) -> Message:
+        """
+        materialize all sections into a standard message object
+
+        :return: fully decoded message object
+        """
+        return Message(
+            id=self.id,
+            flags=self.flags,
+            questions=self.questions,
+            answers=self.answers,
+            authority=self.authority,
+            additional=self.additional,
+            source=self.source,
+        )
+
+    @classmethod
+    def unpack(cls,
+        raw:    bytes,
+        source: Optional[str]  = None,
+        lazy:   Optional[bool] = None,
+    ) -> Self:
+        """
+        parse message header and section offsets without decoding records
+
+        :param raw:    raw byte buffer
+        :param source: source attribution for message
+        :param lazy:   defer rdata decoding within sections until accessed
+        :return:       lazy message view
+        """
+        # reject undersized packets using header counts alone
+        raw = freeze(raw)
+        if len(raw) < HEADER.size:
+            raise FormatError('message too short for header')
+        mid, iflags, *counts = HEADER.unpack_from(raw, 0)
+        qd, an, au, ad = counts
+        minimum = HEADER.size + qd * MIN_QUESTION + (an + au + ad) * MIN_RECORD
+        if minimum > len(raw):
+            raise FormatError(f'message too short for section counts {counts}')
+        try:
+            flags = Flags.fromint(iflags)
+        except ValueError as e:
+            raise FormatError(f'invalid message flags: {e}') from None
+        # walk records to record section offsets w/o decoding
+        try:
+            index = HEADER.size
+            qd_offset = index
+            for _ in range(qd):
+                index = skip_question(raw, index)
+            an_offset = index
+            for _ in range(an):
+                index = skip_record(raw, index)
+            au_offset = index
+            for _ in range(au):
+                index = skip_record(raw, index)
+            ad_offset = index
+            edns      = None
+            for _ in range(ad):
+                if peek_record_type(raw, index) == RType.OPT:
+                    edns = index
+                index = skip_record(raw, index)
+        except (IndexError, struct.error):
+            raise FormatError('message truncated within records') from None
+        if index > len(raw):
+            raise FormatError('message truncated within record data')
+        offsets = (qd_offset, an_offset, au_offset, ad_offset)
+        counts  = tuple(counts)
+        lazy    = is_lazy_content(lazy)
+        return cls(raw, mid, flags, counts,
+            offsets, edns, source, lazy) #type: ignore
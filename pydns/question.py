@@ -1,10 +1,13 @@
 """
 DNS Question Object Definitions
 """
-from pystructs import U16, Domain, Struct
+from typing import Optional
 from typing_extensions import Annotated
 
+from pystructs import U16, Context, Domain, Struct
+
 from .enum import RType, RClass
+from .wire import QTAIL, Buffer, pack_domain, write_struct
 
 #** Variables **#
 __all__ = ['Question', 'Zone']
@@ -19,6 +22,22 @@ class Question(Struct):
     qtype:  Annotated[RType, U16]
     qclass: Annotated[RClass, U16] = RClass.IN
 
+    def pack_into(self,
+        buf: Buffer, offset: int = 0, ctx: Optional[Context] = None) -> int:
+        """
+        pack question directly into buffer at the specified offset
+
+        :param buf:    buffer to write question into
+        :param offset: offset within buffer to write question
+        :param ctx:    serialization context object
+        :return:       offset directly after written question
+        """
+        ctx        = ctx or Context()
+        offset     = pack_domain(buf, offset, self.name, ctx)
+        offset     = write_struct(buf, offset, QTAIL, self.qtype, self.qclass)
+        ctx.index += QTAIL.size
+        return offset
+
 class Zone(Question):
     """
     Alias of Question in UPDATE action DNS Requests
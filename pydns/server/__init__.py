@@ -3,8 +3,10 @@ DNS Extensible Server Implementation
 """
 
 #** Variables **#
-__all__ = ['Server']
+__all__ = ['Mode', 'PacketCache', 'Runner', 'RunnerStats', 'Server']
 
 #** Imports **#
-from .server import Server
+from .packet import PacketCache
+from .runner import Runner, RunnerStats
+from .server import Mode, Server
 
@@ -15,8 +15,10 @@ __all__ = [
     'Backend',
 
     'Cache',
+    'Eviction',
     'Forwarder',
     'MemoryBackend',
+    'SharedCache',
 
     'BlockMode',
     'RuleEngine',
@@ -77,7 +79,9 @@ class Backend(Protocol):
 
 #** Imports **#
 from .cache import Cache
+from .eviction import Eviction
 from .forwarder import Forwarder
 from .memory import MemoryBackend
+from .shared import SharedCache
 from .ruleset import BlockMode, RuleEngine, RuleBackend, DbmRuleEngine
 from .stats import Stats, StatStorage, SimpleStatStore, StatBackend
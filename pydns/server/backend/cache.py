@@ -1,116 +1,567 @@
 """
 Backend Extension to support In-Memory Answer Caching
 """
+import os
 import time
-import math
+from concurrent.futures import Future, ThreadPoolExecutor
+from copy import copy
 from logging import Logger, getLogger
-from threading import Lock
-from typing import ClassVar, Dict, List, Optional, Set
+from threading import Event, Lock, Thread, current_thread
+from typing import ClassVar, Dict, List, Optional, Sequence, Set, Tuple
 
 from pyderive import InitVar, dataclass, field
+from pystructs import Context
 
-from . import Answers, Backend, RType, Answer
+from . import Answers, Backend, RCode, RType, Answer
+from .eviction import Eviction, ShardedStore
+from .expiry import ExpiryHeap
+from .snapshot import SnapshotEntry, read_snapshot, write_snapshot
 from .memory import MemoryBackend
 from .ruleset import RuleBackend
 
 #** Variables **#
-__all__ = ['Cache']
+__all__ = ['CacheStats', 'CacheUsage', 'Cache']
 
 #: default set of other backend sources to ignore
 IGNORE = {MemoryBackend.source, RuleBackend.source}
 
+#: estimated python object overhead of a record (record, tuples, key, slot)
+RECORD_OVERHEAD = 320
+
+#: estimated python object overhead of an answer (answer copies, content)
+ANSWER_OVERHEAD = 160
+
+#** Functions **#
+
+def record_size(answers: Sequence[Answer]) -> int:
+    """
+    estimate memory footprint of a cache record containing answers
+
+    :param answers: record answers
+    :return:        estimated size in bytes
+    """
+    size = RECORD_OVERHEAD + len(answers) * ANSWER_OVERHEAD
+    for answer in answers:
+        size += answer.pack_into(bytearray(), 0, Context())
+    return size
+
 #** Classes **#
 
 @dataclass(slots=True)
 class CacheRecord:
     """
-    Record Entry for In-Memory Cache
+    Immutable Record Entry for In-Memory Cache
+
+    Answers are copied on creation (ttl limited to the record lifetime) and
+    never modified afterwards. Remaining ttls are derived at read time from
+    the absolute creation time. The derived answers are kept as a template
+    for all readers within the same second, and every read returns its own
+    copies (answer and content) so callers are free to modify them. The
+    estimated memory footprint is only calculated once it is requested.
     """
-    answers:    List[Answer]
+    answers:    Tuple[Answer, ...]
     expiration: InitVar[int]
-    expires:    float = field(init=False)
-    accessed:   float = field(init=False)
+    rcode:      Optional[RCode]              = None
+    negative:   bool                         = False
+    ttl:        float                        = field(init=False)
+    created:    float                        = field(init=False)
+    expires:    float                        = field(init=False)
+    hits:       int                          = field(default=0, init=False)
+    size:       Optional[int]                = field(default=None, init=False)
+    view:       Tuple[int, Sequence[Answer]] = field(init=False)
 
     def __post_init__(self, expiration: int): #type: ignore
         """
-        calculate expiration-time and last-accessed time
+        calculate absolute expiration-time and freeze answers
         """
         ttl = min(a.ttl for a in self.answers)
         ttl = min(ttl, expiration) if expiration else ttl
         now = time.time()
-        self.expires  = now + ttl
-        self.accessed = now
+        self.ttl     = ttl
+        self.created = now
+        self.expires = now + ttl
+        self.answers = tuple(
+            self.with_ttl(a, min(a.ttl, ttl)) for a in self.answers)
+        self.view    = (0, self.answers)
+
+    @classmethod
+    def restore(cls, entry: SnapshotEntry) -> 'CacheRecord':
+        """
+        rebuild record from snapshot entry keeping its absolute timestamps
+
+        entry answers were frozen when the record was first created so they
+        are adopted as is (w/o copying them again).
 
-    def is_expired(self) -> bool:
+        :param entry: snapshot entry
+        :return:      restored cache record
         """
-        calculate if expiration has passed or ttl is expired
+        record = cls.__new__(cls)
+        record.answers  = tuple(entry.answers)
+        record.rcode    = entry.rcode
+        record.negative = entry.negative
+        record.ttl      = entry.expires - entry.created
+        record.created  = entry.created
+        record.expires  = entry.expires
+        record.hits     = 0
+        record.size     = None
+        record.view     = (0, record.answers)
+        return record
+
+    def weigh(self) -> int:
         """
-        now = time.time()
-        if self.expires <= now:
-            return True
-        elapsed = math.floor(now - self.accessed)
-        if not elapsed:
-            return False
-        for answer in self.answers:
-            answer.ttl -= elapsed
-            if answer.ttl <= 0:
-                return True
-        self.accessed = now
-        return False
+        estimate memory footprint of record (calculated once on first use)
+
+        :return: estimated size in bytes
+        """
+        if self.size is None:
+            self.size = record_size(self.answers)
+        return self.size
+
+    @staticmethod
+    def detach(answer: Answer) -> Answer:
+        """
+        copy answer and its content so modifications are never shared
+        """
+        answer = copy(answer)
+        answer.content = copy(answer.content)
+        return answer
+
+    @classmethod
+    def with_ttl(cls, answer: Answer, ttl: int) -> Answer:
+        """
+        copy answer (and content) w/ the specified ttl
+        """
+        answer = cls.detach(answer)
+        answer.ttl = ttl
+        return answer
+
+    def is_expired(self, now: Optional[float] = None) -> bool:
+        """
+        calculate if expiration has passed
+        """
+        return self.expires <= (time.time() if now is None else now)
+
+    def current(self, now: float) -> List[Answer]:
+        """
+        retrieve answers w/ ttls counted down to the current time
+
+        :param now: current time
+        :return:    per-read copies of answers w/ remaining ttls
+        """
+        elapsed = int(now - self.created)
+        view    = self.view
+        if view[0] != elapsed:
+            view = (elapsed, tuple(self.with_ttl(a, max(a.ttl - elapsed, 0))
+                for a in self.answers))
+            self.view = view
+        return [self.detach(a) for a in view[1]]
+
+@dataclass(slots=True)
+class CacheStats:
+    """
+    Cache Lookup Counters
+    """
+    hits:       int = 0
+    misses:     int = 0
+    prefetches: int = 0
+    stale:      int = 0
+    negative:   int = 0
+    expired:    int = 0
+
+@dataclass(slots=True)
+class CacheUsage:
+    """
+    Estimated Memory Usage of Cached Records
+    """
+    entries: int = 0
+    bytes:   int = 0
+
+    @property
+    def average(self) -> float:
+        """
+        average estimated size of a single entry
+        """
+        return self.bytes / self.entries if self.entries else 0.0
 
 @dataclass(slots=True, repr=False)
 class Cache(Backend):
     """
     In-Memory Cache Extension for Backend Results
+
+    Refresh-ahead prefetching is enabled by setting `prefetch` to a fraction
+    of the record ttl. Hits on records with at least `prefetch_hits` hits
+    and less than that fraction of their ttl remaining are answered from
+    cache while the record is refreshed from the backend in the background
+    by up to `prefetch_workers` threads (at most `prefetch_limit` refreshes
+    are pending at once).
+
+    RFC 8767 serve-stale is enabled by setting `stale_window`. Expired
+    records are then kept for that many seconds and served w/ `stale_ttl`
+    when the backend fails (or exceeds `stale_deadline` seconds) while the
+    record is refreshed in the background.
+
+    NXDOMAIN and NODATA answers are negatively cached (RFC 2308) along w/
+    their rcode and SOA using the SOA minimum as ttl (capped at
+    `negative_ttl`). Negative caching is disabled when `negative_ttl` is
+    None.
+
+    Both answers and authorities are bounded by `maxsize` entries and are
+    evicted according to the configured `eviction` policy. Entries are split
+    across `shards` independently locked stores to reduce write contention
+    between threads, while cache hits take no lock (counters in `stats` are
+    therefore approximate under concurrency).
+
+    Expired records are actively reclaimed by a background sweeper running
+    every `sweep_interval` seconds (disabled when None) that removes at most
+    `sweep_batch` records per tick, so records that are never requested
+    again do not linger until evicted.
+
+    Setting `max_bytes` additionally bounds the estimated memory footprint
+    of cached records (names, rdata and object overhead). Records are then
+    evicted according to the eviction policy until the cache fits within the
+    budget, while `maxsize` still limits the number of entries.
+
+    Setting `snapshot_path` enables warm restarts. Live records are written
+    to the snapshot w/ their absolute expiration every `snapshot_interval`
+    seconds (if set) and when the cache is closed. An existing snapshot is
+    restored by a background thread on startup (dropping expired records)
+    so that loading large snapshots never delays serving requests.
     """
     source: ClassVar[str] = 'Cache'
 
-    backend:        Backend
-    expiration:     int        = 30
-    maxsize:        int        = 10000
-    ignore_rtypes:  Set[RType] = field(default_factory=lambda: {RType.SOA, })
-    ignore_sources: Set[str]   = field(default_factory=lambda: IGNORE)
-    logger:         Logger     = field(default_factory=lambda: getLogger('pydns'))
+    backend:           Backend
+    expiration:        int             = 30
+    maxsize:           int             = 10000
+    max_bytes:         Optional[int]   = None
+    eviction:          Eviction        = Eviction.LRU
+    shards:            int             = 1
+    ignore_rtypes:     Set[RType]      = field(default_factory=lambda: {RType.SOA, })
+    ignore_sources:    Set[str]        = field(default_factory=lambda: IGNORE)
+    logger:            Logger          = field(default_factory=lambda: getLogger('pydns'))
+    prefetch:          Optional[float] = None
+    prefetch_hits:     int             = 3
+    prefetch_workers:  int             = 4
+    prefetch_limit:    int             = 64
+    stale_window:      Optional[float] = None
+    stale_ttl:         int             = 30
+    stale_deadline:    Optional[float] = 1.8
+    negative_ttl:      Optional[int]   = 900
+    sweep_interval:    Optional[float] = 1.0
+    sweep_batch:       int             = 1000
+    snapshot_path:     Optional[str]   = None
+    snapshot_interval: Optional[float] = None
+
+    mutex:       Lock                           = field(default_factory=Lock, init=False)
+    writing:     Lock                           = field(default_factory=Lock, init=False)
+    cache:       ShardedStore[str, CacheRecord] = field(init=False)
+    authorities: ShardedStore[bytes, bool]      = field(init=False)
+    stats:       CacheStats                     = field(default_factory=CacheStats, init=False)
+    refreshing:  Set[str]                       = field(default_factory=set, init=False)
+    expiry:      ExpiryHeap[str]                = field(default_factory=ExpiryHeap, init=False)
+    closed:      Event                          = field(default_factory=Event, init=False)
+    restored:    Event                          = field(default_factory=Event, init=False)
 
-    mutex:       Lock                   = field(default_factory=Lock, init=False)
-    cache:       Dict[str, CacheRecord] = field(default_factory=dict, init=False)
-    authorities: Dict[bytes, bool]      = field(default_factory=dict, init=False)
+    executor:    Optional[ThreadPoolExecutor] = field(default=None, init=False)
+    sweeper:     Optional[Thread]             = field(default=None, init=False)
+    snapshotter: Optional[Thread]             = field(default=None, init=False)
 
     recursion_available: bool = field(default=False, init=False)
 
     def __post_init__(self):
         self.logger              = self.logger.getChild('cache')
+        self.eviction            = Eviction(self.eviction)
+        self.cache               = self.new_record_store()
+        self.authorities         = self.new_store()
         self.recursion_available = self.backend.recursion_available
+        self.start_snapshots()
+
+    def new_record_store(self) -> ShardedStore:
+        """
+        spawn new store for cached records
+        """
+        return self.new_store(self.max_bytes)
+
+    def new_store(self, max_bytes: Optional[int] = None) -> ShardedStore:
+        """
+        spawn new bounded store using the configured eviction settings
+
+        :param max_bytes: track record sizes and bound their sum (if set)
+        :return:          new sharded store
+        """
+        if max_bytes is None:
+            return ShardedStore(self.eviction, self.maxsize, self.shards)
+        return ShardedStore(self.eviction,
+            self.maxsize, self.shards, max_bytes, CacheRecord.weigh)
+
+    @property
+    def memory(self) -> int:
+        """
+        estimated bytes used by cached records (tracked when `max_bytes` set)
+        """
+        return self.cache.weight
+
+    def usage(self) -> Dict[str, CacheUsage]:
+        """
+        summarize entry count and estimated memory usage per record-type
+
+        :return: usage by record-type name
+        """
+        usage: Dict[str, CacheUsage] = {}
+        for key, record in self.cache.items():
+            rtype = key.rsplit('->', 1)[1]
+            stats = usage.get(rtype) or usage.setdefault(rtype, CacheUsage())
+            stats.entries += 1
+            stats.bytes   += record.weigh()
+        return usage
+
+    def start_sweeper(self):
+        """
+        start background expiry sweeper thread (if enabled)
+        """
+        if self.sweep_interval is None or self.sweeper is not None:
+            return
+        with self.mutex:
+            if self.sweeper is None:
+                self.sweeper = Thread(target=self.run_sweeper,
+                    name='pydns-cache-sweeper', daemon=True)
+                self.sweeper.start()
+
+    def run_sweeper(self):
+        """
+        periodically sweep expired records until the cache is closed
+        """
+        delay = self.sweep_interval
+        while not self.closed.wait(delay):
+            try:
+                removed = self.sweep()
+            except Exception:
+                self.logger.exception('expiry sweep failed')
+                removed = 0
+            # continue shortly when there is a backlog of expired records
+            backlog = removed >= self.sweep_batch
+            delay   = 0.001 if backlog else self.sweep_interval
+
+    def sweep(self, limit: Optional[int] = None) -> int:
+        """
+        remove up to limit records whose expiration (and stale window) passed
+
+        :param limit: maximum number of records to process
+        :return:      number of records removed
+        """
+        now     = time.time()
+        grace   = self.stale_window or 0
+        removed = 0
+        for key in self.expiry.pop_due(now - grace, limit or self.sweep_batch):
+            record = self.cache.peek(key)
+            if record is not None and record.expires + grace <= now:
+                removed += self.cache.pop(key, record) is not None
+        self.stats.expired += removed
+        # drop heap entries of evicted/replaced records once they pile up
+        if len(self.expiry) > 2 * max(len(self.cache), self.sweep_batch):
+            self.expiry.compact(self.cache.__contains__)
+        return removed
+
+    def start_snapshots(self):
+        """
+        restore existing snapshot and start periodic snapshots (if enabled)
+        """
+        if self.snapshot_path is None:
+            self.restored.set()
+            return
+        Thread(target=self.run_restore,
+            name='pydns-cache-restore', daemon=True).start()
+        if self.snapshot_interval is not None:
+            self.snapshotter = Thread(target=self.run_snapshots,
+                name='pydns-cache-snapshot', daemon=True)
+            self.snapshotter.start()
+
+    def run_restore(self):
+        """
+        restore records from the configured snapshot in the background
+        """
+        try:
+            if os.path.exists(self.snapshot_path): #type: ignore
+                count = self.restore()
+                self.logger.info(f'restored {count} records from snapshot')
+        except Exception:
+            self.logger.exception('snapshot restore failed')
+        finally:
+            self.restored.set()
+
+    def run_snapshots(self):
+        """
+        periodically snapshot live records until the cache is closed
+        """
+        while not self.closed.wait(self.snapshot_interval):
+            try:
+                self.snapshot()
+            except Exception:
+                self.logger.exception('cache snapshot failed')
+
+    def snapshot(self, path: Optional[str] = None) -> int:
+        """
+        write live records (including those still servable stale) to file
+
+        :param path: snapshot file path (defaults to `snapshot_path`)
+        :return:     number of records written
+        """
+        path    = path or self.snapshot_path
+        cutoff  = time.time() - (self.stale_window or 0)
+        entries = (
+            SnapshotEntry(key, list(record.answers), record.created,
+                record.expires, record.rcode, record.negative)
+            for key, record in self.cache.items() if record.expires > cutoff
+        )
+        with self.writing:
+            return write_snapshot(path, entries) #type: ignore
+
+    def restore(self, path: Optional[str] = None) -> int:
+        """
+        load unexpired records from snapshot w/o replacing newer records
+
+        :param path: snapshot file path (defaults to `snapshot_path`)
+        :return:     number of records restored
+        """
+        path   = path or self.snapshot_path
+        cutoff = time.time() - (self.stale_window or 0)
+        count  = 0
+        for entry in read_snapshot(path, cutoff): #type: ignore
+            if entry.key in self.cache:
+                continue
+            record = CacheRecord.restore(entry)
+            self.cache.set(entry.key, record)
+            self.expiry.push(record.expires, entry.key)
+            count += 1
+        if count:
+            self.start_sweeper()
+        return count
+
+    def close(self):
+        """
+        stop background workers and write final snapshot (if enabled)
+        """
+        self.closed.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        for thread in (self.sweeper, self.snapshotter):
+            if thread is not None and thread is not current_thread():
+                thread.join()
+        if self.snapshot_path is not None and self.restored.is_set():
+            try:
+                self.snapshot()
+            except Exception:
+                self.logger.exception('cache snapshot failed')
 
     def is_authority(self, domain: bytes) -> bool:
         """
         retrieve if domain is authority from cache before checking backend
         """
         # check cache before querying backend
-        if domain in self.authorities:
-            return self.authorities[domain]
-        # query backend and then permanently cache authority result
+        authority = self.authorities.get(domain)
+        if authority is not None:
+            return authority
+        # query backend and then cache authority result
         authority = self.backend.is_authority(domain)
-        with self.mutex:
-            if len(self.authorities) >= self.maxsize:
-                self.authorities.clear()
-            self.authorities[domain] = authority
+        self.authorities.set(domain, authority)
         return authority
 
     def get_cache(self, domain: bytes, rtype: RType) -> Optional[Answers]:
         """
         retrieve from cache directly if present
         """
+        key    = f'{domain}->{rtype.name}'
+        record = self.cache.get(key)
+        if record is None:
+            self.stats.misses += 1
+            return
+        now = time.time()
+        if record.is_expired(now):
+            self.logger.debug(f'{key} expired')
+            # retain expired record while it can still be served stale
+            if self.stale_window is None \
+                or record.expires + self.stale_window <= now:
+                self.cache.pop(key, record)
+            self.stats.misses += 1
+            return
+        self.stats.hits     += 1
+        self.stats.negative += record.negative
+        record.hits         += 1
+        if self.prefetch is not None \
+            and record.hits >= self.prefetch_hits \
+            and record.expires - now <= record.ttl * self.prefetch:
+            with self.mutex:
+                if self.schedule_refresh(key, domain, rtype) is not None:
+                    self.stats.prefetches += 1
+        return Answers(record.current(now), self.source, record.rcode)
+
+    def get_stale(self, domain: bytes, rtype: RType) -> Optional[Answers]:
+        """
+        retrieve expired answers still within the stale window (if any)
+        """
+        key    = f'{domain}->{rtype.name}'
+        record = self.cache.peek(key)
+        if record is None \
+            or record.expires + self.stale_window <= time.time(): #type: ignore
+            return
+        answers = [record.with_ttl(a, self.stale_ttl) for a in record.answers]
+        return Answers(answers, self.source, record.rcode)
+
+    def serve_stale(self,
+        domain: bytes, rtype: RType, stale: Answers) -> Answers:
+        """
+        attempt backend refresh falling back to stale answers on failure
+        """
         key = f'{domain}->{rtype.name}'
         with self.mutex:
-            if key not in self.cache:
-                return
-            record = self.cache[key]
-            if record.is_expired():
-                self.logger.debug(f'{key} expired')
-                del self.cache[key]
-                return
-            return Answers(record.answers.copy(), self.source)
+            future = self.schedule_refresh(key, domain, rtype)
+        # refresh already in progress (or refresh limit reached)
+        if future is None:
+            return self.stale_answers(key, stale)
+        try:
+            answers = future.result(timeout=self.stale_deadline)
+        except Exception:
+            return self.stale_answers(key, stale)
+        if answers.rcode == RCode.ServerFailure:
+            return self.stale_answers(key, stale)
+        return answers
+
+    def stale_answers(self, key: str, stale: Answers) -> Answers:
+        """
+        report and return stale answers
+        """
+        self.logger.debug(f'{key} serving stale')
+        with self.mutex:
+            self.stats.stale += 1
+        return stale
+
+    def schedule_refresh(self,
+        key: str, domain: bytes, rtype: RType) -> Optional[Future]:
+        """
+        schedule background refresh of cached record (requires mutex)
+        """
+        if key in self.refreshing or len(self.refreshing) >= self.prefetch_limit:
+            return
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                self.prefetch_workers, thread_name_prefix='pydns-refresh')
+        self.refreshing.add(key)
+        return self.executor.submit(self.refresh, key, domain, rtype)
+
+    def refresh(self, key: str, domain: bytes, rtype: RType) -> Answers:
+        """
+        refresh cached record from backend
+        """
+        try:
+            answers = self.backend.get_answers(domain, rtype)
+            if self.is_cacheable(rtype, answers):
+                self.set_cache(domain, rtype, answers)
+            return answers
+        except Exception:
+            self.logger.exception(f'{key} refresh failed')
+            raise
+        finally:
+            with self.mutex:
+                self.refreshing.discard(key)
 
     def set_cache(self, domain: bytes, rtype: RType, answers: Answers):
         """
@@ -119,12 +570,50 @@ class Cache(Backend):
         if not answers.answers:
             self.logger.debug(f'cannot cache empty record for {domain!r}')
             return
-        key = f'{domain}->{rtype.name}'
-        with self.mutex:
-            if len(self.cache) >= self.maxsize:
-                self.logger.debug(f'maxsize: {self.maxsize} exceeded. clearing cache!')
-                self.cache.clear()
-            self.cache[key] = CacheRecord(answers.answers.copy(), self.expiration)
+        key        = f'{domain}->{rtype.name}'
+        expiration = self.negative_expiration(rtype, answers)
+        negative   = expiration is not None
+        expiration = expiration if negative else self.expiration
+        record     = CacheRecord(tuple(answers.answers),
+            expiration, answers.rcode, negative) #type: ignore
+        self.cache.set(key, record)
+        self.expiry.push(record.expires, key)
+        self.start_sweeper()
+
+    def is_cacheable(self, rtype: RType, answers: Answers) -> bool:
+        """
+        determine if backend answers should be saved to cache
+        """
+        if answers.source in self.ignore_sources:
+            return False
+        expiration = self.negative_expiration(rtype, answers)
+        if expiration is not None:
+            return expiration > 0
+        if answers.rcode not in (None, RCode.NoError):
+            return False
+        if rtype not in self.ignore_rtypes \
+            and all(a.rtype in self.ignore_rtypes for a in answers.answers):
+            return False
+        return bool(answers.answers)
+
+    def negative_expiration(self,
+        rtype: RType, answers: Answers) -> Optional[int]:
+        """
+        calculate rfc 2308 negative cache ttl for nxdomain/nodata answers
+
+        :param rtype:   requested record-type
+        :param answers: backend answers
+        :return:        negative cache ttl (none if not a negative answer)
+        """
+        if self.negative_ttl is None or rtype == RType.SOA:
+            return
+        if answers.rcode not in (None, RCode.NoError, RCode.NonExistantDomain):
+            return
+        if not answers.answers \
+            or any(a.rtype != RType.SOA for a in answers.answers):
+            return
+        soa = answers.answers[0]
+        return min(soa.ttl, soa.content.minimum, self.negative_ttl) #type: ignore
 
     def get_answers(self, domain: bytes, rtype: RType) -> Answers:
         """
@@ -134,14 +623,14 @@ class Cache(Backend):
         answers = self.get_cache(domain, rtype)
         if answers is not None:
             return answers
+        # refresh expired record w/ stale answers as a fallback
+        if self.stale_window is not None:
+            stale = self.get_stale(domain, rtype)
+            if stale is not None:
+                return self.serve_stale(domain, rtype, stale)
         # complete standard lookup for answers
         answers = self.backend.get_answers(domain, rtype)
-        if answers.source in self.ignore_sources:
-            return answers
-        if rtype not in self.ignore_rtypes \
-            and all(a.rtype in self.ignore_rtypes for a in answers.answers):
-            return answers
         # save results to cache and return results
-        if answers is not None and answers.answers:
+        if self.is_cacheable(rtype, answers):
             self.set_cache(domain, rtype, answers)
         return answers
@@ -0,0 +1,496 @@
+"""
+Bounded Key/Value Stores w/ Selectable Eviction Policies
+"""
+from abc import abstractmethod
+from collections import OrderedDict, deque
+from enum import Enum
+from threading import Lock
+from typing import Callable, Deque, Generic, Hashable, Iterator, List
+from typing import Optional, Protocol, Tuple, TypeVar
+
+#** Variables **#
+__all__ = ['Eviction', 'Store', 'LRUStore', 'TinyLFUStore', 'ShardedStore']
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+#: 64-bit mask and odd multiplier used to spread sketch hashes
+MASK64 = 0xFFFFFFFFFFFFFFFF
+GOLDEN = 0x9E3779B97F4A7C15
+
+#: per-row seeds for count-min sketch hashing
+SEEDS = (0x5851F42D4C957F2D, 0x14057B7EF767814F,
+    0x2545F4914F6CDD1D, 0x27BB2EE687B0B0FD)
+
+#: maximum value of sketch counters (4-bit counters)
+MAX_COUNT = 15
+
+#: number of buffered reads per shard before they are replayed
+READ_BUFFER = 64
+
+#** Classes **#
+
+class Store(Protocol[K, V]):
+    """
+    Bounded Key/Value Store Interface
+    """
+    maxsize: int
+
+    @abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def __contains__(self, key: K) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, key: K) -> Optional[V]:
+        """
+        retrieve value and record access for the eviction policy
+
+        :param key: lookup key
+        :return:    stored value (if present)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def peek(self, key: K) -> Optional[V]:
+        """
+        retrieve value without recording access
+
+        :param key: lookup key
+        :return:    stored value (if present)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key: K, value: V) -> Optional[Tuple[K, V]]:
+        """
+        store value evicting other entries when full
+
+        :param key:   storage key
+        :param value: value to store
+        :return:      entry evicted to make room (if any)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def evict(self) -> Optional[Tuple[K, V]]:
+        """
+        evict the next victim chosen by the eviction policy
+
+        :return: evicted entry (if store is not empty)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def pop(self, key: K) -> Optional[V]:
+        """
+        remove entry from store (if present)
+
+        :param key: storage key
+        :return:    removed value
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def items(self) -> Iterator[Tuple[K, V]]:
+        """
+        iterate all entries in store
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self):
+        """
+        remove all entries from store
+        """
+        raise NotImplementedError
+
+class LRUStore(Generic[K, V]):
+    """
+    Least-Recently-Used Store w/ O(1) Operations
+    """
+    __slots__ = ('maxsize', 'data', 'evictions')
+
+    def __init__(self, maxsize: int):
+        self.maxsize:   int                  = maxsize
+        self.data:      'OrderedDict[K, V]' = OrderedDict()
+        self.evictions: int                  = 0
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self.data
+
+    def get(self, key: K) -> Optional[V]:
+        value = self.data.get(key)
+        if value is not None:
+            self.data.move_to_end(key)
+        return value
+
+    def peek(self, key: K) -> Optional[V]:
+        return self.data.get(key)
+
+    def set(self, key: K, value: V) -> Optional[Tuple[K, V]]:
+        data    = self.data
+        evicted = None
+        if key in data:
+            data.move_to_end(key)
+        elif len(data) >= self.maxsize:
+            evicted = self.evict()
+        data[key] = value
+        return evicted
+
+    def evict(self) -> Optional[Tuple[K, V]]:
+        if not self.data:
+            return
+        self.evictions += 1
+        return self.data.popitem(last=False)
+
+    def pop(self, key: K) -> Optional[V]:
+        return self.data.pop(key, None)
+
+    def items(self) -> Iterator[Tuple[K, V]]:
+        return iter(list(self.data.items()))
+
+    def clear(self):
+        self.data.clear()
+
+class FrequencySketch:
+    """
+    Count-Min Sketch of 4-bit Counters w/ Periodic Aging
+
+    Estimates how often keys were accessed. Every counter is halved once
+    `sample_size` accesses are recorded so that old popularity decays.
+    """
+    __slots__ = ('width', 'shift', 'table', 'additions', 'sample_size')
+
+    def __init__(self, size: int):
+        bits = max(4, (max(size, 1) - 1).bit_length() + 1)
+        self.width:       int       = 1 << bits
+        self.shift:       int       = 64 - bits
+        self.table:       bytearray = bytearray(self.width * len(SEEDS))
+        self.additions:   int       = 0
+        self.sample_size: int       = 10 * max(size, 1)
+
+    def indexes(self, key: Hashable) -> Iterator[int]:
+        """
+        calculate counter index within each row for key
+        """
+        h = hash(key) & MASK64
+        for row, seed in enumerate(SEEDS):
+            col = (((h ^ seed) * GOLDEN) & MASK64) >> self.shift
+            yield row * self.width + col
+
+    def frequency(self, key: Hashable) -> int:
+        """
+        estimate access frequency of key
+
+        :param key: lookup key
+        :return:    estimated access count
+        """
+        table = self.table
+        return min(table[idx] for idx in self.indexes(key))
+
+    def increment(self, key: Hashable):
+        """
+        record access of key
+
+        :param key: lookup key
+        """
+        table = self.table
+        for idx in self.indexes(key):
+            if table[idx] < MAX_COUNT:
+                table[idx] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.table     = bytearray(c >> 1 for c in table)
+            self.additions //= 2
+
+class TinyLFUStore(Generic[K, V]):
+    """
+    Scan-Resistant W-TinyLFU Store
+
+    New entries are admitted into a small LRU window. Entries leaving the
+    window compete w/ the least-recently-used probation entry of the main
+    segmented-LRU and only the more frequently accessed of the two (per the
+    frequency sketch) is kept. Probation entries accessed again are promoted
+    into the protected segment. One-hit-wonders and scans therefore cannot
+    flush popular entries out of the store.
+    """
+    __slots__ = (
+        'maxsize',
+        'window_size',
+        'protected_size',
+        'sketch',
+        'window',
+        'probation',
+        'protected',
+        'evictions',
+    )
+
+    def __init__(self, maxsize: int, window: float = 0.01):
+        main = max(maxsize - max(1, int(maxsize * window)), 0)
+        self.maxsize:        int                 = maxsize
+        self.window_size:    int                 = maxsize - main
+        self.protected_size: int                 = int(main * 0.8)
+        self.sketch:         FrequencySketch     = FrequencySketch(maxsize)
+        self.window:         'OrderedDict[K, V]' = OrderedDict()
+        self.probation:      'OrderedDict[K, V]' = OrderedDict()
+        self.protected:      'OrderedDict[K, V]' = OrderedDict()
+        self.evictions:      int                 = 0
+
+    def __len__(self) -> int:
+        return len(self.window) + len(self.probation) + len(self.protected)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self.window \
+            or key in self.probation or key in self.protected
+
+    def get(self, key: K) -> Optional[V]:
+        self.sketch.increment(key)
+        if key in self.window:
+            self.window.move_to_end(key)
+            return self.window[key]
+        if key in self.protected:
+            self.protected.move_to_end(key)
+            return self.protected[key]
+        if key in self.probation:
+            value = self.probation.pop(key)
+            self.promote(key, value)
+            return value
+
+    def peek(self, key: K) -> Optional[V]:
+        for segment in (self.window, self.protected, self.probation):
+            value = segment.get(key)
+            if value is not None:
+                return value
+
+    def promote(self, key: K, value: V):
+        """
+        move probation entry into protected segment demoting when full
+        """
+        self.protected[key] = value
+        if len(self.protected) > self.protected_size:
+            demoted, demoted_value = self.protected.popitem(last=False)
+            self.probation[demoted] = demoted_value
+
+    def admit(self, key: K, value: V) -> Optional[Tuple[K, V]]:
+        """
+        admit entry leaving the window into the main segments
+
+        :return: rejected candidate or evicted victim (if any)
+        """
+        main_size = self.maxsize - self.window_size
+        if len(self.probation) + len(self.protected) < main_size:
+            self.probation[key] = value
+            return
+        segment = self.probation or self.protected
+        self.evictions += 1
+        if not segment:
+            return (key, value)
+        victim = next(iter(segment))
+        if self.sketch.frequency(key) <= self.sketch.frequency(victim):
+            return (key, value)
+        evicted = (victim, segment.pop(victim))
+        self.probation[key] = value
+        return evicted
+
+    def set(self, key: K, value: V) -> Optional[Tuple[K, V]]:
+        for segment in (self.window, self.protected, self.probation):
+            if key in segment:
+                segment[key] = value
+                segment.move_to_end(key)
+                return
+        self.window[key] = value
+        if len(self.window) > self.window_size:
+            return self.admit(*self.window.popitem(last=False))
+
+    def evict(self) -> Optional[Tuple[K, V]]:
+        for segment in (self.probation, self.protected, self.window):
+            if segment:
+                self.evictions += 1
+                return segment.popitem(last=False)
+
+    def pop(self, key: K) -> Optional[V]:
+        for segment in (self.window, self.protected, self.probation):
+            if key in segment:
+                return segment.pop(key)
+
+    def items(self) -> Iterator[Tuple[K, V]]:
+        return iter([*self.window.items(),
+            *self.probation.items(), *self.protected.items()])
+
+    def clear(self):
+        self.window.clear()
+        self.probation.clear()
+        self.protected.clear()
+
+class Shard(Generic[K, V]):
+    """
+    Independently Locked Partition of a Sharded Store
+    """
+    __slots__ = ('mutex', 'store', 'reads', 'weight')
+
+    def __init__(self, store: Store[K, V]):
+        self.mutex:  Lock        = Lock()
+        self.store:  Store[K, V] = store
+        self.reads:  Deque[K]    = deque(maxlen=READ_BUFFER)
+        self.weight: int         = 0
+
+    def drain(self):
+        """
+        replay buffered reads into the eviction policy (requires mutex)
+        """
+        reads, store = self.reads, self.store
+        while reads:
+            try:
+                store.get(reads.popleft())
+            except IndexError:
+                break
+
+class ShardedStore(Generic[K, V]):
+    """
+    Thread-Safe Store Partitioned into Independently Locked Shards
+
+    Keys are spread across `shards` stores by hash so writers only contend
+    when they touch the same shard. Reads take no lock at all: values are
+    peeked directly and the access is recorded in a lossy per-shard buffer
+    that is replayed into the eviction policy by the next writer (or by a
+    reader once the buffer fills and the shard lock is free). Recency and
+    frequency tracking is therefore approximate under heavy concurrency.
+
+    When a `weigher` is given the summed weight of all entries is tracked and
+    each shard evicts entries (in eviction policy order) to stay within its
+    share of `max_weight` in addition to the `maxsize` entry limit.
+    """
+    __slots__ = ('maxsize', 'shards', 'mask', 'weigher', 'max_weight')
+
+    def __init__(self,
+        policy:     'Eviction',
+        maxsize:    int,
+        shards:     int                          = 1,
+        max_weight: Optional[int]                = None,
+        weigher:    Optional[Callable[[V], int]] = None,
+    ):
+        count = 1 << max(shards - 1, 0).bit_length()
+        size  = -(-maxsize // count)
+        self.maxsize:    int                          = maxsize
+        self.shards:     List[Shard[K, V]]            = [
+            Shard(policy.new_store(size)) for _ in range(count)]
+        self.mask:       int                          = count - 1
+        self.weigher:    Optional[Callable[[V], int]] = weigher
+        self.max_weight: Optional[int]                = \
+            None if max_weight is None else max_weight // count
+
+    @property
+    def weight(self) -> int:
+        """
+        summed weight of all entries (always zero without a weigher)
+        """
+        return sum(shard.weight for shard in self.shards)
+
+    def shard(self, key: K) -> Shard[K, V]:
+        """
+        retrieve shard responsible for key
+        """
+        return self.shards[hash(key) & self.mask]
+
+    def __len__(self) -> int:
+        return sum(len(shard.store) for shard in self.shards)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self.shard(key).store
+
+    def get(self, key: K) -> Optional[V]:
+        shard = self.shard(key)
+        value = shard.store.peek(key)
+        reads = shard.reads
+        reads.append(key)
+        if len(reads) >= READ_BUFFER and shard.mutex.acquire(False):
+            try:
+                shard.drain()
+            finally:
+                shard.mutex.release()
+        return value
+
+    def peek(self, key: K) -> Optional[V]:
+        return self.shard(key).store.peek(key)
+
+    def set(self, key: K, value: V):
+        shard = self.shard(key)
+        with shard.mutex:
+            shard.drain()
+            store = shard.store
+            if self.weigher is None:
+                store.set(key, value)
+                return
+            weigh   = self.weigher
+            old     = store.peek(key)
+            evicted = store.set(key, value)
+            shard.weight += weigh(value)
+            if old is not None:
+                shard.weight -= weigh(old)
+            if evicted is not None:
+                shard.weight -= weigh(evicted[1])
+            if self.max_weight is None:
+                return
+            while shard.weight > self.max_weight:
+                evicted = store.evict()
+                if evicted is None:
+                    break
+                shard.weight -= weigh(evicted[1])
+
+    def pop(self, key: K, expected: Optional[V] = None) -> Optional[V]:
+        """
+        remove entry from store (if present)
+
+        :param key:      storage key
+        :param expected: only remove entry if it is still this value
+        :return:         removed value
+        """
+        shard = self.shard(key)
+        with shard.mutex:
+            if expected is not None and shard.store.peek(key) is not expected:
+                return
+            value = shard.store.pop(key)
+            if value is not None and self.weigher is not None:
+                shard.weight -= self.weigher(value)
+            return value
+
+    def items(self) -> Iterator[Tuple[K, V]]:
+        for shard in self.shards:
+            with shard.mutex:
+                items = list(shard.store.items())
+            yield from items
+
+    def clear(self):
+        for shard in self.shards:
+            with shard.mutex:
+                shard.reads.clear()
+                shard.store.clear()
+                shard.weight = 0
+
+class Eviction(str, Enum):
+    """
+    Eviction Policy for Bounded Cache Stores
+    """
+
+    LRU = 'lru'
+    """evict the least recently used entry"""
+    TINYLFU = 'tinylfu'
+    """scan-resistant frequency based admission (w-tinylfu)"""
+
+    def new_store(self, maxsize: int) -> Store:
+        """
+        spawn new bounded store using the eviction policy
+
+        :param maxsize: maximum number of entries
+        :return:        new bounded store
+        """
+        if self == self.TINYLFU:
+            return TinyLFUStore(maxsize)
+        return LRUStore(maxsize)
@@ -0,0 +1,69 @@
+"""
+Incremental Expiry Tracking for Cache Memory Reclamation
+"""
+import heapq
+from threading import Lock
+from typing import Callable, Generic, Hashable, List, Tuple, TypeVar
+
+#** Variables **#
+__all__ = ['ExpiryHeap']
+
+K = TypeVar('K', bound=Hashable)
+
+#** Classes **#
+
+class ExpiryHeap(Generic[K]):
+    """
+    Thread-Safe Min-Heap of Keys Ordered by Expiration Time
+
+    Only keys are tracked (never the values) so evicted entries are not kept
+    alive by the heap. Entries may therefore be outdated (the key was evicted
+    or replaced) and consumers must re-check the current entry before
+    removing it. `compact` drops outdated entries when the heap grows well
+    beyond the live entry count.
+    """
+    __slots__ = ('mutex', 'heap', 'counter')
+
+    def __init__(self):
+        self.mutex:   Lock                       = Lock()
+        self.heap:    List[Tuple[float, int, K]] = []
+        self.counter: int                        = 0
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def push(self, expires: float, key: K):
+        """
+        track key expiring at the specified time
+
+        :param expires: absolute expiration time
+        :param key:     expiring key
+        """
+        with self.mutex:
+            self.counter += 1
+            heapq.heappush(self.heap, (expires, self.counter, key))
+
+    def pop_due(self, now: float, limit: int) -> List[K]:
+        """
+        pop up to limit keys that expired at or before now
+
+        :param now:   current time
+        :param limit: maximum number of keys to pop
+        :return:      list of expired keys
+        """
+        due  = []
+        heap = self.heap
+        with self.mutex:
+            while heap and len(due) < limit and heap[0][0] <= now:
+                due.append(heapq.heappop(heap)[2])
+        return due
+
+    def compact(self, alive: Callable[[K], bool]):
+        """
+        rebuild heap keeping only entries for keys that are still alive
+
+        :param alive: check if key is still present
+        """
+        with self.mutex:
+            self.heap = [entry for entry in self.heap if alive(entry[2])]
+            heapq.heapify(self.heap)
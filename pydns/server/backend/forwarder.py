@@ -1,45 +1,147 @@
 """
 Backend Recursive Client-Forwarder Extension
 """
-from typing import ClassVar
+from concurrent.futures import Future
+from threading import Lock
+from typing import Callable, ClassVar, Dict, Hashable, Tuple, TypeVar
 
-from pyderive import dataclass
+from pyderive import dataclass, field
 
 from . import Answers, Backend
 from ...client import BaseClient
-from ... import RType, Answer, Question
+from ... import RClass, RCode, RType, Answer, Message, Question
 
 #** Variables **#
-__all__ = ['Forwarder']
+__all__ = ['SingleFlight', 'Forwarder']
+
+T = TypeVar('T')
+
+#: in-flight lookup deduplication key (domain, rtype, class)
+FlightKey = Tuple[bytes, RType, RClass]
 
 #** Classes **#
 
+class SingleFlight:
+    """
+    In-Flight Call Deduplication (Single-Flight)
+
+    The first caller for a key executes the call while concurrent callers
+    for the same key wait for and share its result (or exception). Every
+    flight is tracked with a thread-safe future.
+    """
+    __slots__ = ('mutex', 'flights', 'calls', 'coalesced')
+
+    def __init__(self):
+        self.mutex:     Lock                   = Lock()
+        self.flights:   Dict[Hashable, Future] = {}
+        self.calls:     int                    = 0
+        self.coalesced: int                    = 0
+
+    def __len__(self) -> int:
+        return len(self.flights)
+
+    def join(self, key: Hashable) -> Tuple[Future, bool]:
+        """
+        join existing flight for key or start a new one
+
+        :param key: deduplication key
+        :return:    flight future and if caller is responsible for the call
+        """
+        with self.mutex:
+            future = self.flights.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self.flights[key] = Future()
+            self.calls += 1
+            return future, True
+
+    def land(self, key: Hashable, future: Future, result=None, error=None):
+        """
+        complete flight and release any waiting callers
+
+        :param key:    deduplication key
+        :param future: flight future
+        :param result: call result
+        :param error:  call exception (if failed)
+        """
+        with self.mutex:
+            self.flights.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def call(self, key: Hashable, func: Callable[..., T], *args) -> T:
+        """
+        execute function once for all concurrent callers of the same key
+
+        :param key:  deduplication key
+        :param func: function to execute
+        :param args: function arguments
+        :return:     shared function result
+        """
+        future, leader = self.join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = func(*args)
+        except BaseException as e:
+            self.land(key, future, error=e)
+            raise
+        self.land(key, future, result)
+        return result
+
 @dataclass(slots=True, repr=False)
 class Forwarder(Backend):
     """
     Recursive Dns-Client Lookup Forwarder when Backend returns no Results
+
+    Concurrent lookups for the same (domain, rtype, class) are coalesced
+    into a single upstream query when `coalesce` is enabled.
     """
     source: ClassVar[str] = 'Forwarder'
     recursion_available: ClassVar[bool] = True #type: ignore
 
-    backend: Backend
-    client:  BaseClient
+    backend:  Backend
+    client:   BaseClient
+    coalesce: bool = True
+
+    flights: SingleFlight = field(default_factory=SingleFlight, init=False)
+
+    @property
+    def coalesced(self) -> int:
+        """number of lookups answered by another in-flight lookup"""
+        return self.flights.coalesced
 
     def is_authority(self, domain: bytes) -> bool:
         return self.backend.is_authority(domain)
 
+    def forward(self, answers: Answers, message: Message) -> Answers:
+        """
+        populate backend answers w/ upstream response records
+        """
+        answers.source = self.source
+        answers.answers.extend(message.answers)
+        answers.answers.extend(message.authority)
+        answers.answers.extend([
+            a for a in message.additional if isinstance(a, Answer)])
+        answers.forwarder = message.source
+        if message.flags.rcode != RCode.NoError:
+            answers.rcode = message.flags.rcode
+        return answers
+
     def get_answers(self, domain: bytes, rtype: RType) -> Answers:
         """
         query for answers w/ client if base-backend returns empty result
         """
         answers = self.backend.get_answers(domain, rtype)
         if not answers.answers and answers.rcode is None:
-            message = self.client.query(Question(domain, rtype))
-            answers.source = self.source
-            answers.answers.extend(message.answers)
-            answers.answers.extend(message.authority)
-            answers.answers.extend([
-                a for a in message.additional if isinstance(a, Answer)])
-            answers.forwarder = message.source
+            question = Question(domain, rtype)
+            if not self.coalesce:
+                message = self.client.query(question)
+            else:
+                key: FlightKey = (domain, rtype, question.qclass)
+                message = self.flights.call(key, self.client.query, question)
+            return self.forward(answers, message)
         return answers
-
@@ -0,0 +1,388 @@
+"""
+Shared-Memory Cache Extension for Multi-Process Servers
+"""
+import mmap
+import os
+import struct
+import tempfile
+from contextlib import suppress
+from hashlib import blake2b
+from threading import Lock
+from typing import Iterator, List, Optional, Tuple
+
+from pyderive import dataclass, field
+
+from .cache import Cache, CacheRecord
+from .snapshot import ENTRY, SnapshotEntry, pack_entry, unpack_entry
+
+try:
+    import fcntl
+except ImportError: # pragma: no cover
+    fcntl = None
+
+#** Variables **#
+__all__ = ['SharedStore', 'SharedCache']
+
+#: directory of private shared-memory tables (memory backed when possible)
+SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+#: table signature and format version
+MAGIC = b'PYDNSSM1'
+
+#: table header (buckets, ways, slot-size)
+HEADER = struct.Struct('>8sIII')
+
+#: bucket header (sequence, entry count)
+BUCKET = struct.Struct('>II')
+
+#: slot header (entry size, key hash)
+SLOT = struct.Struct('>IQ')
+
+#: number of in-process lock stripes guarding bucket writes
+STRIPES = 64
+
+#: maximum attempts to read a consistent bucket before reporting a miss
+READ_RETRIES = 8
+
+#** Functions **#
+
+def key_hash(key: str) -> int:
+    """
+    calculate process independent 64-bit hash of key
+
+    :param key: cache key
+    :return:    stable key hash
+    """
+    digest = blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') or 1
+
+#** Classes **#
+
+class SharedStore:
+    """
+    Cache Record Store in a Shared Memory-Mapped Hash Table
+
+    The table is a fixed number of buckets each holding `ways` fixed-size
+    slots of wire-format records. Any process mapping the same `path` shares
+    the table. Writers serialize per-bucket using a byte-range file lock
+    (plus an in-process lock stripe since file locks are per-process) and
+    bump the bucket sequence number before and after modifying it. Readers
+    take no lock at all and instead retry (seqlock) when the sequence
+    changed while they copied the bucket.
+
+    Inserting into a full bucket replaces its expired record or otherwise
+    the record closest to expiring. Records larger than a slot are not
+    stored. File locks are released when a process dies so a writer finding
+    an odd sequence (a writer crashed mid-update) wipes the torn bucket.
+    """
+    __slots__ = (
+        'path',
+        'buckets',
+        'ways',
+        'slot_size',
+        'bucket_size',
+        'maxsize',
+        'fd',
+        'mm',
+        'locks',
+        'oversize',
+    )
+
+    def __init__(self,
+        path:      str,
+        buckets:   int = 16384,
+        ways:      int = 4,
+        slot_size: int = 512,
+    ):
+        if fcntl is None:
+            raise RuntimeError('shared store requires posix file locking')
+        if slot_size <= SLOT.size + ENTRY.size:
+            raise ValueError(f'slot size too small: {slot_size}')
+        self.path:        str        = path
+        self.buckets:     int        = buckets
+        self.ways:        int        = ways
+        self.slot_size:   int        = slot_size
+        self.bucket_size: int        = BUCKET.size + ways * slot_size
+        self.maxsize:     int        = buckets * ways
+        self.locks:       List[Lock] = [Lock() for _ in range(STRIPES)]
+        self.oversize:    int        = 0
+        self.fd:          int        = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self.mm: mmap.mmap = self.open_table()
+        except BaseException:
+            os.close(self.fd)
+            raise
+
+    def open_table(self) -> mmap.mmap:
+        """
+        initialize table file (if new) and map it into memory
+        """
+        size = HEADER.size + self.buckets * self.bucket_size
+        head = HEADER.pack(MAGIC, self.buckets, self.ways, self.slot_size)
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, HEADER.size, 0) #type: ignore
+        try:
+            if os.fstat(self.fd).st_size == 0:
+                os.ftruncate(self.fd, size)
+                os.pwrite(self.fd, head, 0)
+            if os.pread(self.fd, HEADER.size, 0) != head:
+                raise ValueError(f'incompatible shared cache: {self.path!r}')
+            return mmap.mmap(self.fd, size)
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, HEADER.size, 0) #type: ignore
+
+    def close(self):
+        """
+        unmap table and close file descriptor
+        """
+        self.mm.close()
+        os.close(self.fd)
+
+    def locate(self, key: str) -> Tuple[int, int]:
+        """
+        calculate key hash and offset of the bucket responsible for key
+        """
+        khash = key_hash(key)
+        return khash, HEADER.size + (khash % self.buckets) * self.bucket_size
+
+    def read_bucket(self, offset: int) -> Optional[bytes]:
+        """
+        copy consistent bucket contents w/o locking (seqlock read)
+
+        :param offset: bucket offset
+        :return:       bucket copy (none when writers kept interfering)
+        """
+        mm, end = self.mm, offset + self.bucket_size
+        for _ in range(READ_RETRIES):
+            seq = BUCKET.unpack_from(mm, offset)[0]
+            if seq & 1:
+                continue
+            raw = mm[offset:end]
+            if BUCKET.unpack_from(mm, offset)[0] == seq:
+                return raw
+
+    def lock_bucket(self, offset: int) -> Lock:
+        """
+        acquire exclusive bucket write access and begin update
+
+        :param offset: bucket offset
+        :return:       acquired in-process lock stripe
+        """
+        lock = self.locks[(offset // self.bucket_size) % STRIPES]
+        lock.acquire()
+        try:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, offset) #type: ignore
+        except BaseException:
+            lock.release()
+            raise
+        seq, _ = BUCKET.unpack_from(self.mm, offset)
+        if seq & 1:
+            # previous writer died mid-update so slots may be torn
+            self.mm[offset:offset + self.bucket_size] = \
+                bytes(self.bucket_size)
+        BUCKET.pack_into(self.mm, offset, seq | 1, self.count(offset))
+        return lock
+
+    def unlock_bucket(self, offset: int, lock: Lock):
+        """
+        complete bucket update and release write access
+
+        :param offset: bucket offset
+        :param lock:   in-process lock stripe returned by `lock_bucket`
+        """
+        try:
+            seq, _ = BUCKET.unpack_from(self.mm, offset)
+            count  = sum(1 for _ in self.slots(self.mm, offset))
+            BUCKET.pack_into(self.mm, offset, (seq + 1) & 0xFFFFFFFF, count)
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, offset) #type: ignore
+        finally:
+            lock.release()
+
+    def count(self, offset: int) -> int:
+        """
+        retrieve number of records stored in bucket
+        """
+        return BUCKET.unpack_from(self.mm, offset)[1]
+
+    def slots(self, raw, offset: int) -> Iterator[Tuple[int, int, int]]:
+        """
+        iterate occupied slots of bucket as (slot-offset, size, hash)
+        """
+        start = offset + BUCKET.size
+        for n in range(self.ways):
+            slot = start + n * self.slot_size
+            size, khash = SLOT.unpack_from(raw, slot)
+            if size:
+                yield slot, size, khash
+
+    def find(self, raw, offset: int, key: str, khash: int) -> Optional[int]:
+        """
+        find offset of slot containing key within bucket
+        """
+        encoded = key.encode()
+        for slot, _, shash in self.slots(raw, offset):
+            if shash == khash and self.entry_key(raw, slot) == encoded:
+                return slot
+
+    def entry_key(self, raw, slot: int) -> bytes:
+        """
+        retrieve raw key of entry stored in slot w/o decoding its answers
+        """
+        start   = slot + SLOT.size + ENTRY.size
+        keysize = ENTRY.unpack_from(raw, slot + SLOT.size)[4]
+        return bytes(raw[start:start + keysize])
+
+    def decode(self, raw, slot: int) -> SnapshotEntry:
+        """
+        decode stored entry from slot
+        """
+        return unpack_entry(raw, slot + SLOT.size)
+
+    def __len__(self) -> int:
+        mm, size = self.mm, self.bucket_size
+        offsets  = range(HEADER.size, HEADER.size + self.buckets * size, size)
+        return sum(BUCKET.unpack_from(mm, offset)[1] for offset in offsets)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    @property
+    def weight(self) -> int:
+        """
+        size of the shared table in bytes
+        """
+        return len(self.mm)
+
+    def get(self, key: str) -> Optional[CacheRecord]:
+        khash, offset = self.locate(key)
+        raw = self.read_bucket(offset)
+        if raw is None:
+            return
+        slot = self.find(raw, 0, key, khash)
+        if slot is not None:
+            return CacheRecord.restore(self.decode(raw, slot))
+
+    def peek(self, key: str) -> Optional[CacheRecord]:
+        return self.get(key)
+
+    def set(self, key: str, value: CacheRecord):
+        data = pack_entry(SnapshotEntry(key, list(value.answers),
+            value.created, value.expires, value.rcode, value.negative))
+        if SLOT.size + len(data) > self.slot_size:
+            self.oversize += 1
+            return
+        khash, offset = self.locate(key)
+        mm   = self.mm
+        lock = self.lock_bucket(offset)
+        try:
+            slot = self.find(mm, offset, key, khash)
+            if slot is None:
+                slot = self.victim(offset)
+            SLOT.pack_into(mm, slot, len(data), khash)
+            mm[slot + SLOT.size:slot + SLOT.size + len(data)] = data
+        finally:
+            self.unlock_bucket(offset, lock)
+
+    def victim(self, offset: int) -> int:
+        """
+        select free slot or slot closest to expiring within bucket
+        """
+        start = offset + BUCKET.size
+        best, expires = start, float('inf')
+        for n in range(self.ways):
+            slot = start + n * self.slot_size
+            size, _ = SLOT.unpack_from(self.mm, slot)
+            if not size:
+                return slot
+            slot_expires = ENTRY.unpack_from(self.mm, slot + SLOT.size)[1]
+            if slot_expires < expires:
+                best, expires = slot, slot_expires
+        return best
+
+    def evict(self) -> Optional[Tuple[str, CacheRecord]]:
+        """
+        records are only replaced within their bucket on insert
+        """
+        return None
+
+    def pop(self,
+        key: str, expected: Optional[CacheRecord] = None) -> Optional[CacheRecord]:
+        """
+        remove entry from store (if present)
+
+        :param key:      storage key
+        :param expected: only remove entry if it is still this record
+        :return:         removed record
+        """
+        khash, offset = self.locate(key)
+        mm   = self.mm
+        lock = self.lock_bucket(offset)
+        try:
+            slot = self.find(mm, offset, key, khash)
+            if slot is None:
+                return
+            entry = self.decode(mm, slot)
+            if expected is not None and (entry.created, entry.expires) \
+                != (expected.created, expected.expires):
+                return
+            SLOT.pack_into(mm, slot, 0, 0)
+            return CacheRecord.restore(entry)
+        finally:
+            self.unlock_bucket(offset, lock)
+
+    def items(self) -> Iterator[Tuple[str, CacheRecord]]:
+        size = self.bucket_size
+        for offset in range(HEADER.size, len(self.mm), size):
+            raw = self.read_bucket(offset)
+            if raw is None:
+                continue
+            for slot, _, _ in self.slots(raw, 0):
+                entry = self.decode(raw, slot)
+                yield entry.key, CacheRecord.restore(entry)
+
+    def clear(self):
+        size = self.bucket_size
+        for offset in range(HEADER.size, len(self.mm), size):
+            lock = self.lock_bucket(offset)
+            try:
+                start = offset + BUCKET.size
+                self.mm[start:offset + size] = bytes(size - BUCKET.size)
+            finally:
+                self.unlock_bucket(offset, lock)
+
+@dataclass(slots=True, repr=False)
+class SharedCache(Cache):
+    """
+    Cache Extension Sharing Answers Across Processes via Shared Memory
+
+    Answers are stored in a `SharedStore` mapped from `path` so every
+    worker process on the host shares the same cache (authority lookups,
+    statistics and refresh bookkeeping remain per-process). The table is
+    sized by `buckets`, `ways` and `slot_size` instead of `maxsize`,
+    `max_bytes`, `eviction` and `shards`. Records are decoded on every hit
+    so hit counts (and therefore `prefetch_hits`) are not shared.
+
+    Processes only share a table when given the same `path`. Without one a
+    uniquely named private table is created (and removed again on close).
+    """
+    path:      Optional[str] = None
+    buckets:   int           = 16384
+    ways:      int           = 4
+    slot_size: int           = 512
+    owned:     bool          = field(default=False, init=False)
+
+    def new_record_store(self) -> SharedStore: #type: ignore
+        if self.path is None:
+            fd, self.path = tempfile.mkstemp(prefix='pydns-cache-', dir=SHM_DIR)
+            os.close(fd)
+            self.owned = True
+        return SharedStore(self.path, self.buckets, self.ways, self.slot_size)
+
+    def close(self):
+        """
+        stop background workers, unmap the shared table and remove it (if owned)
+        """
+        Cache.close(self)
+        self.cache.close() #type: ignore
+        if self.owned and self.path is not None:
+            with suppress(FileNotFoundError):
+                os.unlink(self.path)
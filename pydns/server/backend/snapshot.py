@@ -0,0 +1,148 @@
+"""
+Compact Binary Cache Snapshots for Warm Restarts
+"""
+import mmap
+import os
+import struct
+import tempfile
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+from pystructs import Context
+
+from ... import Answer, RCode
+from ...codec import unpack_answer
+
+#** Variables **#
+__all__ = [
+    'SnapshotEntry',
+    'pack_entry',
+    'unpack_entry',
+    'write_snapshot',
+    'read_snapshot',
+]
+
+#: snapshot file signature and format version
+MAGIC = b'PYDNSCS1'
+
+#: entry header (created, expires, rcode, negative, key-size, count, data-size)
+ENTRY = struct.Struct('>ddBBHHI')
+
+#: rcode placeholder for entries without an rcode
+NO_RCODE = 0xFF
+
+#** Classes **#
+
+class SnapshotEntry(NamedTuple):
+    """
+    Cache Entry w/ Absolute Timestamps Stored in a Snapshot
+    """
+    key:      str
+    answers:  List[Answer]
+    created:  float
+    expires:  float
+    rcode:    Optional[RCode] = None
+    negative: bool            = False
+
+#** Functions **#
+
+def pack_entry(entry: SnapshotEntry) -> bytes:
+    """
+    serialize entry into compact binary form
+
+    answers are stored in wire-format w/ name compression applied within
+    the entry so entries can be decoded independently of each other.
+
+    :param entry: entry to serialize
+    :return:      serialized entry
+    """
+    ctx    = Context()
+    data   = bytearray()
+    offset = 0
+    for answer in entry.answers:
+        offset = answer.pack_into(data, offset, ctx)
+    key   = entry.key.encode()
+    rcode = NO_RCODE if entry.rcode is None else int(entry.rcode)
+    head  = ENTRY.pack(entry.created, entry.expires, rcode,
+        entry.negative, len(key), len(entry.answers), len(data))
+    return head + key + data
+
+def unpack_entry(raw: bytes, offset: int = 0) -> SnapshotEntry:
+    """
+    deserialize entry from raw buffer at the specified offset
+
+    :param raw:    raw byte buffer
+    :param offset: offset of entry within buffer
+    :return:       deserialized entry
+    """
+    created, expires, rcode, negative, keysize, count, datasize = \
+        ENTRY.unpack_from(raw, offset)
+    start   = offset + ENTRY.size
+    end     = start + keysize
+    key     = bytes(raw[start:end]).decode()
+    data    = bytes(raw[end:end + datasize])
+    ctx     = Context()
+    answers = [unpack_answer(data, ctx) for _ in range(count)]
+    return SnapshotEntry(key, answers, created, expires,
+        None if rcode == NO_RCODE else RCode(rcode), bool(negative))
+
+def write_snapshot(path: str, entries: Iterable[SnapshotEntry]) -> int:
+    """
+    stream entries into snapshot file (atomically replacing existing file)
+
+    entries are written to a uniquely named temporary file in the same
+    directory which then replaces the snapshot, so concurrent writers never
+    interleave and readers only ever see a complete snapshot.
+
+    :param path:    snapshot file path
+    :param entries: entries to write
+    :return:        number of entries written
+    """
+    count     = 0
+    directory = os.path.dirname(os.path.abspath(path))
+    prefix    = f'.{os.path.basename(path)}.'
+    fd, temp  = tempfile.mkstemp(prefix=prefix, suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            for entry in entries:
+                f.write(pack_entry(entry))
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+    return count
+
+def read_snapshot(path: str,
+    now: Optional[float] = None) -> Iterator[SnapshotEntry]:
+    """
+    lazily iterate entries of a memory-mapped snapshot file
+
+    entries are decoded one at a time as they are consumed so even large
+    snapshots can be restored incrementally. A truncated trailing entry
+    (from an interrupted write) ends iteration.
+
+    :param path: snapshot file path
+    :param now:  skip entries that expired before this time (if specified)
+    :return:     iterator of decoded snapshot entries
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < len(MAGIC):
+            raise ValueError(f'invalid cache snapshot: {path!r}')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as raw:
+            if raw[:len(MAGIC)] != MAGIC:
+                raise ValueError(f'invalid cache snapshot: {path!r}')
+            offset = len(MAGIC)
+            while offset + ENTRY.size <= size:
+                _, expires, _, _, keysize, _, datasize = \
+                    ENTRY.unpack_from(raw, offset)
+                start  = offset
+                offset = start + ENTRY.size + keysize + datasize
+                if offset > size:
+                    break
+                if now is not None and expires <= now:
+                    continue
+                yield unpack_entry(raw, start)
@@ -0,0 +1,154 @@
+"""
+Wire-Format Response Cache keyed on Raw Question Bytes
+"""
+import time
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from pyderive import dataclass, field
+
+from ..enum import OpCode, RCode, RType
+from ..flags import Flag
+from ..message import LazyMessage
+from ..wire import (
+    HEADER, RRTAIL, UINT16, UINT32, Buffer, skip_domain, skip_question)
+
+#** Variables **#
+__all__ = ['PacketCache']
+
+#: request flag bits echoed back into the response by the server
+#: (truncation describes the cached response itself so it is never echoed)
+ECHO_MASK = int(Flag.RDesired | Flag.Authenticated | Flag.CheckingDisabled)
+
+#: request flag bits which determine the content of the response
+KEY_MASK = 0x7800 # opcode
+
+#: response codes allowed to be cached
+CACHE_RCODES = {RCode.NoError, RCode.NonExistantDomain}
+
+#: offset of ttl within record after its domain
+TTL_OFFSET = 4
+
+#** Functions **#
+
+def ttl_offsets(raw: Buffer) -> List[Tuple[int, int]]:
+    """
+    collect offsets and values of all record ttls within a packed response
+
+    :param raw: packed response message
+    :return:    list of (ttl offset, ttl value)
+    """
+    _, _, qd, an, au, ad = HEADER.unpack_from(raw, 0)
+    index = HEADER.size
+    for _ in range(qd):
+        index = skip_question(raw, index)
+    ttls = []
+    for _ in range(an + au + ad):
+        index = skip_domain(raw, index)
+        rtype, _, ttl, size = RRTAIL.unpack_from(raw, index)
+        if rtype != RType.OPT:
+            ttls.append((index + TTL_OFFSET, ttl))
+        index += RRTAIL.size + size
+    return ttls
+
+#** Classes **#
+
+@dataclass(slots=True)
+class PacketEntry:
+    """
+    Cached Wire-Format Response w/ Precomputed TTL Offsets
+    """
+    response: bytes
+    ttls:     List[Tuple[int, int]]
+    created:  float
+    expires:  float
+
+@dataclass(slots=True, repr=False)
+class PacketCache:
+    """
+    Server-Level Wire-Format Response Cache
+
+    Repeated queries skip the parse, resolve and pack pipeline entirely
+    by copying the cached response and patching its message-id, the
+    request-echoed flag bits and the remaining record TTLs in place.
+    Backends are not consulted on a hit (including any statistics backend).
+    """
+    maxsize: int = 10000
+    maxttl:  int = 3600
+
+    mutex:   Lock                     = field(default_factory=Lock, init=False)
+    entries: Dict[bytes, PacketEntry] = field(default_factory=dict, init=False)
+    hits:    int                      = field(default=0, init=False)
+    misses:  int                      = field(default=0, init=False)
+
+    def key(self, request: LazyMessage) -> Optional[bytes]:
+        """
+        generate cache-key from raw question bytes and relevant flags
+
+        :param request: lazily parsed request message
+        :return:        cache-key (if request is cacheable)
+        """
+        if request.flags.op != OpCode.Query or request.counts[0] != 1:
+            return
+        start, end = request.offsets[0], request.offsets[1]
+        flags = int(request.flags) & KEY_MASK
+        edns  = request.edns_offset is not None
+        return bytes((flags >> 8, edns)) + bytes(request.raw[start:end])
+
+    def get(self, request: LazyMessage) -> Optional[bytearray]:
+        """
+        retrieve patched copy of cached response for request (if present)
+
+        :param request: lazily parsed request message
+        :return:        response ready to be sent to requester
+        """
+        key = self.key(request)
+        if key is None:
+            return
+        entry = self.entries.get(key)
+        now   = time.time()
+        if entry is None or entry.expires <= now:
+            with self.mutex:
+                if entry is not None and self.entries.get(key) is entry:
+                    del self.entries[key]
+                self.misses += 1
+            return
+        with self.mutex:
+            self.hits += 1
+        # patch message-id and request-echoed flags into response copy
+        response  = bytearray(entry.response)
+        (flags, ) = UINT16.unpack_from(response, 2)
+        flags     = (flags & ~ECHO_MASK) | (int(request.flags) & ECHO_MASK)
+        UINT16.pack_into(response, 0, request.id)
+        UINT16.pack_into(response, 2, flags)
+        # decrement ttls by time spent in cache
+        elapsed = int(now - entry.created)
+        if elapsed:
+            for offset, ttl in entry.ttls:
+                UINT32.pack_into(response, offset, ttl - elapsed)
+        return response
+
+    def set(self, request: LazyMessage, response: Buffer):
+        """
+        save packed response to cache for the specified request
+
+        :param request:  lazily parsed request message
+        :param response: packed response message
+        """
+        key = self.key(request)
+        if key is None:
+            return
+        (flags, ) = UINT16.unpack_from(response, 2)
+        if (flags & 0xF) not in CACHE_RCODES:
+            return
+        ttls = ttl_offsets(response)
+        ttl  = min(self.maxttl, *(ttl for _, ttl in ttls)) if ttls else 0
+        if ttl <= 0:
+            return
+        now   = time.time()
+        entry = PacketEntry(bytes(response), ttls, now, now + ttl)
+        with self.mutex:
+            if self.entries and key not in self.entries \
+                and len(self.entries) >= self.maxsize:
+                self.entries.pop(next(iter(self.entries)))
+            self.entries[key] = entry
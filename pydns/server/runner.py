@@ -0,0 +1,455 @@
+"""
+Pre-Forking Multi-Process Server Runner
+"""
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from logging import Logger, getLogger
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pyderive import dataclass, field
+from pyserve import Address, listen_tcp_async, listen_udp_async
+from pyserve.threading import TcpThreadServer, UdpThreadServer, UdpWriter
+
+from .backend import Backend, Cache
+from .packet import PacketCache
+from .server import Mode, Server
+
+#** Variables **#
+__all__ = ['RunnerStats', 'Runner']
+
+#: per-worker counters published into shared memory
+COUNTERS = ('requests', 'cache_hits', 'cache_misses', 'packet_hits')
+
+#: index of each counter within a worker row
+REQUESTS, CACHE_HITS, CACHE_MISSES, PACKET_HITS = range(len(COUNTERS))
+
+#: maximum size of a udp request
+BLOCKSIZE = 8192
+
+#** Functions **#
+
+def find_cache(backend: Optional[Backend]) -> Optional[Cache]:
+    """
+    find cache within a chain of wrapping backends (if any)
+
+    :param backend: outermost backend of chain
+    :return:        first cache found in chain
+    """
+    while backend is not None:
+        if isinstance(backend, Cache):
+            return backend
+        backend = getattr(backend, 'backend', None)
+
+def reuse_port_socket(kind: int, address: Tuple[str, int]) -> socket.socket:
+    """
+    spawn socket bound to address w/ SO_REUSEPORT enabled
+
+    :param kind:    socket type
+    :param address: address to bind socket to
+    :return:        bound socket
+    """
+    sock = socket.socket(socket.AF_INET, kind)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(address)
+    return sock
+
+#** Classes **#
+
+class RequestCounter:
+    """
+    Thread-Safe Count of Requests Handled within a Worker Process
+    """
+    __slots__ = ('value', 'mutex')
+
+    def __init__(self):
+        self.value: int            = 0
+        self.mutex: threading.Lock = threading.Lock()
+
+    def increment(self):
+        """increment request count"""
+        with self.mutex:
+            self.value += 1
+
+@dataclass
+class WorkerServer(Server):
+    """
+    Server Session Counting Requests Handled by a Worker Process
+    """
+    counter: Optional[RequestCounter] = None
+
+    def data_recieved(self, data: bytes):
+        if self.counter is not None:
+            self.counter.increment()
+        Server.data_recieved(self, data)
+
+class Listener:
+    """
+    Background Listener Serving Requests Until Stopped
+    """
+    __slots__ = ('thread', )
+
+    def __init__(self, name: str):
+        self.thread = threading.Thread(target=self.serve, name=name, daemon=True)
+
+    def is_alive(self) -> bool:
+        """
+        check if listener is still serving requests
+        """
+        return self.thread.is_alive()
+
+    def start(self):
+        """
+        start serving requests in a background thread
+        """
+        self.thread.start()
+
+    def serve(self):
+        """
+        serve requests until stopped (runs in background thread)
+        """
+        raise NotImplementedError
+
+    def stop(self, timeout: float):
+        """
+        stop accepting requests and wait for the listener to finish
+
+        :param timeout: maximum time to wait for listener thread
+        """
+        raise NotImplementedError
+
+class ThreadListener(Listener):
+    """
+    Listener using a PyServe thread-per-request server
+    """
+    __slots__ = ('server', )
+
+    def __init__(self, server: Any):
+        super().__init__(f'pydns-{type(server).__name__}')
+        self.server = server
+
+    def serve(self):
+        self.server.serve_forever()
+
+    def stop(self, timeout: float):
+        self.server.shutdown()
+        self.thread.join(timeout)
+        self.server.server_close()
+
+class SyncListener(Listener):
+    """
+    Listener handling udp requests inline on a single thread
+    """
+    __slots__ = ('sock', 'kwargs', 'closing')
+
+    def __init__(self, address: Tuple[str, int], kwargs: Dict[str, Any]):
+        super().__init__('pydns-sync-udp')
+        self.sock    = reuse_port_socket(socket.SOCK_DGRAM, address)
+        self.kwargs  = kwargs
+        self.closing = False
+        self.sock.settimeout(0.5)
+
+    def serve(self):
+        sock, kwargs = self.sock, self.kwargs
+        while not self.closing:
+            try:
+                data, addr = sock.recvfrom(BLOCKSIZE)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            session = WorkerServer(**kwargs)
+            session.connection_made(Address(*addr), UdpWriter(addr, sock))
+            session.data_recieved(data)
+            session.connection_lost(None)
+
+    def stop(self, timeout: float):
+        self.closing = True
+        self.thread.join(timeout)
+        self.sock.close()
+
+class AsyncListener(Listener):
+    """
+    Listener running PyServe asyncio servers on a dedicated event loop
+    """
+    __slots__ = ('loop', 'coros')
+
+    def __init__(self, name: str, coros: List[Callable]):
+        super().__init__(name)
+        self.loop  = asyncio.new_event_loop()
+        self.coros = coros
+
+    def serve(self):
+        asyncio.set_event_loop(self.loop)
+        tasks = [self.loop.create_task(coro()) for coro in self.coros]
+        try:
+            self.loop.run_until_complete(asyncio.gather(*tasks))
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.loop.close()
+
+    def stop(self, timeout: float):
+        def cancel():
+            # pyserve reports udp listeners that never received a request
+            # as failing on close, which is harmless during shutdown
+            self.loop.set_exception_handler(lambda *_: None)
+            for task in asyncio.all_tasks(self.loop):
+                task.cancel()
+        try:
+            self.loop.call_soon_threadsafe(cancel)
+        except RuntimeError: # loop already closed
+            pass
+        self.thread.join(timeout)
+
+@dataclass(slots=True)
+class RunnerStats:
+    """
+    Statistics Aggregated Across all Worker Processes
+    """
+    workers:      int = 0
+    restarts:     int = 0
+    requests:     int = 0
+    cache_hits:   int = 0
+    cache_misses: int = 0
+    packet_hits:  int = 0
+
+@dataclass(slots=True, repr=False)
+class Runner:
+    """
+    Pre-Forking Multi-Process DNS Server Runner
+
+    Forks `workers` processes that each build their own backend chain from
+    `factory` and bind both udp and tcp on `address` w/ SO_REUSEPORT so the
+    kernel spreads requests across them (use a `SharedCache` w/ a common
+    `path` in the chain to share answers between workers). Each worker serves according to `mode`:
+
+    SYNC handles udp inline on a single thread (tcp uses a thread-per-
+    connection server), THREADED uses thread-per-request servers for both,
+    ASYNC serves both from one asyncio event loop and THREADED_ASYNC runs an
+    event loop per protocol in separate threads.
+
+    Workers that exit unexpectedly are restarted after `restart_delay`
+    seconds. `stop` (also triggered by SIGINT/SIGTERM when run from the main
+    thread) asks every worker to stop listening, finish in-flight requests
+    and close its backend, killing workers still alive after
+    `shutdown_timeout` seconds. Workers publish request and cache counters
+    into shared memory every `stats_interval` seconds which are summed by
+    `stats`.
+    """
+    factory:          Callable[[], Backend]
+    address:          Tuple[str, int]       = ('127.0.0.1', 53)
+    workers:          int                   = field(default_factory=lambda: os.cpu_count() or 1)
+    mode:             Mode                  = Mode.THREADED
+    udp:              bool                  = True
+    tcp:              bool                  = True
+    logger:           Logger                = field(default_factory=lambda: getLogger('pydns'))
+    packet_cache:     Optional[PacketCache] = None
+    restart_delay:    float                 = 1.0
+    shutdown_timeout: float                 = 5.0
+    stats_interval:   float                 = 1.0
+
+    context:   Any                         = field(init=False)
+    counters:  Any                         = field(init=False)
+    processes: List[Optional[BaseProcess]] = field(init=False)
+    restarts:  int                         = field(default=0, init=False)
+    stopping:  threading.Event             = field(default_factory=threading.Event, init=False)
+
+    def __post_init__(self):
+        self.logger    = self.logger.getChild('runner')
+        self.mode      = Mode(self.mode)
+        self.context   = multiprocessing.get_context('fork')
+        self.counters  = self.context.Array('Q', self.workers * len(COUNTERS))
+        self.processes = [None] * self.workers
+
+    def spawn(self, slot: int):
+        """
+        fork new worker process for the specified worker slot
+
+        :param slot: worker slot index
+        """
+        process = self.context.Process(target=self.work,
+            args=(slot, ), name=f'pydns-worker-{slot}', daemon=True)
+        process.start()
+        self.processes[slot] = process
+        self.logger.info(f'worker {slot} started pid={process.pid}')
+
+    def start(self):
+        """
+        fork all worker processes
+        """
+        for slot in range(self.workers):
+            self.spawn(slot)
+
+    def run(self):
+        """
+        run and supervise workers until stopped (blocking)
+        """
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *_: self.stop())
+        self.start()
+        try:
+            self.supervise()
+        finally:
+            self.shutdown()
+
+    def stop(self):
+        """
+        request graceful shutdown of runner and its workers
+        """
+        self.stopping.set()
+
+    def supervise(self):
+        """
+        restart crashed workers until the runner is stopped
+        """
+        pending: Dict[int, float] = {}
+        while not self.stopping.is_set():
+            now     = time.monotonic()
+            timeout = min([0.5, *(at - now for at in pending.values())])
+            alive   = [p.sentinel for p in self.processes if p is not None]
+            wait(alive, max(timeout, 0)) if alive else time.sleep(max(timeout, 0))
+            if self.stopping.is_set():
+                break
+            for slot, process in enumerate(self.processes):
+                if process is None or process.is_alive():
+                    continue
+                process.join()
+                self.logger.warning(
+                    f'worker {slot} exited code={process.exitcode} (restarting)')
+                self.processes[slot] = None
+                self.restarts += 1
+                pending[slot] = time.monotonic() + self.restart_delay
+            now = time.monotonic()
+            for slot, at in list(pending.items()):
+                if at <= now:
+                    del pending[slot]
+                    self.spawn(slot)
+
+    def shutdown(self):
+        """
+        gracefully stop all workers killing those that do not exit in time
+        """
+        processes = [p for p in self.processes if p is not None]
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.shutdown_timeout
+        for process in processes:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                self.logger.warning(f'worker pid={process.pid} killed')
+                process.kill()
+                process.join()
+        self.processes = [None] * self.workers
+
+    def stats(self) -> RunnerStats:
+        """
+        aggregate counters published by all workers
+
+        :return: combined runner statistics
+        """
+        width  = len(COUNTERS)
+        values = self.counters[:]
+        totals = [sum(values[n::width]) for n in range(width)]
+        alive  = sum(1 for p in self.processes if p is not None and p.is_alive())
+        return RunnerStats(alive, self.restarts, *totals)
+
+    def listeners(self, kwargs: Dict[str, Any]) -> List[Listener]:
+        """
+        build listeners for the configured mode within a worker
+
+        :param kwargs: server session keyword arguments
+        :return:       listeners serving the configured protocols
+        """
+        address, mode = self.address, self.mode
+        udp = lambda: listen_udp_async(
+            address, WorkerServer, reuse_port=True, **kwargs)
+        tcp = lambda: listen_tcp_async(
+            address, WorkerServer, reuse_port=True, **kwargs)
+        listeners: List[Listener] = []
+        if mode == Mode.ASYNC:
+            coros = [c for c, on in ((udp, self.udp), (tcp, self.tcp)) if on]
+            return [AsyncListener('pydns-async', coros)]
+        if mode == Mode.THREADED_ASYNC:
+            if self.udp:
+                listeners.append(AsyncListener('pydns-async-udp', [udp]))
+            if self.tcp:
+                listeners.append(AsyncListener('pydns-async-tcp', [tcp]))
+            return listeners
+        if self.udp:
+            listeners.append(SyncListener(address, kwargs)
+                if mode == Mode.SYNC else ThreadListener(UdpThreadServer(
+                    address=address, factory=WorkerServer,
+                    kwargs=kwargs, reuse_port=True)))
+        if self.tcp:
+            listeners.append(ThreadListener(TcpThreadServer(address=address,
+                factory=WorkerServer, kwargs=kwargs, reuse_port=True)))
+        return listeners
+
+    def work(self, slot: int):
+        """
+        worker process entrypoint serving requests until terminated
+
+        :param slot: worker slot index
+        """
+        stop = threading.Event()
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        logger  = self.logger.getChild(f'worker{slot}')
+        offset  = slot * len(COUNTERS)
+        base    = self.counters[offset:offset + len(COUNTERS)]
+        counter = RequestCounter()
+        backend = self.factory()
+        kwargs  = dict(backend=backend, logger=self.logger.parent,
+            packet_cache=self.packet_cache, counter=counter)
+        listeners = self.listeners(kwargs)
+        for listener in listeners:
+            listener.start()
+        logger.debug('listening')
+        cache  = find_cache(backend)
+        failed = False
+        while not stop.wait(self.stats_interval):
+            self.publish(offset, base, counter, cache)
+            if not all(listener.is_alive() for listener in listeners):
+                logger.error('listener failed')
+                failed = True
+                break
+        logger.debug('shutting down')
+        for listener in listeners:
+            listener.stop(self.shutdown_timeout)
+        self.publish(offset, base, counter, cache)
+        if cache is not None:
+            cache.close()
+        if failed:
+            raise SystemExit(1)
+
+    def publish(self, offset: int,
+        base: List[int], counter: RequestCounter, cache: Optional[Cache]):
+        """
+        publish worker counters into shared memory
+
+        counters are added to those published by previous (crashed) workers
+        in the same slot so totals survive restarts.
+
+        :param offset:  counter row offset of worker
+        :param base:    counters published by previous workers in the slot
+        :param counter: requests handled by the worker
+        :param cache:   cache within the worker backend chain
+        """
+        row = list(base)
+        row[REQUESTS] += counter.value
+        if cache is not None:
+            row[CACHE_HITS]   += cache.stats.hits
+            row[CACHE_MISSES] += cache.stats.misses
+        if self.packet_cache is not None:
+            row[PACKET_HITS] += self.packet_cache.hits
+        with self.counters.get_lock():
+            self.counters[offset:offset + len(COUNTERS)] = row
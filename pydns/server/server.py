@@ -1,6 +1,7 @@
 """
 Simple and Extensible DNS Server Implementation
 """
+import struct
 from enum import IntEnum
 from logging import Logger, getLogger
 from typing import Optional
@@ -10,13 +11,22 @@ from pyserve import Session as BaseSession
 from pyderive import dataclass, field
 
 from .backend import Backend
+from .packet import PacketCache
 from ..enum import QR, OpCode, RType, RCode
-from ..message import Message
+from ..message import Message, LazyMessage
 from ..edns import EdnsAnswer
-from ..exceptions import DnsError, NotImplemented
+from ..exceptions import DnsError, FormatError, NotImplemented
+from ..flags import Flag
+from ..wire import HEADER
 
 #** Variables **#
-__all__ = ['Server']
+__all__ = ['Mode', 'Server']
+
+#: response bit of the raw header flags
+QR_BIT = 1 << 15
+
+#: raw request flag bits echoed into error responses (opcode, rd)
+ERROR_ECHO_MASK = 0x7800 | int(Flag.RDesired)
 
 #** Classes **#
 
@@ -32,8 +42,9 @@ class Server(BaseSession):
     """
     Extendable Implementation of DNS Server Session Manager for PyServe
     """
-    backend: Backend
-    logger:  Logger = field(default_factory=lambda: getLogger('pydns'))
+    backend:      Backend
+    logger:       Logger = field(default_factory=lambda: getLogger('pydns'))
+    packet_cache: Optional[PacketCache] = None
 
     ### DNS Handlers
 
@@ -101,18 +112,42 @@ class Server(BaseSession):
         parse raw packet-data and process request
         """
         self.logger.debug(f'{self.addr_str} | recieved {len(data)} bytes')
-        msg = Message.unpack(data)
+        try:
+            request = LazyMessage.unpack(data)
+        except FormatError as e:
+            self.logger.warning(f'{self.addr_str} | malformed request: {e}')
+            self.reject_malformed(data)
+            return
         # ignore request if not a request
-        if msg.flags.qr != QR.Question:
+        if request.flags.qr != QR.Question:
+            return
+        # respond directly w/ wire-format response if already cached
+        if self.packet_cache is not None:
+            response = self.packet_cache.get(request)
+            if response is not None:
+                self.logger.debug(f'{self.addr_str} | packet-cache hit')
+                self.writer.write(response)
+                return
+        # decode sections (only skipped over so far) and reject bad content
+        # (additional records are only decoded when no EDNS is present)
+        try:
+            msg = Message(
+                id=request.id,
+                flags=request.flags,
+                questions=request.questions,
+                answers=request.answers,
+                authority=request.authority,
+                additional=[EdnsAnswer()] \
+                    if request.edns_offset is not None else request.additional,
+            )
+        except (FormatError, IndexError, ValueError, struct.error) as e:
+            self.logger.warning(f'{self.addr_str} | malformed request: {e}')
+            self.reject_malformed(data)
             return
         # update flags for response
         msg.flags.qr = QR.Response
         msg.flags.recursion_available = self.backend.recursion_available
         try:
-            # add standard empty EDNS response when present
-            if any(a.rtype == RType.OPT for a in msg.additional):
-                msg.additional = []
-                msg.additional.append(EdnsAnswer())
             # reject request if not a query
             if msg.flags.op in (OpCode.Query, OpCode.InverseQuery):
                 self.process_query(msg)
@@ -131,11 +166,32 @@ class Server(BaseSession):
             msg.flags.rcode = RCode.ServerFailure
             self.logger.exception(f'{self.addr_str} | captured exception')
         finally:
-            # send response
-            data = msg.pack()
+            # send response packed directly into a single buffer
+            data = bytearray()
+            msg.pack_into(data)
+            if self.packet_cache is not None:
+                self.packet_cache.set(request, data)
             self.logger.debug(f'{self.addr_str} | sent {len(data)} bytes')
             self.writer.write(data)
 
+    def reject_malformed(self, data: bytes):
+        """
+        reply w/ FORMERR to a malformed request whose header is still intact
+
+        :param data: raw malformed request
+        """
+        if len(data) < HEADER.size:
+            return
+        mid, iflags = HEADER.unpack_from(data, 0)[:2]
+        if iflags & QR_BIT:
+            return
+        flags = QR_BIT | (iflags & ERROR_ECHO_MASK) | RCode.FormatError
+        if self.backend.recursion_available:
+            flags |= Flag.RAvailable
+        response = HEADER.pack(mid, flags, 0, 0, 0, 0)
+        self.logger.debug(f'{self.addr_str} | sent {len(response)} bytes')
+        self.writer.write(response)
+
     def connection_lost(self, err: Optional[Exception]):
         """
         debug log connection lost
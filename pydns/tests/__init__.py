@@ -3,9 +3,11 @@ PyDNS UnitTests
 """
 
 #** Variables **#
-__all__ = ['ClientTests', 'MessageTests']
+__all__ = ['ClientTests', 'CodecTests', 'MessageTests', 'ServerTests']
 
 #** Imports **#
 from .client import ClientTests
+from .codec import CodecTests
 from .message import MessageTests
+from .server import ServerTests
 
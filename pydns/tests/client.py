@@ -1,16 +1,177 @@
 """
 DNS Client UnitTests
 """
+import asyncio
+import os
+import socket
+import ssl
+import struct
+import time
+from base64 import urlsafe_b64decode
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ipaddress import IPv4Address
+from threading import Thread, current_thread
 from unittest import TestCase
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
 
-from .. import Question, RCode, RType
-from ..client import HttpsClient, TcpClient, UdpClient
+from .. import (
+    A, QR, TXT, Answer, Flags, Message, OpCode, Question, RCode, RType)
+from ..client import (
+    AsyncTcpClient, AsyncUdpClient, HedgePolicy, HttpsClient,
+    MessageIds, RetryPolicy, TcpClient, TlsClient, UdpClient, new_query)
+from ..client.framing import FrameBuffer, frame
+from ..client.hedge import Hedger
+from ..client.selector import Selector
+from ..codec import use_fastpath
 
 #** Variables **#
 __all__ = ['ClientTests']
 
+#: self-signed certificate and key for local tls test servers
+CERTS = os.path.join(os.path.dirname(__file__), 'certs')
+CERT  = os.path.join(CERTS, 'localhost.crt')
+KEY   = os.path.join(CERTS, 'localhost.key')
+
+#** Functions **#
+
+def reply(request: Message) -> Message:
+    """generate test response w/ ip determined by request domain"""
+    name     = request.questions[0].name
+    ip       = IPv4Address(f'10.0.0.{name.count(b"x")}')
+    response = Message(request.id, request.flags,
+        request.questions, [Answer(name, 30, A(ip))])
+    response.flags.qr = QR.Response
+    if name.startswith(b'large'):
+        response.answers += [Answer(name, 30, TXT(b'a' * 255))] * 200
+    if name.startswith(b'txt'):
+        response.answers.append(Answer(name, 30, TXT(name)))
+    return response
+
 #** Classes **#
 
+class ReorderingServer(asyncio.DatagramProtocol):
+    """
+    Local UDP DNS Responder Answering Batches of Requests in Reverse Order
+    """
+
+    def __init__(self, batch: int, noise: bool = True):
+        self.batch    = batch
+        self.noise    = noise
+        self.requests = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        request = Message.unpack(data)
+        if request.questions[0].name == b'drop.example.com':
+            return
+        self.requests.append((request, addr))
+        if len(self.requests) < self.batch:
+            return
+        for request, addr in reversed(self.requests):
+            if self.noise:
+                self.transport.sendto(b'garbage', addr)
+            self.transport.sendto(reply(request).pack(), addr)
+        self.requests.clear()
+
+class DelayServer(asyncio.DatagramProtocol):
+    """
+    Local UDP DNS Responder Answering each Request after a Fixed Delay
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        response = reply(Message.unpack(data)).pack()
+        loop     = asyncio.get_running_loop()
+        loop.call_later(self.delay, self.transport.sendto, response, addr)
+
+class PipelineServer(asyncio.Protocol):
+    """
+    Local TCP DNS Responder Answering Batches of Requests in Reverse Order
+
+    Responses are written a single byte at a time to exercise reassembly.
+    """
+
+    def __init__(self, batch: int):
+        self.batch    = batch
+        self.frames   = FrameBuffer()
+        self.requests = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        for data in self.frames.feed(data):
+            request = Message.unpack(data)
+            if request.questions[0].name != b'drop.example.com':
+                self.requests.append(request)
+        if len(self.requests) < self.batch:
+            return
+        stream = b''.join(bytes(frame(reply(r))) for r in self.requests[::-1])
+        for n in range(len(stream)):
+            self.transport.write(stream[n:n + 1])
+        self.requests.clear()
+
+class DohHandler(BaseHTTPRequestHandler):
+    """
+    Local RFC 8484 Responder supporting both GET and POST Requests
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *_):
+        pass
+
+    def respond(self, data: bytes):
+        request  = Message.unpack(data)
+        response = reply(request).pack()
+        self.server.requests.append((self.command, request.id)) #type: ignore
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/dns-message')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def do_GET(self):
+        param = parse_qs(urlsplit(self.path).query)['dns'][0]
+        self.respond(urlsafe_b64decode(param + '=' * (-len(param) % 4)))
+
+    def do_POST(self):
+        self.respond(self.rfile.read(int(self.headers['Content-Length'])))
+
+class DohServer(ThreadingHTTPServer):
+    """
+    Local DNS over HTTPS Server Counting Accepted Connections
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), DohHandler)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(CERT, KEY)
+        self.socket      = context.wrap_socket(self.socket, server_side=True)
+        self.connections = 0
+        self.requests    = []
+
+    def get_request(self):
+        self.connections += 1
+        return super().get_request()
+
+    def __enter__(self):
+        Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *_):
+        self.shutdown()
+        self.server_close()
+
 class ClientTests(TestCase):
     """
     DNS Message Packet Parsing/Construction UnitTests
@@ -57,3 +218,423 @@ class ClientTests(TestCase):
         self.assertEqual({str(a.content.ip) for a in response.answers}, #type: ignore
             {'1.0.0.1', '1.1.1.1'})
         self.assertEqual(response.source, client.url)
+
+    def test_https_keepalive(self):
+        """
+        ensure https client reuses connections and resumes tls sessions
+        """
+        context = ssl.create_default_context(cafile=CERT)
+        with DohServer() as server:
+            url = f'https://localhost:{server.server_address[1]}/dns-query'
+            for method in ('POST', 'GET'):
+                client = HttpsClient(url, timeout=5,
+                    method=method, pool_size=1, context=context)
+                for n in range(1, 4):
+                    question = Question(b'x' * n + b'.example.com', RType.A)
+                    response = client.query(question)
+                    self.assertEqual(response.questions, [question])
+                    self.assertEqual(response.answers[0].content.ip, #type: ignore
+                        IPv4Address(f'10.0.0.{n + 1}'))
+                    self.assertEqual(response.source, url)
+                client.drain()
+                client.query(Question(b'example.com', RType.A))
+                self.assertEqual(client.sessions.handshakes, 2)
+                self.assertEqual(client.sessions.resumed, 1)
+            self.assertEqual(server.connections, 4)
+            methods = [method for method, _ in server.requests]
+            self.assertEqual(methods, ['POST'] * 4 + ['GET'] * 4)
+            self.assertTrue(all(mid == 0 for _, mid in server.requests[4:]))
+
+    def test_tcp_reset(self):
+        """
+        ensure tcp client replaces pooled connections reset by the upstream
+        """
+        question = Question(b'x.example.com', RType.A)
+        async def run():
+            loop      = asyncio.get_running_loop()
+            protocols = []
+            def factory():
+                protocols.append(PipelineServer(1))
+                return protocols[-1]
+            server = await loop.create_server(factory, '127.0.0.1', 0)
+            addr   = server.sockets[0].getsockname()
+            client = TcpClient([addr], timeout=2, pool_size=1)
+            try:
+                await loop.run_in_executor(None, client.warm)
+                # upstream resets the idle connection (SO_LINGER=0)
+                transport = protocols[0].transport
+                transport.get_extra_info('socket').setsockopt(
+                    socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+                transport.abort()
+                await asyncio.sleep(0.1)
+                pool = client.upstream_pool(addr)
+                sock = await loop.run_in_executor(None, client.reserve, pool)
+                pool.put(sock)
+                await asyncio.sleep(0.1)
+                self.assertEqual(len(protocols), 2)
+                # queries skip connections reset while idle in the pool
+                protocols[1].transport.get_extra_info('socket').setsockopt(
+                    socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+                protocols[1].transport.abort()
+                await asyncio.sleep(0.1)
+                response = await loop.run_in_executor(
+                    None, client.query, question)
+                self.assertEqual(response.questions, [question])
+                self.assertEqual(len(protocols), 3)
+            finally:
+                client.drain()
+                server.close()
+        asyncio.run(run())
+
+    def test_tls_client(self):
+        """
+        ensure tls client reuses connections and resumes tls sessions
+        """
+        names     = [b'x' * n + b'.example.com' for n in range(1, 6)]
+        questions = [Question(name, RType.A) for name in names]
+        context   = ssl.create_default_context(cafile=CERT)
+        async def run():
+            loop      = asyncio.get_running_loop()
+            protocols = []
+            def factory():
+                protocols.append(PipelineServer(1))
+                return protocols[-1]
+            server_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            server_ctx.load_cert_chain(CERT, KEY)
+            server = await loop.create_server(
+                factory, '127.0.0.1', 0, ssl=server_ctx)
+            addr   = server.sockets[0].getsockname()
+            client = TlsClient([addr], timeout=2,
+                pool_size=1, hostname='localhost', context=context)
+            try:
+                await loop.run_in_executor(None, client.warm)
+                for question in questions[:3]:
+                    response = await loop.run_in_executor(
+                        None, client.query, question)
+                    self.assertEqual(response.questions, [question])
+                self.assertEqual(len(protocols), 1)
+                # upstream closes idle connection and client reconnects
+                protocols[0].transport.close()
+                await asyncio.sleep(0.1)
+                response = await loop.run_in_executor(
+                    None, client.query, questions[3])
+                self.assertEqual(response.questions, [questions[3]])
+                self.assertEqual(len(protocols), 2)
+                self.assertEqual(client.sessions.handshakes, 2)
+                self.assertEqual(client.sessions.resumed, 1)
+                batch = lambda: list(client.query_many(questions, 2))
+                for _ in range(2):
+                    results = await loop.run_in_executor(None, batch)
+                    self.assertEqual(len(results), len(questions))
+                    self.assertTrue(all(r.error is None for r in results))
+                    # upstream closes connection between batches
+                    protocols[-1].transport.close()
+                    await asyncio.sleep(0.1)
+                self.assertEqual(len(protocols), 3)
+            finally:
+                client.drain()
+                server.close()
+        asyncio.run(run())
+
+    def test_message_ids(self):
+        """
+        ensure message-id allocator never hands out duplicate ids
+        """
+        ids  = MessageIds()
+        mids = {ids.allocate() for _ in range(5000)}
+        self.assertEqual(len(mids), 5000)
+        self.assertTrue(all(0 < mid <= 0xFFFF for mid in mids))
+        ids.release(mids.pop())
+        self.assertEqual(len(ids), 4999)
+
+    def test_async_udp_client(self):
+        """
+        ensure async udp client matches out-of-order responses and timeouts
+        """
+        async def run():
+            loop = asyncio.get_running_loop()
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: ReorderingServer(3), local_addr=('127.0.0.1', 0))
+            addr = transport.get_extra_info('sockname')
+            try:
+                async with AsyncUdpClient([addr], timeout=2) as client:
+                    names = [b'x.example.com', b'xx.example.com', b'xxx.com']
+                    responses = await asyncio.gather(*[
+                        client.query(Question(name, RType.A))
+                        for name in names])
+                    client.timeout = 0.1
+                    drop = Question(b'drop.example.com', RType.A)
+                    with self.assertRaises(asyncio.TimeoutError):
+                        await client.query(drop)
+                    self.assertFalse(client.endpoints[0].pending)
+                    # send errors only fail requests to the failed upstream
+                    client.timeout = 2
+                    request = lambda n, addr: client.send(
+                        new_query(Question(names[n], RType.A)), addr)
+                    results = await asyncio.gather(request(0, addr),
+                        request(1, addr), request(0, ('127.0.0.1', 0)),
+                        request(2, addr), return_exceptions=True)
+                    self.assertIsInstance(results[2], OSError)
+                    self.assertEqual([r.questions[0].name for r in results
+                        if isinstance(r, Message)], names)
+                    return names, responses
+            finally:
+                transport.close()
+        names, responses = asyncio.run(run())
+        for name, response in zip(names, responses):
+            self.assertEqual(response.questions[0].name, name)
+            self.assertEqual(response.answers[0].content.ip, #type: ignore
+                IPv4Address(f'10.0.0.{name.count(b"x")}'))
+
+    def test_frame_buffer(self):
+        """
+        ensure frame buffer reassembles messages split across reads
+        """
+        question = Question(b'large.example.com', RType.A)
+        messages = [
+            reply(Message(n, Flags(QR.Question, OpCode.Query), [question]))
+            for n in range(3)]
+        stream = b''.join(bytes(frame(m)) for m in messages)
+        frames = FrameBuffer()
+        output = []
+        for n in range(0, len(stream), 1000):
+            output.extend(frames.feed(stream[n:n + 1000]))
+        self.assertEqual(len(frames), 0)
+        self.assertEqual([Message.unpack(data) for data in output], messages)
+
+    def test_tcp_pipeline(self):
+        """
+        ensure pipelined tcp client matches reassembled out-of-order responses
+        """
+        async def run():
+            loop   = asyncio.get_running_loop()
+            server = await loop.create_server(
+                lambda: PipelineServer(3), '127.0.0.1', 0)
+            addr = server.sockets[0].getsockname()
+            try:
+                async with AsyncTcpClient([addr], timeout=5) as client:
+                    names = [b'x.example.com', b'large.example.com', b'xx.com']
+                    responses = await asyncio.gather(*[
+                        client.query(Question(name, RType.A))
+                        for name in names])
+                    self.assertEqual(len(client.pool), 1)
+                # blocking client must also reassemble large responses
+                server.close()
+                server = await loop.create_server(
+                    lambda: PipelineServer(1), '127.0.0.1', 0)
+                addr   = server.sockets[0].getsockname()
+                client = TcpClient([addr], timeout=5)
+                large  = Question(b'large.example.com', RType.A)
+                result = await loop.run_in_executor(None, client.query, large)
+                client.drain()
+                return names, responses + [result]
+            finally:
+                server.close()
+        names, responses = asyncio.run(run())
+        for name, response in zip(names + [b'large.example.com'], responses):
+            self.assertEqual(response.questions[0].name, name)
+        self.assertEqual(len(responses[1].answers), 201)
+        self.assertEqual(len(responses[3].answers), 201)
+
+    def test_selector(self):
+        """
+        ensure selector prefers fast upstreams and ejects failing ones
+        """
+        selector = Selector(['slow', 'fast', 'dead'],
+            explore=0, threshold=2, eject_time=0.05)
+        self.assertEqual({selector.pick() for _ in range(3)}, {'slow'})
+        selector.success('slow', 0.5)
+        selector.success('fast', 0.01)
+        selector.success('dead', 0.001)
+        self.assertEqual(selector.pick(), 'dead')
+        selector.failure('dead')
+        selector.failure('dead')
+        self.assertEqual(selector.pick(), 'fast')
+        stats = {u.addr: u for u in selector.stats()}
+        self.assertTrue(stats['dead'].ejected())
+        self.assertEqual(stats['dead'].failures, 2)
+        self.assertEqual(stats['fast'].srtt, 0.01)
+        time.sleep(0.06)
+        self.assertFalse(selector.stats()[2].ejected())
+
+    def test_udp_failover(self):
+        """
+        ensure udp client routes around an unresponsive upstream
+        """
+        async def run():
+            loop = asyncio.get_running_loop()
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: ReorderingServer(1, False), local_addr=('127.0.0.1', 0))
+            live = transport.get_extra_info('sockname')
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as dead:
+                dead.bind(('127.0.0.1', 0))
+                client = UdpClient([dead.getsockname(), live], timeout=0.1)
+                client.selector.threshold = 1
+                question = Question(b'x.example.com', RType.A)
+                results  = []
+                for _ in range(4):
+                    try:
+                        results.append(await loop.run_in_executor(
+                            None, client.query, question))
+                    except socket.timeout:
+                        pass
+                transport.close()
+                return client.selector.stats(), results
+        stats, results = asyncio.run(run())
+        self.assertGreaterEqual(len(results), 3)
+        self.assertEqual(stats[0].failures, 1)
+        self.assertTrue(stats[0].ejected())
+        self.assertEqual(stats[1].successes, len(results))
+
+    def test_hedging(self):
+        """
+        ensure slow upstreams are hedged and failed attempts are retried
+        """
+        async def run():
+            loop = asyncio.get_running_loop()
+            servers = [await loop.create_datagram_endpoint(
+                lambda: DelayServer(delay), local_addr=('127.0.0.1', 0))
+                for delay in (1, 0)]
+            slow, fast = [t.get_extra_info('sockname') for t, _ in servers]
+            hedge    = HedgePolicy(delay=0.05)
+            question = Question(b'x.example.com', RType.A)
+            try:
+                # hedged request to fast upstream wins (sync and async)
+                client = UdpClient([slow, fast], timeout=2, hedge=hedge)
+                client.selector.explore = 0
+                start  = time.monotonic()
+                result = await loop.run_in_executor(
+                    None, client.query, question)
+                self.assertLess(time.monotonic() - start, 0.5)
+                self.assertEqual(result.source, fast[0])
+                self.assertEqual(client.hedger.stats.hedges, 1)
+                self.assertEqual(client.hedger.stats.hedge_wins, 1)
+                # primary runs inline and the losing attempt is cancelled
+                attempts = []
+                def send(msg, addr):
+                    try:
+                        return client.send(msg, addr)
+                    finally:
+                        attempts.append((addr, current_thread(), time.time()))
+                def request():
+                    start  = time.time()
+                    result = client.hedger.request(send, new_query(question))
+                    time.sleep(0.1)
+                    return current_thread(), start, result
+                caller, start, result = \
+                    await loop.run_in_executor(None, request)
+                self.assertEqual(result.source, fast[0])
+                self.assertEqual({a[0] for a in attempts}, {slow, fast})
+                for addr, thread, end in attempts:
+                    self.assertEqual(thread is caller, addr == slow)
+                    self.assertLess(end - start, 0.5)
+                # hedges are bounded by the remaining request budget
+                client = UdpClient([slow], timeout=0.2, hedge=hedge)
+                start  = time.monotonic()
+                with self.assertRaises(OSError):
+                    await loop.run_in_executor(None, client.query, question)
+                self.assertLess(time.monotonic() - start, 0.5)
+                async with AsyncUdpClient([slow, fast], hedge=hedge) as aio:
+                    aio.selector.explore = 0
+                    await aio.query(question)
+                    self.assertEqual(aio.hedger.stats.hedge_wins, 1)
+                # exhausted retries against an upstream that is too slow
+                retry = RetryPolicy(attempts=3, backoff=0.01)
+                async with AsyncUdpClient([slow], 0.05, retry=retry) as aio:
+                    with self.assertRaises(asyncio.TimeoutError):
+                        await aio.query(question)
+                    self.assertEqual(aio.hedger.stats.retries, 2)
+                    self.assertEqual(aio.hedger.stats.failures, 1)
+            finally:
+                for transport, _ in servers:
+                    transport.close()
+        asyncio.run(run())
+
+    def test_hedge_executor(self):
+        """
+        ensure concurrent first requests share a single hedge thread-pool
+        """
+        selector = Selector([('127.0.0.1', 53), ('127.0.0.2', 53)])
+        hedger   = Hedger(selector, HedgePolicy(delay=1))
+        created  = []
+        def executor(workers):
+            time.sleep(0.05) # widen the window for racing requests
+            created.append(ThreadPoolExecutor(workers))
+            return created[-1]
+        question = Question(b'x.example.com', RType.A)
+        send     = lambda msg, addr: reply(msg)
+        with patch('pydns.client.hedge.ThreadPoolExecutor', executor):
+            threads = [Thread(target=hedger.request,
+                args=(send, new_query(question))) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(created), 1)
+        created[0].shutdown()
+
+    def test_udp_buffer_reuse(self):
+        """
+        ensure rdata decoded from pooled receive buffers is never overwritten
+        """
+        async def run():
+            loop = asyncio.get_running_loop()
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: DelayServer(0), local_addr=('127.0.0.1', 0))
+            addr = transport.get_extra_info('sockname')
+            use_fastpath(True)
+            try:
+                client = UdpClient([addr], timeout=2, pool_size=1)
+                first  = await loop.run_in_executor(None,
+                    client.query, Question(b'txt-one.example.com', RType.TXT))
+                second = await loop.run_in_executor(None,
+                    client.query, Question(b'txt-two.example.com', RType.TXT))
+                text   = first.answers[1].content.text #type: ignore
+                self.assertIsInstance(text, bytes)
+                self.assertEqual(text, b'txt-one.example.com')
+                self.assertEqual(second.answers[1].content.text, #type: ignore
+                    b'txt-two.example.com')
+                self.assertEqual(hash(text), hash(b'txt-one.example.com'))
+            finally:
+                use_fastpath(False)
+                transport.close()
+        asyncio.run(run())
+
+    def test_query_many(self):
+        """
+        ensure batch queries stream results and report per-question errors
+        """
+        names     = [b'x' * n + b'.example.com' for n in range(1, 11)]
+        questions = [Question(name, RType.A) for name in names]
+        questions.append(Question(b'drop.example.com', RType.A))
+        async def run():
+            loop = asyncio.get_running_loop()
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: ReorderingServer(1), local_addr=('127.0.0.1', 0))
+            server = await loop.create_server(
+                lambda: PipelineServer(1), '127.0.0.1', 0)
+            udp = transport.get_extra_info('sockname')
+            tcp = server.sockets[0].getsockname()
+            try:
+                results = []
+                for client in (UdpClient([udp], timeout=0.2),
+                    TcpClient([tcp], timeout=0.2)):
+                    batch = lambda: list(client.query_many(questions, 4))
+                    results.append(await loop.run_in_executor(None, batch))
+                async with AsyncUdpClient([udp], timeout=0.2) as client:
+                    results.append([r async for r in client.query_many(
+                        questions, concurrency=4)])
+                return results
+            finally:
+                transport.close()
+                server.close()
+        for results in asyncio.run(run()):
+            self.assertEqual(len(results), len(questions))
+            errors = [r for r in results if r.error is not None]
+            self.assertEqual([r.question for r in errors], questions[-1:])
+            for result in results:
+                if result.error is None:
+                    name = result.question.name
+                    self.assertEqual(result.response.questions[0].name, name)
+                    self.assertEqual(result.response.answers[0].content.ip,
+                        IPv4Address(f'10.0.0.{name.count(b"x")}'))
@@ -0,0 +1,153 @@
+"""
+DNS Fast-Path Codec UnitTests
+"""
+from ipaddress import IPv4Address, IPv6Address
+from unittest import TestCase
+
+from .. import (
+    A, AAAA, CNAME, MX, NS, PTR, SOA, SRV, TXT, Answer, Flags, Message,
+    LazyMessage, OpCode, QR, Question, RType, Unknown, codec)
+from ..edns import EdnsAnswer
+
+#** Variables **#
+__all__ = ['CodecTests']
+
+EXAMPLE_SOA = '5c7d818000010000000100010377777706676f6f676c6503636f6d00000' +\
+    '60001c010000600010000003c0026036e7331c01009646e732d61646d696ec0101ee80' +\
+    '4720000038400000384000007080000003c00002904d0000000000000'
+
+#** Classes **#
+
+class CodecTests(TestCase):
+    """
+    DNS Fast-Path Codec Parity UnitTests
+    """
+
+    def setUp(self):
+        self.message = Message(
+            id=1234,
+            flags=Flags(qr=QR.Response, op=OpCode.Query),
+            questions=[Question(b'www.example.com', RType.A)],
+            answers=[
+                Answer(b'www.example.com', 30, CNAME(b'cdn.example.com')),
+                Answer(b'cdn.example.com', 30, A(IPv4Address('1.2.3.4'))),
+                Answer(b'cdn.example.com', 30, AAAA(IPv6Address('::1'))),
+                Answer(b'example.com', 30, MX(5, b'mx.example.com')),
+                Answer(b'example.com', 30, TXT(b'hello world')),
+                Answer(b'_sip._tcp.example.com', 30,
+                    SRV(1, 2, 5060, b'sip.example.com')),
+            ],
+            authority=[
+                Answer(b'example.com', 60, SOA(
+                    b'ns1.example.com', b'admin.example.com', 1, 2, 3, 4, 5)),
+                Answer(b'example.com', 60, NS(b'ns1.example.com')),
+            ],
+            additional=[
+                Answer(b'ns1.example.com', 60, A(IPv4Address('5.6.7.8'))),
+                EdnsAnswer(content=b'cookie', udp_size=1232),
+            ]
+        )
+
+    def tearDown(self):
+        codec.use_fastpath(False)
+        codec.use_lazy_content(False)
+
+    def test_pack_parity(self):
+        """
+        ensure fast-path packing is byte-identical to standard packing
+        """
+        self.assertEqual(self.message.pack(), self.message.pack(fast=True))
+
+    def test_pack_into(self):
+        """
+        ensure pack_into writes identical bytes into growable/fixed buffers
+        """
+        data   = self.message.pack()
+        buffer = bytearray(b'\x00\x00')
+        self.assertEqual(self.message.pack_into(buffer, 2), len(data) + 2)
+        self.assertEqual(bytes(buffer[2:]), data)
+        fixed = bytearray(len(data) + 8)
+        end   = self.message.pack_into(memoryview(fixed), 8)
+        self.assertEqual(bytes(fixed[8:end]), data)
+        with self.assertRaises(OverflowError):
+            self.message.pack_into(memoryview(bytearray(len(data) - 1)))
+
+    def test_unpack_parity(self):
+        """
+        ensure fast-path unpacking matches standard unpacking
+        """
+        for data in (self.message.pack(), bytes.fromhex(EXAMPLE_SOA)):
+            standard = Message.unpack(data)
+            fastpath = Message.unpack(data, fast=True)
+            self.assertEqual(standard, fastpath)
+            self.assertEqual(fastpath.pack(fast=True), data)
+
+    def test_unpack_buffers(self):
+        """
+        ensure bytearray/memoryview buffers unpack into rdata copies
+        """
+        data = self.message.pack()
+        for fast in (False, True):
+            for buffer in (bytearray(data), memoryview(data)):
+                message = Message.unpack(buffer, fast=fast)
+                self.assertEqual(message, self.message)
+                self.assertEqual(message.pack(fast=fast), data)
+        for lazy in (False, True):
+            buffer  = bytearray(data)
+            message = Message.unpack(buffer, fast=True, lazy=lazy)
+            buffer[:] = bytes(len(buffer))
+            self.assertEqual(message, self.message)
+            self.assertIsInstance(message.answers[4].content.text, bytes)
+            self.assertIsInstance(message.additional[1].content, bytes)
+
+    def test_unknown_content(self):
+        """
+        ensure unsupported content falls back to standard implementation
+        """
+        self.message.answers = [Answer(b'example.com', 30, PTR(b'a.b'))]
+        data  = bytearray(self.message.pack())
+        data[data.index(b'\x00\x0c\x00\x01') + 1] = RType.HINFO
+        fastpath = Message.unpack(bytes(data), fast=True)
+        self.assertEqual(fastpath.answers[0].rtype, RType.HINFO)
+        self.assertIsInstance(fastpath.answers[0].content, Unknown)
+        self.assertEqual(fastpath.pack(fast=True), bytes(data))
+        self.assertEqual(fastpath.pack(), bytes(data))
+
+    def test_lazy_content(self):
+        """
+        ensure lazy content defers decoding and re-packs raw rdata verbatim
+        """
+        for data in (self.message.pack(), bytes.fromhex(EXAMPLE_SOA)):
+            message = Message.unpack(data, lazy=True)
+            for answer in message.answers + message.authority:
+                self.assertIsInstance(answer.content, codec.LazyContent)
+                self.assertFalse(answer.content.decoded)
+            self.assertEqual(message.pack(fast=True), data)
+            self.assertEqual(message.pack(), data)
+            self.assertEqual(message, Message.unpack(data))
+        # modified content is re-encoded from its decoded form
+        message = Message.unpack(self.message.pack(), lazy=True)
+        content = message.answers[1].content
+        self.assertEqual(content.ip, IPv4Address('1.2.3.4'))
+        self.assertTrue(content.decoded)
+        self.assertTrue(content.reusable())
+        content.ip = IPv4Address('4.3.2.1')
+        self.assertFalse(content.reusable())
+        self.assertEqual(message.answers[3].content.exchange, b'mx.example.com')
+        self.message.answers[1].content.ip = IPv4Address('4.3.2.1')
+        self.assertEqual(message.pack(fast=True), self.message.pack())
+        # lazy message views propagate lazy content decoding
+        view = LazyMessage.unpack(self.message.pack(), lazy=True)
+        self.assertIsInstance(view.answers[0].content, codec.LazyContent)
+        self.assertEqual(view.to_message(), self.message)
+
+    def test_global_toggle(self):
+        """
+        ensure global fast-path toggle is respected and overridable
+        """
+        self.assertFalse(codec.is_fastpath())
+        codec.use_fastpath()
+        self.assertTrue(codec.is_fastpath())
+        self.assertFalse(codec.is_fastpath(False))
+        data = self.message.pack()
+        self.assertEqual(Message.unpack(data), Message.unpack(data, fast=False))
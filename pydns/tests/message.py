@@ -3,7 +3,8 @@ DNS Message Packing/Unpacking UnitTests
 """
 from unittest import TestCase
 
-from .. import Message, OpCode, QR, RClass, RCode, RType
+from .. import (
+    FormatError, LazyMessage, Message, OpCode, QR, RClass, RCode, RType)
 from ..edns import EdnsAnswer
 
 #** Variables **#
@@ -96,3 +97,27 @@ class MessageTests(TestCase):
         response = Message.unpack(data)
         data_2   = response.pack()
         self.assertEqual(data, data_2)
+
+    def test_lazy_response(self):
+        """
+        ensure lazy message view decodes sections matching standard parsing
+        """
+        data     = bytes.fromhex(EXAMPLE_RESPONSE)
+        response = LazyMessage.unpack(data)
+        self.assertEqual(response.id, 0xa327)
+        self.assertEqual(response.counts, (1, 1, 0, 1))
+        self.assertIsNotNone(response.edns_offset)
+        self.assertIsInstance(response.edns, EdnsAnswer)
+        self.assertEqual(response.to_message(), Message.unpack(data))
+
+    def test_lazy_malformed(self):
+        """
+        ensure lazy message view rejects malformed packets before decoding
+        """
+        data = bytes.fromhex(EXAMPLE_RESPONSE)
+        with self.assertRaises(FormatError):
+            LazyMessage.unpack(data[:11])
+        with self.assertRaises(FormatError):
+            LazyMessage.unpack(data[:40])
+        with self.assertRaises(FormatError):
+            LazyMessage.unpack(data[:-1])
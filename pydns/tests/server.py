@@ -0,0 +1,535 @@
+"""
+DNS Server UnitTests
+"""
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ipaddress import IPv4Address
+from tempfile import TemporaryDirectory
+from threading import Lock
+from unittest import TestCase
+from unittest.mock import patch
+
+from .. import A, QR, SOA, Answer, LazyMessage, Message, Question, RCode, RType
+from ..client import BaseClient, new_query
+from ..server import PacketCache, Runner, Server
+from ..server.backend import Cache, Eviction, Forwarder, MemoryBackend
+from ..server.backend import SharedCache
+from ..server.backend.snapshot import read_snapshot
+
+#** Variables **#
+__all__ = ['ServerTests']
+
+EXAMPLE_REQUEST = 'a32701200001000000000001076578616d706c6503636f6d' +\
+    '000001000100002904d000000000000c000a0008c5a01ecf50bd546c'
+
+#** Classes **#
+
+class MockWriter:
+    """
+    Mock PyServe Writer to collect Server Responses
+    """
+
+    def __init__(self):
+        self.responses = []
+
+    def write(self, data: bytes):
+        self.responses.append(bytes(data))
+
+class SlowClient(BaseClient):
+    """
+    Mock Upstream Client Counting Slow Requests
+    """
+
+    def __init__(self, delay: float = 0.1, ttl: int = 30):
+        self.delay    = delay
+        self.ttl      = ttl
+        self.requests = 0
+        self.fail     = False
+        self.mutex    = Lock()
+
+    def request(self, msg: Message) -> Message:
+        with self.mutex:
+            self.requests += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise TimeoutError('upstream timeout')
+        return self.respond(msg)
+
+    def respond(self, msg: Message) -> Message:
+        name     = msg.questions[0].name
+        response = Message(msg.id, msg.flags, msg.questions,
+            [Answer(name, self.ttl, A(IPv4Address('10.0.0.1')))])
+        response.flags.qr = QR.Response
+        # names starting w/ `nx` do not exist and aaaa queries have no data
+        if name.startswith(b'nx') or msg.questions[0].qtype == RType.AAAA:
+            soa = SOA(b'ns.example.com', b'admin.example.com', 1, 2, 3, 4, 60)
+            response.answers   = []
+            response.authority = [Answer(b'example.com', 3600, soa)]
+            if name.startswith(b'nx'):
+                response.flags.rcode = RCode.NonExistantDomain
+        return response
+
+class ServerTests(TestCase):
+    """
+    DNS Server Request Processing UnitTests
+    """
+
+    def setUp(self):
+        self.backend = MemoryBackend()
+        self.backend.save_domain_dict(b'example.com', {
+            'A': [{'ip': '1.2.3.4', 'ttl': 30}],
+        })
+        self.writer = MockWriter()
+
+    def request(self, data: bytes, **kwargs) -> Message:
+        """
+        process raw request with new server session and return response
+        """
+        server = Server(backend=self.backend, **kwargs)
+        server.connection_made(('127.0.0.1', 53), self.writer)
+        server.data_recieved(data)
+        return Message.unpack(self.writer.responses[-1])
+
+    def test_query(self):
+        """
+        ensure server answers simple query as intended
+        """
+        response = self.request(bytes.fromhex(EXAMPLE_REQUEST))
+        self.assertEqual(response.id, 0xa327)
+        self.assertEqual(len(response.answers), 1)
+        self.assertEqual(response.answers[0].rtype, RType.A)
+        self.assertEqual(str(response.answers[0].content.ip), '1.2.3.4') #type: ignore
+
+    def test_malformed_request(self):
+        """
+        ensure malformed requests w/ an intact header are rejected w/ FORMERR
+        """
+        request  = bytes.fromhex(EXAMPLE_REQUEST)
+        response = self.request(request[:20])
+        self.assertEqual(response.id, 0xa327)
+        self.assertEqual(response.flags.qr, QR.Response)
+        self.assertEqual(response.flags.rcode, RCode.FormatError)
+        self.assertTrue(response.flags.recursion_desired)
+        self.assertEqual(response.questions, [])
+        # sections w/ invalid compression pointers or unknown enums
+        header = bytes.fromhex('a32701000001000000000000')
+        for body in (b'\xff\xff\x00\x01\x00\x01',
+            b'\x07example\x03com\x00\xfd\xe8\x00\x01'):
+            response = self.request(header + body)
+            self.assertEqual(response.id, 0xa327)
+            self.assertEqual(response.flags.rcode, RCode.FormatError)
+        # truncated headers and responses are dropped w/o a reply
+        self.writer.responses.clear()
+        server = Server(backend=self.backend)
+        server.connection_made(('127.0.0.1', 53), self.writer)
+        server.data_recieved(request[:8])
+        server.data_recieved(request[:2] + b'\x81' + request[3:20])
+        self.assertEqual(self.writer.responses, [])
+
+    def test_packet_cache(self):
+        """
+        ensure packet-cache hits patch message-id and echoed flags
+        """
+        cache   = PacketCache()
+        request = bytearray.fromhex(EXAMPLE_REQUEST)
+        first   = self.request(bytes(request), packet_cache=cache)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(len(cache.entries), 1)
+        request[0:2] = b'\x12\x34'
+        request[2]  &= ~0x01 # disable recursion-desired
+        second = self.request(bytes(request), packet_cache=cache)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(second.id, 0x1234)
+        self.assertFalse(second.flags.recursion_desired)
+        self.assertTrue(first.flags.recursion_desired)
+        self.assertEqual(second.answers, first.answers)
+        responses = self.writer.responses
+        self.assertEqual(responses[0][4:], responses[1][4:])
+        # truncation bit of the request is never echoed into the response
+        request[2] |= 0x02
+        third = self.request(bytes(request), packet_cache=cache)
+        self.assertEqual(cache.hits, 2)
+        self.assertFalse(third.flags.truncated)
+        # counters stay exact under concurrent lookups
+        lazy = LazyMessage.unpack(bytes(request))
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(lambda _: cache.get(lazy), range(4000)))
+        self.assertEqual(cache.hits, 4002)
+
+    def test_forwarder_coalescing(self):
+        """
+        ensure concurrent identical forwarder lookups share one upstream query
+        """
+        client    = SlowClient()
+        forwarder = Forwarder(self.backend, client)
+        with ThreadPoolExecutor(8) as executor:
+            futures = [executor.submit(forwarder.get_answers,
+                b'missing.com', RType.A) for _ in range(8)]
+            results = [future.result() for future in futures]
+        self.assertEqual(client.requests, 1)
+        self.assertEqual(forwarder.coalesced, 7)
+        for answers in results:
+            self.assertEqual(answers.source, Forwarder.source)
+            self.assertEqual(len(answers.answers), 1)
+        # results are not cached beyond the lifetime of the flight
+        forwarder.get_answers(b'missing.com', RType.A)
+        forwarder.get_answers(b'missing.com', RType.AAAA)
+        self.assertEqual(client.requests, 3)
+        self.assertEqual(len(forwarder.flights), 0)
+
+    def test_cache_prefetch(self):
+        """
+        ensure popular cache entries are refreshed ahead of expiration
+        """
+        client = SlowClient(delay=0)
+        cache  = Cache(Forwarder(self.backend, client),
+            prefetch=1.0, prefetch_hits=2)
+        self.addCleanup(cache.close)
+        for _ in range(3):
+            answers = cache.get_answers(b'missing.com', RType.A)
+            self.assertEqual(len(answers.answers), 1)
+        cache.executor.shutdown(wait=True) #type: ignore
+        self.assertEqual(client.requests, 2)
+        self.assertEqual(cache.stats.hits, 2)
+        self.assertEqual(cache.stats.misses, 1)
+        self.assertEqual(cache.stats.prefetches, 1)
+        self.assertEqual(len(cache.refreshing), 0)
+
+    def test_cache_serve_stale(self):
+        """
+        ensure expired cache entries are served stale when upstream fails
+        """
+        client = SlowClient(delay=0, ttl=1)
+        cache  = Cache(Forwarder(self.backend, client),
+            stale_window=60, stale_ttl=5, stale_deadline=0.2)
+        self.addCleanup(cache.close)
+        cache.get_answers(b'missing.com', RType.A)
+        time.sleep(1.1)
+        # upstream failure serves stale answer w/ short ttl
+        client.fail = True
+        answers = cache.get_answers(b'missing.com', RType.A)
+        self.assertEqual(answers.source, Cache.source)
+        self.assertEqual(answers.answers[0].ttl, 5)
+        # slow upstream exceeding deadline serves stale and keeps refreshing
+        client.fail, client.delay = False, 0.5
+        answers = cache.get_answers(b'missing.com', RType.A)
+        self.assertEqual(answers.answers[0].ttl, 5)
+        self.assertEqual(cache.stats.stale, 2)
+        cache.executor.shutdown(wait=True) #type: ignore
+        answers = cache.get_answers(b'missing.com', RType.A)
+        self.assertEqual(answers.answers[0].ttl, 1)
+        self.assertEqual(cache.stats.stale, 2)
+        self.assertEqual(client.requests, 3)
+
+    def test_cache_eviction(self):
+        """
+        ensure bounded stores evict according to their policy
+        """
+        lru = Eviction.LRU.new_store(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual(sorted(k for k, _ in lru.items()), ['a', 'c'])
+        # popular entry survives a scan of one-off entries
+        tinylfu = Eviction.TINYLFU.new_store(10)
+        for _ in range(5):
+            tinylfu.set('popular', True)
+            tinylfu.get('popular')
+        for n in range(100):
+            tinylfu.get(n)
+            tinylfu.set(n, True)
+        self.assertIn('popular', tinylfu)
+        self.assertLessEqual(len(tinylfu), 10)
+        cache = Cache(self.backend, maxsize=2, eviction='tinylfu') #type: ignore
+        self.addCleanup(cache.close)
+        self.assertEqual(cache.eviction, Eviction.TINYLFU)
+
+    def test_cache_negative(self):
+        """
+        ensure nxdomain and nodata answers are negatively cached
+        """
+        client = SlowClient(delay=0)
+        cache  = Cache(Forwarder(self.backend, client), negative_ttl=30)
+        self.addCleanup(cache.close)
+        for _ in range(3):
+            answers = cache.get_answers(b'nx.example.com', RType.A)
+            self.assertEqual(answers.rcode, RCode.NonExistantDomain)
+            self.assertEqual([a.rtype for a in answers.answers], [RType.SOA])
+            nodata = cache.get_answers(b'missing.com', RType.AAAA)
+            self.assertIsNone(nodata.rcode)
+            self.assertEqual([a.rtype for a in nodata.answers], [RType.SOA])
+        self.assertEqual(client.requests, 2)
+        self.assertEqual(cache.stats.negative, 4)
+        # soa ttl is limited to the soa minimum and configured cap
+        self.assertEqual(answers.answers[0].ttl, 30)
+        cache = Cache(Forwarder(self.backend, client), negative_ttl=None)
+        self.addCleanup(cache.close)
+        cache.get_answers(b'nx.example.com', RType.A)
+        cache.get_answers(b'nx.example.com', RType.A)
+        self.assertEqual(client.requests, 4)
+
+    def test_cache_sharded(self):
+        """
+        ensure sharded cache stays bounded and consistent across threads
+        """
+        client = SlowClient(delay=0)
+        cache  = Cache(Forwarder(self.backend, client),
+            maxsize=64, shards=8, eviction='tinylfu') #type: ignore
+        self.addCleanup(cache.close)
+        names  = [f'host{n}.example.com'.encode() for n in range(256)]
+        def worker(offset: int):
+            for n in range(2000):
+                name    = names[(n * 7 + offset) % len(names)]
+                answers = cache.get_answers(name, RType.A)
+                assert answers.answers[0].name == name
+        with ThreadPoolExecutor(8) as executor:
+            for future in [executor.submit(worker, n) for n in range(8)]:
+                future.result()
+        self.assertEqual(len(cache.cache.shards), 8)
+        self.assertLessEqual(len(cache.cache), 64)
+        self.assertGreater(cache.stats.hits, 0)
+
+    def test_cache_ttl_countdown(self):
+        """
+        ensure cached ttls count down at read time w/o mutating answers
+        """
+        client = SlowClient(delay=0, ttl=20)
+        cache  = Cache(Forwarder(self.backend, client))
+        self.addCleanup(cache.close)
+        now    = time.time()
+        with patch('time.time', return_value=now):
+            first = cache.get_answers(b'missing.com', RType.A)
+        upstream = first.answers[0]
+        for elapsed, ttl in ((0, 20), (5.5, 15), (5.9, 15), (19, 1)):
+            with patch('time.time', return_value=now + elapsed):
+                answers = cache.get_answers(b'missing.com', RType.A)
+            self.assertEqual(answers.source, Cache.source)
+            self.assertEqual(answers.answers[0].ttl, ttl)
+        self.assertEqual(upstream.ttl, 20)
+        with patch('time.time', return_value=now + 20):
+            answers = cache.get_answers(b'missing.com', RType.A)
+        self.assertEqual(answers.source, Forwarder.source)
+
+    def test_cache_copy_on_read(self):
+        """
+        ensure modifying returned cache answers never affects later reads
+        """
+        client = SlowClient(delay=0, ttl=20)
+        cache  = Cache(Forwarder(self.backend, client), stale_window=60)
+        self.addCleanup(cache.close)
+        cache.get_answers(b'missing.com', RType.A)
+        # both reads happen within the same second (shared ttl template)
+        now = time.time()
+        with patch('time.time', return_value=now):
+            first = cache.get_answers(b'missing.com', RType.A)
+            first.answers[0].ttl = 1234
+            first.answers[0].content.ip = IPv4Address('192.0.2.1')
+            second = cache.get_answers(b'missing.com', RType.A)
+        self.assertEqual(second.source, Cache.source)
+        self.assertNotEqual(second.answers[0].ttl, 1234)
+        self.assertNotEqual(second.answers[0].content.ip,
+            IPv4Address('192.0.2.1'))
+        stale = cache.get_stale(b'missing.com', RType.A)
+        stale.answers[0].content.ip = IPv4Address('192.0.2.2') #type: ignore
+        third = cache.get_answers(b'missing.com', RType.A)
+        self.assertNotEqual(third.answers[0].content.ip,
+            IPv4Address('192.0.2.2'))
+
+    def test_cache_sweep(self):
+        """
+        ensure expired records are reclaimed w/o being requested again
+        """
+        client = SlowClient(delay=0, ttl=10)
+        cache  = Cache(Forwarder(self.backend, client), sweep_interval=None)
+        self.addCleanup(cache.close)
+        now    = time.time()
+        with patch('time.time', return_value=now):
+            for n in range(10):
+                cache.get_answers(f'host{n}.example.com'.encode(), RType.A)
+        self.assertEqual(len(cache.cache), 10)
+        self.assertEqual(cache.sweep(), 0)
+        with patch('time.time', return_value=now + 10):
+            self.assertEqual(cache.sweep(limit=4), 4)
+            self.assertEqual(cache.sweep(), 6)
+        self.assertEqual(len(cache.cache), 0)
+        self.assertEqual(cache.stats.expired, 10)
+        # background sweeper reclaims records on its own
+        client.ttl = 1
+        cache = Cache(Forwarder(self.backend, client), sweep_interval=0.05)
+        cache.get_answers(b'missing.com', RType.A)
+        time.sleep(1.3)
+        cache.close()
+        self.assertEqual(len(cache.cache), 0)
+        self.assertEqual(cache.stats.expired, 1)
+
+    def test_cache_memory_budget(self):
+        """
+        ensure byte budget bounds estimated record memory and reports usage
+        """
+        client = SlowClient(delay=0)
+        for eviction in Eviction:
+            cache = Cache(Forwarder(self.backend, client),
+                max_bytes=4096, shards=2, eviction=eviction, sweep_interval=None)
+            self.addCleanup(cache.close)
+            for n in range(100):
+                cache.get_answers(f'host{n}.example.com'.encode(), RType.A)
+            cache.get_answers(b'nx.example.com', RType.A)
+            usage = cache.usage()
+            self.assertLessEqual(cache.memory, 4096)
+            self.assertLess(len(cache.cache), 100)
+            self.assertEqual(cache.memory, sum(u.bytes for u in usage.values()))
+            self.assertEqual(len(cache.cache),
+                sum(u.entries for u in usage.values()))
+            self.assertGreater(usage['A'].average, 0)
+            cache.sweep()
+            for key, _ in list(cache.cache.items()):
+                cache.cache.pop(key)
+            self.assertEqual(cache.memory, 0)
+        # memory is not tracked without a byte budget
+        cache = Cache(Forwarder(self.backend, client), sweep_interval=None)
+        self.addCleanup(cache.close)
+        cache.get_answers(b'host.example.com', RType.A)
+        self.assertEqual(cache.memory, 0)
+        self.assertTrue(all(r.size is None for _, r in cache.cache.items()))
+        self.assertEqual(cache.usage()['A'].entries, 1)
+
+    def test_cache_snapshot(self):
+        """
+        ensure cache snapshots restore live records on restart
+        """
+        client = SlowClient(delay=0, ttl=60)
+        with TemporaryDirectory() as tmp:
+            path  = os.path.join(tmp, 'cache.snap')
+            cache = Cache(Forwarder(self.backend, client),
+                snapshot_path=path, sweep_interval=None)
+            now = time.time()
+            with patch('time.time', return_value=now):
+                cache.get_answers(b'host.example.com', RType.A)
+                cache.get_answers(b'nx.example.com', RType.A)
+            client.ttl = 1
+            with patch('time.time', return_value=now - 10):
+                cache.get_answers(b'old.example.com', RType.A)
+            cache.close()
+            self.assertEqual(client.requests, 3)
+            # restart w/ snapshot while dropping the expired record
+            cache = Cache(Forwarder(self.backend, client),
+                snapshot_path=path, sweep_interval=None)
+            self.assertTrue(cache.restored.wait(5))
+            self.assertEqual(len(cache.cache), 2)
+            with patch('time.time', return_value=now + 20):
+                answers = cache.get_answers(b'host.example.com', RType.A)
+                self.assertEqual(answers.source, Cache.source)
+                self.assertEqual(answers.answers[0].ttl, 10)
+                answers = cache.get_answers(b'nx.example.com', RType.A)
+                self.assertEqual(answers.rcode, RCode.NonExistantDomain)
+            self.assertEqual(client.requests, 3)
+            # concurrent snapshots never interleave or leave temporary files
+            with ThreadPoolExecutor(4) as executor:
+                counts = list(executor.map(lambda _: cache.snapshot(), range(8)))
+            self.assertEqual(counts, [2] * 8)
+            cache.close()
+            self.assertEqual(os.listdir(tmp), ['cache.snap'])
+            self.assertEqual(len(list(read_snapshot(path))), 2)
+            # periodic snapshots stop before the final snapshot is written
+            cache = Cache(Forwarder(self.backend, client), snapshot_path=path,
+                snapshot_interval=0.01, sweep_interval=0.01)
+            self.assertTrue(cache.restored.wait(5))
+            time.sleep(0.05)
+            cache.close()
+            self.assertFalse(cache.snapshotter.is_alive()) #type: ignore
+            self.assertFalse(cache.sweeper.is_alive()) #type: ignore
+            self.assertEqual(os.listdir(tmp), ['cache.snap'])
+
+    def test_shared_cache(self):
+        """
+        ensure shared-memory caches share records through the mapped table
+        """
+        with TemporaryDirectory() as tmp:
+            path   = os.path.join(tmp, 'cache.shm')
+            client = SlowClient(delay=0)
+            first  = SharedCache(Forwarder(self.backend, client),
+                path=path, buckets=4, ways=2, sweep_interval=None)
+            second = SharedCache(Forwarder(self.backend, client),
+                path=path, buckets=4, ways=2, sweep_interval=None)
+            first.get_answers(b'host.example.com', RType.A)
+            first.get_answers(b'nx.example.com', RType.A)
+            answers = second.get_answers(b'host.example.com', RType.A)
+            self.assertEqual(answers.source, Cache.source)
+            answers = second.get_answers(b'nx.example.com', RType.A)
+            self.assertEqual(answers.rcode, RCode.NonExistantDomain)
+            self.assertEqual(client.requests, 2)
+            self.assertEqual(len(second.cache), 2)
+            # hits adopt stored answers w/o copying or sizing them again
+            module = 'pydns.server.backend.cache'
+            with patch(f'{module}.record_size', side_effect=AssertionError), \
+                patch(f'{module}.CacheRecord.with_ttl', side_effect=AssertionError):
+                records = [record for _, record in second.cache.items()]
+            self.assertTrue(all(r.size is None for r in records))
+            # table is bounded by its buckets and slots
+            for n in range(50):
+                second.get_answers(f'host{n}.example.com'.encode(), RType.A)
+            self.assertLessEqual(len(first.cache), 8)
+            # expired records are reclaimed by the sweeper of any process
+            with patch('time.time', return_value=time.time() + 60):
+                self.assertGreater(second.sweep(), 0)
+            first.cache.clear()
+            self.assertEqual(len(second.cache), 0)
+            # incompatible table layouts are rejected
+            with self.assertRaises(ValueError):
+                SharedCache(self.backend, path=path, buckets=8)
+            first.close()
+            second.close()
+        # caches w/o a path use a private table removed on close
+        first, second = SharedCache(self.backend), SharedCache(self.backend)
+        self.assertNotEqual(first.path, second.path)
+        self.assertTrue(os.path.exists(first.path)) #type: ignore
+        first.close()
+        second.close()
+        self.assertFalse(os.path.exists(first.path)) #type: ignore
+
+    def test_runner(self):
+        """
+        ensure pre-forked workers serve requests and restart after crashing
+        """
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            address = sock.getsockname()
+        backend = self.backend
+        runner  = Runner(lambda: Cache(backend, ignore_sources=set()),
+            address, workers=2, restart_delay=0.1, stats_interval=0.05)
+        thread  = threading.Thread(target=runner.run)
+        thread.start()
+        try:
+            query = new_query(Question(b'example.com', RType.A)).pack()
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client:
+                client.settimeout(0.2)
+                for _ in range(2):
+                    # retry until (restarted) workers are listening
+                    for _ in range(25):
+                        client.sendto(query, address)
+                        try:
+                            response = Message.unpack(client.recv(8192))
+                            break
+                        except socket.timeout:
+                            continue
+                    else:
+                        self.fail('workers did not respond')
+                    self.assertEqual(len(response.answers), 1)
+                    # crashed workers are replaced (after publishing counters)
+                    time.sleep(0.2)
+                    os.kill(runner.processes[0].pid, signal.SIGKILL) #type: ignore
+                    time.sleep(0.5)
+            stats = runner.stats()
+            self.assertEqual(stats.workers, 2)
+            self.assertEqual(stats.restarts, 2)
+            self.assertGreaterEqual(stats.requests, 2)
+        finally:
+            runner.stop()
+            thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(all(p is None for p in runner.processes))
@@ -0,0 +1,236 @@
+"""
+Low-Level DNS Wire-Format Primitives
+
+Precomputed struct formats, domain label walkers and buffer writers
+shared by the fast-path codec and the `pack_into` implementations.
+"""
+import struct
+from typing import List, Union
+
+from pystructs import Context
+
+#** Variables **#
+__all__ = [
+    'Buffer',
+
+    'freeze',
+    'write',
+    'write_struct',
+    'pack_domain',
+    'unpack_domain',
+    'skip_domain',
+    'skip_question',
+    'skip_record',
+    'peek_record_type',
+]
+
+#: writable buffer types supported by `pack_into`
+Buffer = Union[bytearray, memoryview]
+
+#: domain compression pointer mask
+PTR_MASK = 0xC0
+
+#: maximum number of pointer jumps allowed when walking a domain
+MAX_POINTERS = 128
+
+#: precomputed struct formats for fixed-width message components
+HEADER  = struct.Struct('>HHHHHH')
+QTAIL   = struct.Struct('>HH')
+RRHEAD  = struct.Struct('>HHI')
+RRTAIL  = struct.Struct('>HHIH')
+EDNS    = struct.Struct('>HHBBHH')
+UINT16  = struct.Struct('>H')
+UINT32  = struct.Struct('>I')
+SRVHEAD = struct.Struct('>HHH')
+SOATAIL = struct.Struct('>IIIII')
+
+#** Functions **#
+
+def freeze(raw: Union[bytes, Buffer]) -> bytes:
+    """
+    copy mutable or borrowed buffers into immutable bytes
+
+    decoded records may keep slices of (or references to) the buffer they
+    were unpacked from, which must never be a pooled or mutable buffer.
+
+    :param raw: raw byte buffer
+    :return:    immutable bytes (input returned as is if already bytes)
+    """
+    return raw if isinstance(raw, bytes) else bytes(raw)
+
+def write(buf: Buffer, offset: int, data: bytes) -> int:
+    """
+    write data into buffer at offset (bytearrays grow as required)
+
+    :param buf:    buffer to write data into
+    :param offset: offset within buffer to write data
+    :param data:   data being written
+    :return:       offset directly after written data
+    """
+    size = len(buf)
+    end  = offset + len(data)
+    if end > size and (offset > size or type(buf) is not bytearray):
+        raise OverflowError(f'buffer too small to write {end} bytes')
+    buf[offset:end] = data
+    return end
+
+def write_struct(buf: Buffer, offset: int, fmt: struct.Struct, *values) -> int:
+    """
+    write struct values into buffer at offset (bytearrays grow as required)
+
+    :param buf:    buffer to write values into
+    :param offset: offset within buffer to write values
+    :param fmt:    precomputed struct format
+    :param values: values to pack using struct format
+    :return:       offset directly after written values
+    """
+    end = offset + fmt.size
+    if end <= len(buf):
+        fmt.pack_into(buf, offset, *values)
+        return end
+    return write(buf, offset, fmt.pack(*values))
+
+def pack_domain(buf: Buffer, offset: int, domain: bytes, ctx: Context) -> int:
+    """
+    pack domain into buffer w/ compression tracked by context
+
+    :param buf:    buffer to write encoded domain
+    :param offset: offset within buffer to write domain
+    :param domain: domain being encoded
+    :param ctx:    serialization context object
+    :return:       offset directly after encoded domain
+    """
+    domain_to_index = ctx.domain_to_index
+    index_to_domain = ctx.index_to_domain
+    encoded = bytearray()
+    while domain:
+        # check if ptr is an option for remaining domain
+        index = domain_to_index.get(domain)
+        if index is not None:
+            encoded += UINT16.pack((PTR_MASK << 8) | index)
+            ctx.index += 2
+            return write(buf, offset, encoded)
+        # save partial domain as index
+        index_to_domain[ctx.index] = domain
+        domain_to_index[domain]    = ctx.index
+        # handle components of name
+        name, _, domain = domain.partition(b'.')
+        if len(name) > 255:
+            raise OverflowError(f'domain label too long: {name!r}')
+        encoded.append(len(name))
+        encoded += name
+        ctx.index += 1 + len(name)
+    # write final zero before returning final encoded data
+    encoded.append(0)
+    ctx.index += 1
+    return write(buf, offset, encoded)
+
+def follow_pointer(raw: bytes, index: int) -> bytes:
+    """
+    walk domain labels from raw buffer starting from the given pointer
+
+    :param raw:   raw byte buffer
+    :param index: index of pointer within buffer
+    :return:      decoded domain
+    """
+    labels: List[bytes] = []
+    for _ in range(MAX_POINTERS):
+        while True:
+            length = raw[index]
+            if length == 0:
+                return b'.'.join(labels)
+            if length & PTR_MASK == PTR_MASK:
+                index = ((length ^ PTR_MASK) << 8) | raw[index + 1]
+                break
+            labels.append(bytes(raw[index + 1:index + 1 + length]))
+            index += 1 + length
+    raise ValueError('domain pointer loop detected')
+
+def unpack_domain(raw: bytes, ctx: Context) -> bytes:
+    """
+    unpack domain from raw buffer w/ decompression tracked by context
+
+    :param raw: raw byte buffer
+    :param ctx: deserialization context object
+    :return:    decoded domain
+    """
+    index_to_domain = ctx.index_to_domain
+    domain_to_index = ctx.domain_to_index
+    labels:  List[bytes] = []
+    offsets: List[int]   = []
+    index = ctx.index
+    while True:
+        # check for length of domain component
+        length = raw[index]
+        if length == 0:
+            index += 1
+            break
+        # check if name is a pointer
+        if length & PTR_MASK == PTR_MASK:
+            pointer = ((length ^ PTR_MASK) << 8) | raw[index + 1]
+            base    = index_to_domain.get(pointer)
+            if base is None:
+                base = follow_pointer(raw, pointer)
+            labels.append(base)
+            index += 2
+            break
+        # slice name from bytes and update index
+        offsets.append(index)
+        labels.append(bytes(raw[index + 1:index + 1 + length]))
+        index += 1 + length
+    ctx.index = index
+    # save domain components
+    for n, offset in enumerate(offsets, 0):
+        subname = b'.'.join(labels[n:])
+        index_to_domain[offset]  = subname
+        domain_to_index[subname] = offset
+    return b'.'.join(labels)
+
+def skip_domain(raw: bytes, index: int) -> int:
+    """
+    skip over an encoded domain without decoding its labels
+
+    :param raw:   raw byte buffer
+    :param index: starting index of encoded domain
+    :return:      index directly after encoded domain
+    """
+    while True:
+        length = raw[index]
+        if length == 0:
+            return index + 1
+        if length & PTR_MASK == PTR_MASK:
+            return index + 2
+        index += 1 + length
+
+def skip_question(raw: bytes, index: int) -> int:
+    """
+    skip over an encoded question without decoding it
+
+    :param raw:   raw byte buffer
+    :param index: starting index of encoded question
+    :return:      index directly after encoded question
+    """
+    return skip_domain(raw, index) + QTAIL.size
+
+def skip_record(raw: bytes, index: int) -> int:
+    """
+    skip over an encoded resource record using its rdlength
+
+    :param raw:   raw byte buffer
+    :param index: starting index of encoded record
+    :return:      index directly after encoded record
+    """
+    index = skip_domain(raw, index)
+    (size, ) = UINT16.unpack_from(raw, index + RRHEAD.size)
+    return index + RRTAIL.size + size
+
+def peek_record_type(raw: bytes, index: int) -> int:
+    """
+    peek record-type of encoded resource record without decoding it
+
+    :param raw:   raw byte buffer
+    :param index: starting index of encoded record
+    :return:      integer record-type
+    """
+    (code, ) = UINT16.unpack_from(raw, skip_domain(raw, index))
+    return code